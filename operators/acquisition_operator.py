@@ -5,16 +5,37 @@ import boto3
 import pendulum
 from airflow.models import BaseOperator
 from airflow.providers.amazon.aws.hooks.s3 import S3Hook
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from operators.acquisition_trigger import AcquisitionTrigger
+from operators.manifest_utils import AcquisitionManifest
+from operators.s3_list_utils import list_matching_objects, list_prefix
+from operators.scan_utils import PartitionPrunedScanner
+
 
 class AcquisitionOperator(BaseOperator):
-    def __init__(self, s3_conn_id=None, bucket_name=None, dataset_dir=None, file_pattern=None, datetime_pattern=None, *args, **kwargs):
+    def __init__(self, s3_conn_id=None, bucket_name=None, dataset_dir=None, file_pattern=None, datetime_pattern=None,
+                 max_list_workers=8, list_sub_prefixes=None, manifest_path=None, manifest_full_refresh=False,
+                 deferrable=False, poke_interval=60, defer_timeout=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.bucket_name = bucket_name
         self.datetime_pattern = datetime_pattern
         self.file_pattern = file_pattern
         self.dataset_dir = dataset_dir
         self.s3_conn_id = s3_conn_id
+        # Bounded thread pool size used when a large prefix is split and listed concurrently
+        self.max_list_workers = max_list_workers
+        # Optional sub-prefixes (relative to dataset_dir) to list instead of the whole prefix, e.g. ["{datetime_pattern}/"]
+        self.list_sub_prefixes = list_sub_prefixes
+        # Optional SQLite file recording the keys already listed, enables incremental listing with StartAfter
+        self.manifest_path = manifest_path
+        self.manifest_full_refresh = manifest_full_refresh
+        # Manifest of the running listing, committed only once execute succeeded
+        self.manifest = None
+        # Wait for late files in the triggerer instead of failing (and holding a worker slot on retries)
+        self.deferrable = deferrable
+        self.poke_interval = poke_interval
+        self.defer_timeout = defer_timeout
         
         # Only initialize S3 client if bucket_name is provided and not None/empty string
         if bucket_name and bucket_name != "None":
@@ -22,56 +43,164 @@ class AcquisitionOperator(BaseOperator):
         else:
             self.s3_client = None
 
+    def get_s3_prefix(self):
+        # Strip S3 protocol and bucket name from prefix if present
+        s3_prefix = self.dataset_dir
+        if s3_prefix.startswith('s3://'):
+            # Remove s3://
+            s3_prefix = s3_prefix[5:]
+            # Remove bucket name if present
+            if s3_prefix.startswith(self.bucket_name + '/'):
+                s3_prefix = s3_prefix[len(self.bucket_name)+1:]
+        return s3_prefix
+
+    def list_s3_matching_files(self, pattern, dag_run_date):
+        s3_prefix = self.get_s3_prefix()
+        if self.manifest_path:
+            return self.list_s3_matching_files_incremental(s3_prefix, pattern, dag_run_date)
+
+        matching_objects, stats = self.list_s3_objects(s3_prefix, pattern, dag_run_date)
+        return [obj['Key'] for obj in matching_objects], stats['keys']
+
+    def get_sub_prefixes(self, dag_run_date):
+        if not self.list_sub_prefixes:
+            return None
+        return [sub_prefix.format(datetime_pattern=dag_run_date) if "datetime_pattern" in sub_prefix else sub_prefix
+                for sub_prefix in self.list_sub_prefixes]
+
+    def list_s3_objects(self, s3_prefix, pattern, dag_run_date, on_page=None):
+        sub_prefixes = self.get_sub_prefixes(dag_run_date)
+        if sub_prefixes:
+            self.log.info(f"Listing sub-prefixes {sub_prefixes} under '{s3_prefix}'")
+
+        matching_objects, stats = list_matching_objects(self.s3_client, self.bucket_name, s3_prefix, pattern,
+                                                        sub_prefixes=sub_prefixes,
+                                                        max_workers=self.max_list_workers,
+                                                        on_page=on_page)
+        self.log.info(f"Listed {stats['keys']} keys in {stats['pages']} pages across {stats['prefixes']} prefixes "
+                      f"under '{s3_prefix}' in bucket '{self.bucket_name}'.")
+        return matching_objects, stats
+
+    def list_s3_matching_files_incremental(self, s3_prefix, pattern, dag_run_date):
+        """
+        List only the keys after the manifest high-water mark and return the matching keys that are new or whose
+        ETag changed since they were recorded, the ETags coming from the listing itself. Falls back to a full
+        listing (of the sub-prefixes when configured) when the manifest is empty or no new key matches, since
+        StartAfter assumes new keys sort after the keys already seen (e.g. date-partitioned paths); only the keys
+        under the listed prefixes are pruned from the manifest then. With manifest_full_refresh every matching
+        key of the full listing is returned. The manifest is left open and uncommitted, execute commits it once the
+        task succeeded; a rerun of the same date gets the keys that run recorded back.
+        """
+        manifest = AcquisitionManifest(self.manifest_path, dataset=f"{self.bucket_name}/{s3_prefix}",
+                                       run_date=dag_run_date)
+        self.manifest = manifest
+        high_water_mark = None if self.manifest_full_refresh else manifest.get_high_water_mark()
+        matching_files = []
+        if high_water_mark:
+            self.log.info(f"Listing keys after high-water mark '{high_water_mark}' from manifest {self.manifest_path}")
+            _, stats = list_prefix(self.s3_client, self.bucket_name, s3_prefix, pattern,
+                                   start_after=high_water_mark, on_page=manifest.record)
+            matching_files = manifest.matching_delta_keys(pattern)
+            if not matching_files:
+                self.log.info("No new matching keys after the high-water mark, falling back to a full listing.")
+
+        if not matching_files:
+            matching_objects, stats = self.list_s3_objects(s3_prefix, pattern, dag_run_date,
+                                                           on_page=manifest.record)
+            listed_prefixes = [s3_prefix + sub_prefix for sub_prefix in self.get_sub_prefixes(dag_run_date) or [""]]
+            stale_keys = manifest.remove_unseen(listed_prefixes)
+            self.log.info(f"Removed {stale_keys} keys no longer under {listed_prefixes} from the manifest.")
+            if self.manifest_full_refresh:
+                matching_files = [obj['Key'] for obj in matching_objects]
+            else:
+                matching_files = manifest.matching_delta_keys(pattern)
+
+        self.log.info(f"Manifest updated: {manifest.new_keys} new and {manifest.changed_keys} changed keys "
+                      f"out of {stats['keys']} listed.")
+        return matching_files, stats['keys']
+
+    def defer_until_files(self, file_pattern, dag_run_date):
+        timeout = self.defer_timeout
+        if timeout is not None and not isinstance(timeout, timedelta):
+            timeout = timedelta(seconds=timeout)
+
+        self.log.info(f"No files matching pattern '{file_pattern}' yet, deferring to the triggerer "
+                      f"(poke interval {self.poke_interval}s, timeout {timeout}).")
+        self.defer(trigger=AcquisitionTrigger(file_pattern=file_pattern,
+                                              dataset_dir=self.dataset_dir,
+                                              s3_conn_id=self.s3_conn_id,
+                                              bucket_name=self.bucket_name,
+                                              s3_prefix=self.get_s3_prefix() if self.s3_client is not None else None,
+                                              sub_prefixes=self.get_sub_prefixes(dag_run_date),
+                                              max_list_workers=self.max_list_workers,
+                                              poke_interval=self.poke_interval),
+                   method_name="execute_complete",
+                   timeout=timeout)
+
+    def execute_complete(self, context, event=None):
+        if event is None or event.get("status") != "success":
+            message = event.get("message") if event else "no event received"
+            self.log.error(f"Waiting for files failed: {message}")
+            raise Exception(f"Waiting for files failed: {message}")
+
+        matching_files = event["files"]
+        context['ti'].xcom_push(key="files_found",value=matching_files)
+        self.log.info(f"Found matching files: {matching_files}")
+        return matching_files
+
     def execute(self, context):
+        try:
+            matching_files = self.find_matching_files(context)
+            if self.manifest is not None:
+                self.manifest.commit()
+                self.log.info(f"Committed manifest {self.manifest_path}")
+            return matching_files
+        finally:
+            # A failed or deferred run leaves the manifest as it was, the next attempt lists the same keys
+            if self.manifest is not None:
+                self.manifest.close()
+                self.manifest = None
+
+    def find_matching_files(self, context):
+        self.log.info(f"""data_interval_end:{context["data_interval_end"]}""")
+
+        dag_run_date = datetime.fromtimestamp(context["data_interval_end"].timestamp(),pendulum.tz.UTC).strftime(self.datetime_pattern)
+        file_pattern = self.file_pattern.format(datetime_pattern=dag_run_date) if "datetime_pattern" in self.file_pattern else self.file_pattern
+
+        self.log.info(f"file_pattern:{file_pattern}")
+
+        # Compile the regex pattern
+        pattern = re.compile(file_pattern)
+
         # Use local file system if bucket_name is None or "None"
         if self.s3_client is None:
             # Use local file system
             dataset_path = self.dataset_dir
-            if not os.path.exists(dataset_path):
+            if not os.path.exists(dataset_path) and not self.deferrable:
                 self.log.info(f"Directory '{dataset_path}' does not exist.")
                 return []
             
-            # Get all files in the directory
-            all_files = []
-            for root, dirs, files in os.walk(dataset_path):
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    all_files.append(full_path)
-            
-            if not all_files:
+            # Scan only the subdirectories the rendered pattern can match, yielding matches lazily
+            scanner = PartitionPrunedScanner(dataset_path, file_pattern)
+            matching_files = list(scanner.scan())
+            self.log.info(f"Scanned {scanner.entries_visited} directory entries ({scanner.files_visited} files) "
+                          f"under '{dataset_path}'.")
+
+            # Only a full walk (nothing pruned) can tell that the directory holds no files at all
+            if scanner.files_visited == 0 and not scanner.dir_segments and not self.deferrable:
                 self.log.info(f"No files found under directory '{dataset_path}'.")
                 return []
         else:
-            # Use S3
-            # Strip S3 protocol and bucket name from prefix if present
-            s3_prefix = self.dataset_dir
-            if s3_prefix.startswith('s3://'):
-                # Remove s3://
-                s3_prefix = s3_prefix[5:]
-                # Remove bucket name if present
-                if s3_prefix.startswith(self.bucket_name + '/'):
-                    s3_prefix = s3_prefix[len(self.bucket_name)+1:]
-            response = self.s3_client.list_objects_v2(Bucket=self.bucket_name, Prefix=s3_prefix)
+            # Use S3, the regex is applied to each page as it is listed
+            matching_files, keys_listed = self.list_s3_matching_files(pattern, dag_run_date)
 
             # Check if any contents are returned
-            if 'Contents' not in response:
+            if keys_listed == 0 and not self.deferrable:
                 self.log.info(f"No files found under prefix '{self.dataset_dir}' in bucket '{self.bucket_name}'.")
                 return []
-            
-            all_files = [obj['Key'] for obj in response['Contents']]
-        self.log.info(f"All files found:{all_files}")
-        self.log.info(f"""data_interval_end:{context["data_interval_end"]}""")
-
-        dag_run_date = datetime.fromtimestamp(context["data_interval_end"].timestamp(),pendulum.tz.UTC).strftime(self.datetime_pattern)
-        file_pattern = self.file_pattern.format(datetime_pattern=dag_run_date) if "datetime_pattern" in self.file_pattern else self.file_pattern
-
-        self.log.info(f"file_pattern:{file_pattern}")
-
-        # Compile the regex pattern
-        pattern = re.compile(file_pattern)
 
-        # Filter files based on the regex pattern
-        matching_files = [file_path for file_path in all_files if pattern.search(file_path)]
+        if not matching_files and self.deferrable:
+            self.defer_until_files(file_pattern, dag_run_date)
 
         if matching_files:
             context['ti'].xcom_push(key="files_found",value=matching_files)
@@ -0,0 +1,69 @@
+import asyncio
+import re
+
+from airflow.providers.amazon.aws.hooks.s3 import S3Hook
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+from operators.s3_list_utils import list_matching_objects
+from operators.scan_utils import PartitionPrunedScanner
+
+
+class AcquisitionTrigger(BaseTrigger):
+    """
+    Poll S3 (or a local directory visible from the triggerer) until files matching the rendered
+    file_pattern appear, then fire a single event with the matching paths.
+
+    The blocking boto3 listing and os.scandir calls run in the event loop's default thread pool
+    (run_in_executor, asyncio.to_thread needs Python 3.9) so the triggerer event loop is never blocked.
+    """
+
+    def __init__(self, file_pattern, dataset_dir, s3_conn_id=None, bucket_name=None, s3_prefix=None,
+                 sub_prefixes=None, max_list_workers=8, poke_interval=60):
+        super().__init__()
+        self.file_pattern = file_pattern
+        self.dataset_dir = dataset_dir
+        self.s3_conn_id = s3_conn_id
+        self.bucket_name = bucket_name
+        self.s3_prefix = s3_prefix
+        self.sub_prefixes = sub_prefixes
+        self.max_list_workers = max_list_workers
+        self.poke_interval = poke_interval
+
+    def serialize(self):
+        return ("operators.acquisition_trigger.AcquisitionTrigger", {
+            "file_pattern": self.file_pattern,
+            "dataset_dir": self.dataset_dir,
+            "s3_conn_id": self.s3_conn_id,
+            "bucket_name": self.bucket_name,
+            "s3_prefix": self.s3_prefix,
+            "sub_prefixes": self.sub_prefixes,
+            "max_list_workers": self.max_list_workers,
+            "poke_interval": self.poke_interval,
+        })
+
+    def find_matching_files(self, s3_client):
+        pattern = re.compile(self.file_pattern)
+        if s3_client is None:
+            return list(PartitionPrunedScanner(self.dataset_dir, self.file_pattern).scan())
+        matching_objects, stats = list_matching_objects(s3_client, self.bucket_name, self.s3_prefix, pattern,
+                                                        sub_prefixes=self.sub_prefixes,
+                                                        max_workers=self.max_list_workers)
+        return [obj["Key"] for obj in matching_objects]
+
+    async def run(self):
+        try:
+            loop = asyncio.get_running_loop()
+            s3_client = None
+            if self.bucket_name and self.bucket_name != "None":
+                s3_client = await loop.run_in_executor(None, lambda: S3Hook(aws_conn_id=self.s3_conn_id).get_conn())
+
+            while True:
+                matching_files = await loop.run_in_executor(None, self.find_matching_files, s3_client)
+                if matching_files:
+                    yield TriggerEvent({"status": "success", "files": matching_files})
+                    return
+                self.log.info(f"No files matching pattern '{self.file_pattern}' yet, "
+                              f"checking again in {self.poke_interval} seconds.")
+                await asyncio.sleep(self.poke_interval)
+        except Exception as ex:
+            yield TriggerEvent({"status": "error", "message": ex.__str__()})
@@ -0,0 +1,127 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+# ioctl request number of FICLONE (linux/fs.h), a copy-on-write clone on btrfs/XFS
+FICLONE = 0x40049409
+
+
+def reflink(source_path, destination_path):
+    with open(source_path, "rb") as source, open(destination_path, "wb") as destination:
+        fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+
+
+def reflink_or_copy(source_path, destination_path):
+    """
+    Materialize source_path at destination_path as a reflink, else a plain copy. Never a hardlink: the task's
+    file would share the cache entry's inode, so writing to it or touching it would change the entry.
+    """
+    if os.path.exists(destination_path):
+        os.remove(destination_path)
+    try:
+        reflink(source_path, destination_path)
+        return "reflink"
+    except OSError:
+        if os.path.exists(destination_path):
+            os.remove(destination_path)
+    shutil.copy2(source_path, destination_path)
+    return "copy"
+
+
+class DownloadCache:
+    """
+    Worker-local, content-addressed file cache with a byte budget and LRU eviction.
+
+    Entries are keyed by a hash of their identity (bucket/key/ETag for S3 objects, path/mtime/size for
+    local files), so a changed object never hits a stale entry. The modification time of an entry is
+    refreshed on every hit and the least recently used entries are evicted once the cache grows past
+    max_bytes. The cache directory is walked once per DownloadCache, then the entries it adds or touches
+    are tallied, so a miss doesn't stat every entry.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # path -> (mtime, size) of the entries, loaded by the first eviction check
+        self.entries = None
+        self.total_bytes = 0
+        Path(cache_dir).mkdir(exist_ok=True, parents=True)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def fetch(self, key, destination_path, populate):
+        """
+        Place the entry for key at destination_path, calling populate(path) to fill the cache on a miss.
+        Returns (hit, method) where method is how the file was linked into place.
+        """
+        cached_path = self.path_for(key)
+        if os.path.exists(cached_path):
+            try:
+                os.utime(cached_path)
+                self.track(cached_path)
+                return True, reflink_or_copy(cached_path, destination_path)
+            except FileNotFoundError:
+                # Evicted by another task between the check and the link
+                pass
+
+        Path(os.path.dirname(cached_path)).mkdir(exist_ok=True, parents=True)
+        temp_path = f"{cached_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            populate(temp_path)
+            os.replace(temp_path, cached_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.track(cached_path)
+        method = reflink_or_copy(cached_path, destination_path)
+        self.evict()
+        return False, method
+
+    def load_entries(self):
+        self.entries = {}
+        self.total_bytes = 0
+        for root, dirs, files in os.walk(self.cache_dir):
+            for file in files:
+                if not file.endswith(".tmp"):
+                    self.track_locked(os.path.join(root, file))
+
+    def track(self, path):
+        with self.lock:
+            if self.entries is not None:
+                self.track_locked(path)
+
+    def track_locked(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        _, previous_size = self.entries.get(path, (None, 0))
+        self.entries[path] = (stat.st_mtime, stat.st_size)
+        self.total_bytes += stat.st_size - previous_size
+
+    def evict(self):
+        with self.lock:
+            if self.entries is None:
+                self.load_entries()
+            if self.total_bytes <= self.max_bytes:
+                return
+            for path, (_, size) in sorted(self.entries.items(), key=lambda entry: entry[1][0]):
+                if self.total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                del self.entries[path]
+                self.total_bytes -= size
@@ -22,19 +22,46 @@ AND COLUMN_NAME NOT IN ('CREATED_BY','CREATED_DTS','FILE_DATE','FILE_NAME','FILE
 'ROW_HASH_ID','UNIQUE_HASH_ID','UPDATED_DTS','UPDATED_BY')
 """
 
-postgres_col_count_query = """
-    SELECT 
-        column_name,
-        format(
-            'SELECT COUNT( %I) AS %I,COUNT(DISTINCT %I) AS %I FROM "{mirror_schema}"."{mirror_table}" WHERE "FILE_DATE" = %L;',
-            column_name,column_name,column_name,column_name, '{file_date}'
-        ) AS query_text
-    FROM information_schema.columns
-    WHERE table_schema = '{mirror_schema}'
-      AND table_name = '{mirror_table}'
-    AND COLUMN_NAME NOT IN ('CREATED_BY','CREATED_DTS','FILE_DATE','FILE_NAME','FILE_LAST_MODIFIED','FILE_ROW_NUMBER','FILENAME',
-    'ROW_HASH_ID','UNIQUE_HASH_ID','UPDATED_DTS','UPDATED_BY') ;
-    """
+# Data type of every column, the file's values are normalized by it before they are profiled
+postgres_column_types_query = """
+SELECT COLUMN_NAME, DATA_TYPE
+FROM INFORMATION_SCHEMA.COLUMNS
+WHERE TABLE_SCHEMA = %s
+AND TABLE_NAME = %s
+"""
+
+postgres_profile_columns_query = """
+SELECT column_name
+FROM information_schema.columns
+WHERE table_schema = '{mirror_schema}'
+  AND table_name = '{mirror_table}'
+AND COLUMN_NAME NOT IN ('CREATED_BY','CREATED_DTS','FILE_DATE','FILE_NAME','FILE_LAST_MODIFIED','FILE_ROW_NUMBER','FILENAME',
+'ROW_HASH_ID','UNIQUE_HASH_ID','UPDATED_DTS','UPDATED_BY')
+ORDER BY ordinal_position
+"""
+
+# Profiles a group of columns in one scan, {aggregates} holds COUNT(col), COUNT(DISTINCT col) for every column
+postgres_col_profile_query = """
+SELECT {aggregates}
+FROM {source}
+{where_clause}
+"""
+
+postgres_exact_distinct_sql = 'COUNT(DISTINCT "{col}")'
+
+# Approximate distinct count with the postgresql-hll extension, log2m registers
+postgres_hll_distinct_sql = 'COALESCE(ROUND(hll_cardinality(hll_add_agg(hll_hash_any("{col}"), {log2m}))), 0)::bigint'
+
+postgres_hll_extension_query = "SELECT count(*) FROM pg_extension WHERE extname = 'hll'"
+
+# The partition of a table partitioned by LIST ("FILE_DATE") that holds one FILE_DATE
+postgres_file_date_partition_query = """
+SELECT c.relname
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = %s::regclass
+AND pg_get_expr(c.relpartbound, c.oid) = %s
+"""
 
 file_cols_query ="""
 SELECT {query_select_cols_str}
@@ -48,4 +75,47 @@ SELECT
     FROM TABLE(INFER_SCHEMA(LOCATION=>'@{stage_name}', FILE_FORMAT=>'{file_format_name}')) AS T
 ORDER BY 
     T.ORDER_ID ASC;
-    """
\ No newline at end of file
+    """
+snowflake_table_columns_query = """
+SELECT COLUMN_NAME, DATA_TYPE, NUMERIC_PRECISION, NUMERIC_SCALE
+FROM {mirror_db}.INFORMATION_SCHEMA.COLUMNS C
+WHERE TABLE_SCHEMA ='{mirror_schema}'
+AND TABLE_NAME = '{mirror_table}'
+AND COLUMN_NAME NOT IN ('CREATED_BY','CREATED_DTS','FILE_DATE','FILE_LAST_MODIFIED','FILE_ROW_NUMBER','FILENAME',
+'ROW_HASH_ID','UNIQUE_HASH_ID','UPDATED_DTS','UPDATED_BY')
+ORDER BY ORDINAL_POSITION
+"""
+
+# Row counts of the staged file and the table slice, and of the distinct rows found on one side only
+snowflake_staged_file_diff_query = """
+WITH FILE_ROWS AS ({file_rows_query}),
+TABLE_ROWS AS ({table_rows_query})
+SELECT (SELECT COUNT(*) FROM FILE_ROWS) AS FILE_ROW_COUNT,
+       (SELECT COUNT(*) FROM TABLE_ROWS) AS TABLE_ROW_COUNT,
+       (SELECT COUNT(*) FROM (SELECT * FROM FILE_ROWS MINUS SELECT * FROM TABLE_ROWS)) AS MISSING_ROW_COUNT,
+       (SELECT COUNT(*) FROM (SELECT * FROM TABLE_ROWS MINUS SELECT * FROM FILE_ROWS)) AS EXTRA_ROW_COUNT
+"""
+
+snowflake_staged_file_sample_query = """
+WITH FILE_ROWS AS ({file_rows_query}),
+TABLE_ROWS AS ({table_rows_query})
+SELECT * FROM (SELECT * FROM {minuend} MINUS SELECT * FROM {subtrahend})
+LIMIT {sample_size}
+"""
+
+# Profiles every column of {source} in one scan, {aggregates} holds COUNT(col) and a distinct count per column
+snowflake_col_profile_query = """
+SELECT COUNT(*) AS ROW_COUNT, {aggregates}
+FROM ({source})
+"""
+
+# First record of one staged file (the header with a file format skipping skip_header - 1 lines). The row number
+# filter keeps a later record from being returned as the header, LIMIT 1 stops the scan once it is found; the
+# queries of several files are combined with UNION ALL
+staged_file_header_query = """
+SELECT '{stage_location}' AS FILENAME, {query_select_cols_str}
+FROM @{stage_location}
+(FILE_FORMAT => '{file_format_name}')
+WHERE METADATA$FILE_ROW_NUMBER = 1
+LIMIT 1
+"""
@@ -1,24 +1,96 @@
+import csv
+import io
+import itertools
+import mmap
 import os.path
+import queue
 import re
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from io import StringIO
+from pathlib import Path
 
 import pendulum
 from airflow.models import BaseOperator
+from airflow.providers.amazon.aws.hooks.s3 import S3Hook
 from airflow.providers.postgres.hooks.postgres import PostgresHook
+from core_utils import s3_utils
+from core_utils.config_reader_dbt import ConfigReaderDBT
 import pandas as pd
 from dateutil.parser import parse
 
+from operators.constants import postgres_file_date_partition_query
+from operators.copy_utils import IterStream, iter_buffer_range, iter_csv_copy_chunks, split_csv_ranges
+from operators.dag_utils import find_upstream_xcom
+from operators.input_utils import open_input, sniff_codec
+from operators.pgcopy_utils import PGCOPY_HEADER, PGCOPY_TRAILER, encode_batch, encode_value, normalize_type
+
+load_modes = ("dataframe", "streaming", "passthrough", "binary")
+load_strategies = ("truncate", "swap", "partition")
+
 
 class CopyFileToPostgresOperator(BaseOperator):
-    def __init__(self, db_conn_id,table_name,file_format_params,datetime_pattern,encoding, *args, **kwargs):
+    def __init__(self, db_conn_id,table_name,file_format_params,datetime_pattern,encoding, s3_conn_id=None,
+                 bucket_name=None, load_mode="dataframe", chunk_size=100000, copy_parallelism=1, file_schema=None,
+                 load_strategy="truncate", load_all_files=False, file_load_parallelism=4, configs_path=None,
+                 dataset_name=None, decompress_threads=1, partition_lock_timeout="30s", *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.file_format_params = file_format_params
         self.full_table_name = table_name
         self.datetime_pattern = datetime_pattern
         self.encoding = encoding
+        self.db_conn_id = db_conn_id
+        self.bucket_name = bucket_name
+        if load_mode not in load_modes:
+            raise Exception(f"Unsupported load_mode '{load_mode}', expected one of {load_modes}")
+        # "dataframe" reads the downloaded file with pandas, "streaming" pipes the acquired file (S3 object or
+        # local path) through an incremental CSV transform straight into COPY FROM STDIN, "passthrough" sends
+        # the raw bytes of an already-clean file to COPY without parsing them, "binary" encodes typed values
+        # (file_schema types) in the PGCOPY binary format so the server does not parse any text
+        self.load_mode = load_mode
+        # Configured file_schema of the dataset (column -> type), drives the encoding of the "binary" mode. Read
+        # from the dataset configs (configs_path/dataset_name) at execution when it isn't passed
+        self.file_schema = file_schema or {}
+        self.configs_path = configs_path
+        self.dataset_name = dataset_name
+        self.s3_conn_id = s3_conn_id
+        if load_strategy not in load_strategies:
+            raise Exception(f"Unsupported load_strategy '{load_strategy}', expected one of {load_strategies}")
+        if copy_parallelism > 1 and load_strategy == "truncate":
+            # The ranges are COPYed into a shadow table on other connections, under "truncate" its rows would be
+            # copied again, fully WAL-logged, with INSERT ... SELECT
+            raise Exception("copy_parallelism > 1 requires the swap or partition load_strategy, got truncate")
+        # "truncate" empties the live table and COPYs into it, "swap" COPYs into a shadow table, builds the indexes
+        # after the load and renames the shadow table in place, so readers are only blocked while it is swapped in,
+        # "partition" replaces only the FILE_DATE partition of a table partitioned by LIST ("FILE_DATE")
+        self.load_strategy = load_strategy
+        # lock_timeout of the short "partition" DETACH/ATTACH transaction, so a load waiting behind long readers of
+        # the parent fails instead of queueing every other query on the table behind its lock
+        self.partition_lock_timeout = partition_lock_timeout
+        # Committed partition staging table of the current load, dropped when the load fails
+        self.staging_table = None
+        # Rows per DataFrame chunk in the "dataframe" mode, bounds memory to one chunk instead of the whole file
+        self.chunk_size = chunk_size
+        # Concurrent COPY streams (one connection each) used by the "passthrough" mode for local, uncompressed files,
+        # with the "swap" or "partition" load_strategy
+        self.copy_parallelism = copy_parallelism
+        # Load every file of the batch (DownloadOperator "files" / AcquisitionOperator "files_found") into one
+        # shared target with one publish and commit, file_load_parallelism files at a time
+        self.load_all_files = load_all_files
+        self.file_load_parallelism = file_load_parallelism
+        # Background threads decompressing gzip input (python-isal), 0 decompresses in the reading thread
+        self.decompress_threads = decompress_threads
         self.postgres_conn = PostgresHook(postgres_conn_id=db_conn_id).get_conn()
 
+        # Only initialize S3 client if bucket_name is provided and not None/empty string
+        if bucket_name and bucket_name != "None":
+            self.s3_client = S3Hook(aws_conn_id=s3_conn_id).get_conn()
+        else:
+            self.s3_client = None
+
     def generate_regex_pattern(self,date_format):
         # Mapping of format components to regex patterns
         format_mapping = {
@@ -88,74 +160,713 @@ class CopyFileToPostgresOperator(BaseOperator):
         except:
             return None
 
-    # Function to load data into PostgreSQL using column mapping
-    def load_data_to_postgres(self,file_path,dag_run_date ):
-        # Extract metadata
-        file_name = os.path.basename(file_path)
+    def get_load_metadata(self, cur, file_name, dag_run_date):
         file_date = self.extract_file_date(file_name) if self.datetime_pattern else dag_run_date
         self.log.info(f"file_date: {file_date}")
         username_query = "select current_user"
-        current_datetime = datetime.now()
-        delimiter = self.file_format_params.get("delimiter",",")
-        # line_terminator = "\n"
-        encoding = "utf-8"
-
-        self.log.info(f"Reading file from location: {file_path}")
-        # Read file as DataFrame
-        df = pd.read_csv(file_path, delimiter=delimiter,  encoding=encoding)
-
-        # Transform column names
-        df.columns = self.clean_column_names(df.columns)
-        # Add metadata columns
-        df["FILE_DATE"] = self.complete_date(file_date,dag_run_date)
-        df["FILE_NAME"] = file_name
-
-        df["CREATED_DTS"] = current_datetime
-
-        # Connect to PostgreSQL
-        cur = self.postgres_conn.cursor()
-
-        username = self.get_connection_user(cur,username_query)
-        df["CREATED_BY"] = username
-
-        table_name_split = self.full_table_name.split(".")
-
-        schema_name = table_name_split[1]
-        table_name = table_name_split[2]
+        return {
+            "FILE_DATE": self.complete_date(file_date, dag_run_date),
+            "FILE_NAME": file_name,
+            "CREATED_DTS": datetime.now(),
+            "CREATED_BY": self.get_connection_user(cur, username_query),
+        }
 
+    def get_table_columns(self, cur, schema_name, table_name):
         # Get column names dynamically from PostgreSQL
         cur.execute(f"SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = %s",
                     (schema_name,table_name))
         pg_columns = [row[0].upper() for row in cur.fetchall()]
 
         self.log.info(f"Table columns from postgres: {pg_columns}")
+        return pg_columns
 
-        # Map dataframe columns to PostgreSQL table columns (ignoring order)
-        df = df[[col for col in df.columns if col in pg_columns]]
-
-        # Use COPY FROM for efficient bulk insert
-        buffer = StringIO()
-        df.to_csv(buffer, index=False, header=False, sep=delimiter)
-        buffer.seek(0)
-
-        cols = [col.replace(" ", "_").upper() for col in df.columns]
+    def get_copy_sql(self, schema_name, table_name, cols, delimiter, encoding=None):
         self.log.info(f"File columns: {cols}")
 
         cols = [f'"{col}"' for col in cols]
-        copy_sql = f"""
+        if encoding:
+            # Raw file bytes are sent as-is, let the server decode them
+            copy_sql = f"""
+            COPY "{schema_name}"."{table_name}" ({', '.join(cols)}) 
+            FROM STDIN WITH (FORMAT csv, DELIMITER '{delimiter}', NULL '', ENCODING '{encoding}');
+        """
+        else:
+            copy_sql = f"""
             COPY "{schema_name}"."{table_name}" ({', '.join(cols)}) 
             FROM STDIN WITH CSV DELIMITER '{delimiter}' NULL '';
         """
         self.log.info(f"Copy sql: {copy_sql}")
+        return copy_sql
 
+    def truncate_table(self, cur, schema_name, table_name):
         truncate_query = f""" truncate table "{schema_name}"."{table_name}" """
         self.log.info(f"Truncate table query: {truncate_query} ")
         cur.execute(truncate_query)
 
-        cur.copy_expert(copy_sql, buffer)
+    def is_compressed(self, file_path):
+        if self.s3_client is None and os.path.isfile(file_path):
+            return sniff_codec(file_path) is not None
+        return bool(self.file_format_params.get("compressed")) or file_path.endswith((".gz", ".zst", ".bz2"))
+
+    def open_source(self, file_path):
+        """
+        Open the file to load as a binary stream: the S3 object body when a bucket is configured, otherwise
+        the local file. gzip/zstd/bz2 input (detected from its magic bytes) is decompressed incrementally.
+        """
+        if self.s3_client is not None:
+            self.log.info(f"Streaming s3://{self.bucket_name}/{file_path}")
+            stream = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_path)["Body"]
+        else:
+            self.log.info(f"Streaming local file {file_path}")
+            stream = file_path
+
+        return open_input(stream, threads=self.decompress_threads)
+
+    # Function to load data into PostgreSQL using column mapping
+    # conn and target_table are set by load_files_to_postgres: the file is COPYed into target_table on conn
+    # and committed, truncating/publishing the table is left to the caller
+    def load_data_to_postgres(self,file_path,dag_run_date, conn=None, target_table=None):
+        if self.load_mode == "streaming":
+            return self.stream_data_to_postgres(file_path, dag_run_date, conn, target_table)
+        if self.load_mode == "passthrough":
+            return self.passthrough_data_to_postgres(file_path, dag_run_date, conn, target_table)
+        if self.load_mode == "binary":
+            return self.binary_data_to_postgres(file_path, dag_run_date, conn, target_table)
+
+        # Extract metadata
+        file_name = os.path.basename(file_path)
+        delimiter = self.file_format_params.get("delimiter",",")
+        # line_terminator = "\n"
+        encoding = "utf-8"
+
+        self.log.info(f"Reading file from location: {file_path} in chunks of {self.chunk_size} rows")
+        with open_input(file_path, threads=self.decompress_threads) as input_stream:
+            # Read file as an iterator of DataFrames so only one chunk is held in memory
+            # Compressed files are decompressed as they are read
+            # Values are kept as the file's strings: dtypes inferred per chunk would differ between chunks (e.g. an
+            # integer column turning into 1.0 in a chunk with empty values) and drop leading zeros. Empty values and
+            # pandas' default NA tokens (NA, NULL, nan, ...) are still read as NaN and loaded as NULL by COPY
+            chunks = pd.read_csv(input_stream, delimiter=delimiter,  encoding=encoding, chunksize=self.chunk_size,
+                                 dtype=str)
+            first_chunk = next(chunks)
+
+            # Transform column names
+            file_columns = self.clean_column_names(first_chunk.columns)
+
+            # Connect to PostgreSQL
+            conn = conn or self.postgres_conn
+            cur = conn.cursor()
+
+            metadata = self.get_load_metadata(cur, file_name, dag_run_date)
+
+            table_name_split = self.full_table_name.split(".")
+
+            schema_name = table_name_split[1]
+            table_name = table_name_split[2]
+
+            pg_columns = self.get_table_columns(cur, schema_name, table_name)
+
+            # Map dataframe columns to PostgreSQL table columns (ignoring order)
+            cols = [col for col in file_columns + list(metadata) if col in pg_columns]
+            counter = {"rows": 0}
+
+            def iter_copy_chunks():
+                for df in itertools.chain([first_chunk], chunks):
+                    df.columns = file_columns
+                    # Add metadata columns
+                    for col, value in metadata.items():
+                        df[col] = value
+                    df = df[cols]
+                    counter["rows"] += len(df)
+
+                    buffer = StringIO()
+                    df.to_csv(buffer, index=False, header=False, sep=delimiter)
+                    yield buffer.getvalue().encode(encoding)
+
+            publish = target_table is None
+            if publish:
+                target_table = self.prepare_target_table(cur, schema_name, table_name, metadata["FILE_DATE"])
+            copy_sql = self.get_copy_sql(schema_name, target_table, cols, delimiter)
+
+            # Use COPY FROM for efficient bulk insert, chunks are serialized as COPY pulls them
+            cur.copy_expert(copy_sql, IterStream(iter_copy_chunks()))
+            if publish:
+                self.publish_target_table(cur, schema_name, table_name, target_table, metadata["FILE_DATE"])
+            conn.commit()
+
+        self.log.info(f"Successfully loaded {counter['rows']} records from {file_name} into {self.full_table_name}")
+        return counter['rows']
+
+    def stream_data_to_postgres(self, file_path, dag_run_date, conn=None, target_table=None):
+        """
+        Load a file without a temp copy or a DataFrame: the source stream is decoded, parsed and re-serialized
+        row by row (only the table's columns plus the metadata columns) and pulled by COPY FROM STDIN, so peak
+        memory is a few MB whatever the file size.
+        """
+        file_name = os.path.basename(file_path)
+        delimiter = self.file_format_params.get("delimiter",",")
+        encoding = self.encoding or "utf-8"
+
+        conn = conn or self.postgres_conn
+        cur = conn.cursor()
+        metadata = self.get_load_metadata(cur, file_name, dag_run_date)
+
+        table_name_split = self.full_table_name.split(".")
+        schema_name = table_name_split[1]
+        table_name = table_name_split[2]
+
+        pg_columns = self.get_table_columns(cur, schema_name, table_name)
+
+        with self.open_source(file_path) as stream:
+            text_stream = io.TextIOWrapper(stream, encoding=encoding, newline="")
+            reader = csv.reader(text_stream, delimiter=delimiter)
+            header = self.clean_column_names(next(reader))
+
+            # Map file columns to PostgreSQL table columns (ignoring order)
+            keep_indices = [index for index, col in enumerate(header) if col in pg_columns]
+            meta_cols = [col for col in metadata if col in pg_columns]
+            cols = [header[index] for index in keep_indices] + meta_cols
+            meta_values = ["" if metadata[col] is None else str(metadata[col]) for col in meta_cols]
+
+            publish = target_table is None
+            if publish:
+                target_table = self.prepare_target_table(cur, schema_name, table_name, metadata["FILE_DATE"])
+            copy_sql = self.get_copy_sql(schema_name, target_table, cols, delimiter)
+            counter = {}
+            copy_stream = IterStream(iter_csv_copy_chunks(reader, keep_indices, meta_values, delimiter,
+                                                          counter=counter))
+
+            cur.copy_expert(copy_sql, copy_stream)
+            if publish:
+                self.publish_target_table(cur, schema_name, table_name, target_table, metadata["FILE_DATE"])
+            conn.commit()
+
+        self.log.info(f"Successfully loaded {counter.get('rows', 0)} records from {file_name} into {self.full_table_name}")
+        return counter.get('rows', 0)
+
+    def get_column_defaults(self, cur, schema_name, table_name):
+        cur.execute("SELECT column_name, column_default FROM information_schema.columns "
+                    "WHERE table_schema = %s AND table_name = %s", (schema_name, table_name))
+        return {row[0].upper(): (row[0], row[1]) for row in cur.fetchall()}
+
+    def set_column_defaults(self, cur, schema_name, table_name, values, column_defaults):
+        for col, value in values.items():
+            cur.execute(f"""ALTER TABLE "{schema_name}"."{table_name}" ALTER COLUMN "{column_defaults[col][0]}" SET DEFAULT %s""",
+                        (None if value is None else str(value),))
+
+    def restore_column_defaults(self, cur, schema_name, table_name, cols, column_defaults):
+        for col in cols:
+            actual_col, previous_default = column_defaults[col]
+            if previous_default is None:
+                cur.execute(f"""ALTER TABLE "{schema_name}"."{table_name}" ALTER COLUMN "{actual_col}" DROP DEFAULT""")
+            else:
+                cur.execute(f"""ALTER TABLE "{schema_name}"."{table_name}" ALTER COLUMN "{actual_col}" SET DEFAULT {previous_default}""")
+
+    def passthrough_data_to_postgres(self, file_path, dag_run_date, conn=None, target_table=None):
+        """
+        Load a file whose header already names the table's columns without parsing it: the header is checked
+        against information_schema and stripped, the remaining raw bytes are streamed into COPY, and the metadata
+        columns are filled through column defaults that only exist inside the load transaction.
+        Falls back to the streaming mode when a file column does not exist in the table.
+        """
+        if target_table is not None:
+            # Per-file metadata defaults would lock the shared target table for the whole COPY of every file
+            return self.stream_data_to_postgres(file_path, dag_run_date, conn, target_table)
+
+        file_name = os.path.basename(file_path)
+        delimiter = self.file_format_params.get("delimiter",",")
+        encoding = self.encoding or "utf-8"
+
+        conn = conn or self.postgres_conn
+        cur = conn.cursor()
+        metadata = self.get_load_metadata(cur, file_name, dag_run_date)
+
+        table_name_split = self.full_table_name.split(".")
+        schema_name = table_name_split[1]
+        table_name = table_name_split[2]
+
+        column_defaults = self.get_column_defaults(cur, schema_name, table_name)
+        self.log.info(f"Table columns from postgres: {list(column_defaults)}")
+
+        with self.open_source(file_path) as stream:
+            header_line = stream.readline().decode(encoding).lstrip("\ufeff")
+            header = self.clean_column_names(next(csv.reader([header_line], delimiter=delimiter)))
+
+            unknown_cols = [col for col in header if col not in column_defaults]
+            if unknown_cols:
+                self.log.info(f"File columns {unknown_cols} are not in {self.full_table_name}, "
+                              f"falling back to the streaming load.")
+                fallback = True
+            else:
+                fallback = False
+                meta_cols = [col for col in metadata if col in column_defaults and col not in header]
+
+                meta_values = {col: metadata[col] for col in meta_cols}
+
+                if self.use_parallel_copy(cur, schema_name, table_name, file_path):
+                    rows_loaded = self.parallel_copy_file(cur, file_path, stream.tell(), schema_name, table_name,
+                                                          header, delimiter, encoding, meta_values, column_defaults,
+                                                          metadata["FILE_DATE"])
+                else:
+                    publish = target_table is None
+                    if publish:
+                        target_table = self.prepare_target_table(cur, schema_name, table_name, metadata["FILE_DATE"])
+
+                    # Defaults set inside the load transaction are never visible to other sessions
+                    self.set_column_defaults(cur, schema_name, target_table, meta_values, column_defaults)
+
+                    copy_sql = self.get_copy_sql(schema_name, target_table, header, delimiter, encoding=encoding)
+                    cur.copy_expert(copy_sql, IterStream(iter(lambda: stream.read(1024 * 1024), b"")))
+                    rows_loaded = cur.rowcount
+
+                    self.restore_column_defaults(cur, schema_name, target_table, meta_cols, column_defaults)
+                    if publish:
+                        self.publish_target_table(cur, schema_name, table_name, target_table, metadata["FILE_DATE"])
+                    conn.commit()
+
+        if fallback:
+            return self.stream_data_to_postgres(file_path, dag_run_date, conn, target_table)
+
+        self.log.info(f"Successfully loaded {rows_loaded} records from {file_name} into {self.full_table_name}")
+        return rows_loaded
+
+    def get_column_types(self, cur, schema_name, table_name):
+        cur.execute("SELECT column_name, data_type FROM information_schema.columns "
+                    "WHERE table_schema = %s AND table_name = %s", (schema_name, table_name))
+        return {row[0].upper(): row[1] for row in cur.fetchall()}
+
+    def get_wire_types(self, cols, column_types):
+        """
+        Resolve the binary wire type of every column from file_schema (the table type when a column is not
+        configured). Binary COPY needs the exact table type, so a configured type that differs from the table is
+        an error. Returns None when a column has a type the binary writer can't encode (e.g. numeric).
+        """
+        file_schema = {col.replace(" ", "_").upper(): spec for col, spec in self.file_schema.items()}
+        wire_types = {}
+        for col in cols:
+            table_type = normalize_type(column_types[col])
+            configured_type = file_schema.get(col)
+            wire_type = normalize_type(configured_type) if configured_type else table_type
+            if table_type is None or wire_type is None:
+                self.log.info(f"Column {col} of type {column_types[col]} can't be sent as binary COPY")
+                return None
+            if wire_type != table_type:
+                raise Exception(f"Column {col} is configured as {configured_type} in file_schema but is "
+                                f"{column_types[col]} in {self.full_table_name}")
+            wire_types[col] = wire_type
+        return wire_types
+
+    def binary_data_to_postgres(self, file_path, dag_run_date, conn=None, target_table=None):
+        """
+        Load a file with COPY ... (FORMAT binary): chunks of the file are read as strings, converted to the
+        configured types with vectorized pandas/NumPy conversions and encoded as PGCOPY tuples, so the server
+        skips text parsing and fixed-width values travel as 2-8 bytes. Metadata columns are encoded once and
+        appended to every tuple. Falls back to the streaming mode when a column type has no binary encoder.
+        """
+        file_name = os.path.basename(file_path)
+        delimiter = self.file_format_params.get("delimiter",",")
+        encoding = self.encoding or "utf-8"
+
+        conn = conn or self.postgres_conn
+        cur = conn.cursor()
+        metadata = self.get_load_metadata(cur, file_name, dag_run_date)
+
+        table_name_split = self.full_table_name.split(".")
+        schema_name = table_name_split[1]
+        table_name = table_name_split[2]
+
+        column_types = self.get_column_types(cur, schema_name, table_name)
+        self.log.info(f"Table column types from postgres: {column_types}")
+
+        with self.open_source(file_path) as stream:
+            # Only empty fields are NULL, as with COPY ... NULL '' in the other modes
+            chunks = pd.read_csv(stream, delimiter=delimiter, encoding=encoding, dtype=str, keep_default_na=False,
+                                 na_values=[""], chunksize=self.chunk_size)
+            first_chunk = next(chunks)
+            file_columns = self.clean_column_names(first_chunk.columns)
+
+            cols = [col for col in file_columns if col in column_types]
+            meta_cols = [col for col in metadata if col in column_types and col not in cols]
+            wire_types = self.get_wire_types(cols + meta_cols, column_types)
+
+            if wire_types is None:
+                self.log.info(f"Falling back to the streaming load for {file_name}.")
+                fallback = True
+            else:
+                fallback = False
+                constant_fields = [encode_value(metadata[col], wire_types[col]) for col in meta_cols]
+                counter = {"rows": 0}
+
+                def iter_copy_chunks():
+                    yield PGCOPY_HEADER
+                    for df in itertools.chain([first_chunk], chunks):
+                        df.columns = file_columns
+                        counter["rows"] += len(df)
+                        yield encode_batch(df[cols], wire_types, constant_fields)
+                    yield PGCOPY_TRAILER
+
+                publish = target_table is None
+                if publish:
+                    target_table = self.prepare_target_table(cur, schema_name, table_name, metadata["FILE_DATE"])
+                copy_cols = ", ".join(f'"{col}"' for col in cols + meta_cols)
+                copy_sql = f"""COPY "{schema_name}"."{target_table}" ({copy_cols}) FROM STDIN WITH (FORMAT binary)"""
+                self.log.info(f"Copy sql: {copy_sql}")
+
+                cur.copy_expert(copy_sql, IterStream(iter_copy_chunks()))
+                if publish:
+                    self.publish_target_table(cur, schema_name, table_name, target_table, metadata["FILE_DATE"])
+                conn.commit()
+
+        if fallback:
+            return self.stream_data_to_postgres(file_path, dag_run_date, conn, target_table)
+
+        self.log.info(f"Successfully loaded {counter['rows']} records from {file_name} into {self.full_table_name}")
+        return counter['rows']
+
+    def create_shadow_table(self, cur, schema_name, table_name, unlogged=True, swap=False):
+        """
+        Create an empty copy of the table's columns and defaults to load into. A shadow table that is swapped in
+        also copies constraints, identity, storage and comments, but not the indexes (built after the load).
+        """
+        shadow_table = f"{table_name[:40]}__load_{uuid.uuid4().hex[:8]}"
+        including = "INCLUDING ALL EXCLUDING INDEXES" if swap else "INCLUDING DEFAULTS"
+        cur.execute(f"""CREATE {'UNLOGGED ' if unlogged else ''}TABLE "{schema_name}"."{shadow_table}" (LIKE "{schema_name}"."{table_name}" {including})""")
+        self.log.info(f"Created shadow table {schema_name}.{shadow_table}")
+        return shadow_table
+
+    def get_swap_blocker(self, cur, schema_name, table_name):
+        """Return why the table can't be replaced by a renamed shadow table, or None when it can."""
+        cur.execute("SELECT relkind, relispartition FROM pg_class WHERE oid = %s::regclass",
+                    (f'"{schema_name}"."{table_name}"',))
+        relkind, relispartition = cur.fetchone()
+        if relkind != "r" or relispartition:
+            return "it is partitioned or a partition"
+        cur.execute("""
+            SELECT count(*) FROM pg_depend d JOIN pg_rewrite r ON r.oid = d.objid
+            WHERE d.refobjid = %(table)s::regclass AND d.classid = 'pg_rewrite'::regclass AND r.ev_class <> d.refobjid""",
+                    {"table": f'"{schema_name}"."{table_name}"'})
+        if cur.fetchone()[0]:
+            return "views depend on it"
+        cur.execute("SELECT count(*) FROM pg_constraint WHERE confrelid = %s::regclass AND conrelid <> confrelid",
+                    (f'"{schema_name}"."{table_name}"',))
+        if cur.fetchone()[0]:
+            return "foreign keys reference it"
+        cur.execute("""
+            SELECT count(*) FROM pg_depend d JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+            WHERE d.refobjid = %s::regclass AND d.deptype = 'a'""", (f'"{schema_name}"."{table_name}"',))
+        if cur.fetchone()[0]:
+            # Serial sequences are owned by the old table and would be dropped with it
+            return "it owns serial sequences"
+        cur.execute("SELECT count(*) FROM pg_attribute WHERE attrelid = %s::regclass AND attidentity <> '' AND NOT attisdropped",
+                    (f'"{schema_name}"."{table_name}"',))
+        if cur.fetchone()[0]:
+            # LIKE gives the shadow table new identity sequences, starting over at 1
+            return "it has identity columns"
+        cur.execute("SELECT count(*) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal",
+                    (f'"{schema_name}"."{table_name}"',))
+        if cur.fetchone()[0]:
+            return "it has triggers"
+        cur.execute("""
+            SELECT c.relrowsecurity OR EXISTS (SELECT 1 FROM pg_policy p WHERE p.polrelid = c.oid)
+            FROM pg_class c WHERE c.oid = %s::regclass""", (f'"{schema_name}"."{table_name}"',))
+        if cur.fetchone()[0]:
+            return "it has row level security policies"
+        cur.execute("SELECT pg_get_userbyid(relowner) <> current_user FROM pg_class WHERE oid = %s::regclass",
+                    (f'"{schema_name}"."{table_name}"',))
+        if cur.fetchone()[0]:
+            # The shadow table would be owned by the loading user
+            return "it is owned by another role"
+        cur.execute("SELECT count(*) FROM pg_publication_rel WHERE prrelid = %s::regclass",
+                    (f'"{schema_name}"."{table_name}"',))
+        if cur.fetchone()[0]:
+            return "it is in a publication"
+        return None
+
+    def use_swap(self, cur, schema_name, table_name):
+        if self.load_strategy != "swap":
+            return False
+        blocker = self.get_swap_blocker(cur, schema_name, table_name)
+        if blocker:
+            self.log.info(f"Can't swap {schema_name}.{table_name} because {blocker}, truncating it instead.")
+            return False
+        return True
+
+    def is_unlogged(self, cur, schema_name, table_name):
+        cur.execute("SELECT relpersistence FROM pg_class WHERE oid = %s::regclass", (f'"{schema_name}"."{table_name}"',))
+        return cur.fetchone()[0] == "u"
+
+    def prepare_target_table(self, cur, schema_name, table_name, partition_value=None, unlogged=False):
+        """
+        Return the table the load COPYs into: the truncated table itself, a shadow table to swap in or to attach
+        as the partition_value partition, or (unlogged=True, for loads on other connections) a shadow table whose
+        rows are inserted into the truncated table. self.publish_method records how it is published.
+        """
+        if self.load_strategy == "partition":
+            self.publish_method = "attach"
+            self.staging_table = self.create_partition_staging_table(cur, schema_name, table_name, partition_value,
+                                                                     unlogged)
+            # LIKE locks the parent (ACCESS SHARE) until commit. Held through the COPY, it would deadlock with the
+            # DETACH (ACCESS EXCLUSIVE) of a concurrent load of another date
+            cur.connection.commit()
+            return self.staging_table
+        if self.use_swap(cur, schema_name, table_name):
+            self.publish_method = "swap"
+            # Created in the load transaction, so COPY can skip WAL with wal_level=minimal
+            return self.create_shadow_table(cur, schema_name, table_name, swap=True,
+                                            unlogged=unlogged or self.is_unlogged(cur, schema_name, table_name))
+        if unlogged:
+            self.publish_method = "insert"
+            return self.create_shadow_table(cur, schema_name, table_name)
+        self.publish_method = None
+        self.truncate_table(cur, schema_name, table_name)
+        return table_name
+
+    def publish_target_table(self, cur, schema_name, table_name, target_table, partition_value=None):
+        if self.publish_method == "attach":
+            self.attach_partition(cur, schema_name, table_name, target_table, partition_value)
+        elif self.publish_method == "swap":
+            self.swap_shadow_table(cur, schema_name, table_name, target_table)
+        elif self.publish_method == "insert":
+            self.publish_shadow_table(cur, schema_name, table_name, target_table)
+
+    def create_partition_staging_table(self, cur, schema_name, table_name, partition_value, unlogged=False):
+        """
+        Create the table that becomes the partition_value partition. Its CHECK constraint rejects rows of another
+        FILE_DATE during the COPY and lets ATTACH PARTITION skip the validation scan.
+        """
+        cur.execute("SELECT pg_get_partkeydef(%s::regclass)", (f'"{schema_name}"."{table_name}"',))
+        partition_key = cur.fetchone()[0]
+        if not partition_key or not re.fullmatch(r'LIST \("?FILE_DATE"?\)', partition_key, re.IGNORECASE):
+            raise Exception(f"{schema_name}.{table_name} must be partitioned by LIST (\"FILE_DATE\") for the partition "
+                            f"load_strategy, found: {partition_key}")
+        if not partition_value:
+            raise Exception(f"No FILE_DATE to load into a partition of {schema_name}.{table_name}")
+
+        staging_table = self.create_shadow_table(cur, schema_name, table_name, unlogged=unlogged, swap=True)
+        cur.execute(f"""ALTER TABLE "{schema_name}"."{staging_table}" ADD CONSTRAINT "{staging_table}_file_date" 
+                    CHECK ("FILE_DATE" IS NOT NULL AND "FILE_DATE" = %s)""", (partition_value,))
+        return staging_table
+
+    def attach_partition(self, cur, schema_name, table_name, staging_table, partition_value):
+        """
+        Replace the partition_value partition by the loaded staging table in one short transaction (the caller
+        commits): the old partition is detached and dropped, the staging table is attached and renamed. The
+        parent's indexes are built on the staging table first, and the load is committed before DETACH locks the
+        parent, so ATTACH only attaches them and the transaction holding the lock holds no other lock on the
+        parent. It waits at most partition_lock_timeout for the lock.
+        """
+        if self.is_unlogged(cur, schema_name, staging_table):
+            cur.execute(f"""ALTER TABLE "{schema_name}"."{staging_table}" SET LOGGED""")
+        # ATTACH clones the parent's foreign keys itself
+        self.build_shadow_indexes(cur, schema_name, table_name, staging_table, foreign_keys=False)
+        cur.execute(f"""ANALYZE "{schema_name}"."{staging_table}" """)
+        cur.connection.commit()
+
+        cur.execute("SET LOCAL lock_timeout = %s", (self.partition_lock_timeout,))
+
+        partition_name = f"{table_name[:48]}_{re.sub(r'[^0-9A-Za-z]', '', str(partition_value))}"
+        cur.execute(postgres_file_date_partition_query,
+                    (f'"{schema_name}"."{table_name}"', f"FOR VALUES IN ('{partition_value}')"))
+        old_partitions = [row[0] for row in cur.fetchall()]
+
+        start = time.monotonic()
+        for old_partition in old_partitions:
+            cur.execute(f"""ALTER TABLE "{schema_name}"."{table_name}" DETACH PARTITION "{schema_name}"."{old_partition}" """)
+            cur.execute(f"""DROP TABLE "{schema_name}"."{old_partition}" """)
+        cur.execute(f"""ALTER TABLE "{schema_name}"."{table_name}" ATTACH PARTITION "{schema_name}"."{staging_table}" FOR VALUES IN (%s)""",
+                    (partition_value,))
+        cur.execute(f"""ALTER TABLE "{schema_name}"."{staging_table}" DROP CONSTRAINT "{staging_table}_file_date" """)
+        cur.execute(f"""ALTER TABLE "{schema_name}"."{staging_table}" RENAME TO "{partition_name}" """)
+        self.log.info(f"Attached {schema_name}.{partition_name} for FILE_DATE {partition_value} "
+                      f"(replaced {old_partitions}) in {time.monotonic() - start:.3f}s")
+
+    def build_shadow_indexes(self, cur, schema_name, table_name, shadow_table, foreign_keys=True):
+        """
+        Recreate the table's indexes, index-backed constraints and (foreign_keys=True) foreign keys on the loaded
+        shadow table. Index names are unique per schema, so they get temporary names; returns the renames to apply
+        after the swap.
+        """
+        cur.execute("""
+            SELECT i.relname, pg_get_indexdef(i.oid), c.conname, pg_get_constraintdef(c.oid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.conrelid = x.indrelid AND c.contype IN ('p', 'u', 'x')
+            WHERE x.indrelid = %s::regclass""", (f'"{schema_name}"."{table_name}"',))
+        renames = []
+        for number, (index_name, index_def, constraint_name, constraint_def) in enumerate(cur.fetchall()):
+            temp_name = f"{shadow_table}_{number}"
+            if constraint_name:
+                cur.execute(f"""ALTER TABLE "{schema_name}"."{shadow_table}" ADD CONSTRAINT "{temp_name}" {constraint_def}""")
+                renames.append(("constraint", temp_name, constraint_name))
+            else:
+                index_def = re.sub(r'^(CREATE (?:UNIQUE )?INDEX )("[^"]+"|\S+) ON (ONLY )?("[^"]+"|\S+)\.("[^"]+"|\S+)',
+                                   lambda match: f'{match.group(1)}"{temp_name}" ON "{schema_name}"."{shadow_table}"',
+                                   index_def)
+                cur.execute(index_def)
+                renames.append(("index", temp_name, index_name))
+            self.log.info(f"Built {index_name} on {schema_name}.{shadow_table}")
+
+        if not foreign_keys:
+            return renames
+        cur.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                    (f'"{schema_name}"."{table_name}"',))
+        for constraint_name, constraint_def in cur.fetchall():
+            cur.execute(f"""ALTER TABLE "{schema_name}"."{shadow_table}" ADD CONSTRAINT "{constraint_name}" {constraint_def}""")
+        return renames
+
+    def copy_table_grants(self, cur, schema_name, table_name, shadow_table):
+        cur.execute("SELECT grantee, privilege_type FROM information_schema.role_table_grants "
+                    "WHERE table_schema = %s AND table_name = %s AND grantee <> current_user", (schema_name, table_name))
+        for grantee, privilege in cur.fetchall():
+            grantee = "PUBLIC" if grantee == "PUBLIC" else f'"{grantee}"'
+            cur.execute(f"""GRANT {privilege} ON "{schema_name}"."{shadow_table}" TO {grantee}""")
+
+    def swap_shadow_table(self, cur, schema_name, table_name, shadow_table):
+        """
+        Replace the table by the loaded shadow table. Indexes, grants and (for a logged table) the WAL-logged copy
+        are built first, without blocking readers; the table is only locked to drop it and rename the shadow table
+        in place. The caller commits.
+        """
+        if not self.is_unlogged(cur, schema_name, table_name) and self.is_unlogged(cur, schema_name, shadow_table):
+            cur.execute(f"""ALTER TABLE "{schema_name}"."{shadow_table}" SET LOGGED""")
+        renames = self.build_shadow_indexes(cur, schema_name, table_name, shadow_table)
+        self.copy_table_grants(cur, schema_name, table_name, shadow_table)
+        cur.execute(f"""ANALYZE "{schema_name}"."{shadow_table}" """)
+
+        start = time.monotonic()
+        cur.execute(f"""LOCK TABLE "{schema_name}"."{table_name}" IN ACCESS EXCLUSIVE MODE""")
+        cur.execute(f"""DROP TABLE "{schema_name}"."{table_name}" """)
+        cur.execute(f"""ALTER TABLE "{schema_name}"."{shadow_table}" RENAME TO "{table_name}" """)
+        for kind, temp_name, name in renames:
+            if kind == "constraint":
+                # Renaming an index-backed constraint renames its index as well
+                cur.execute(f"""ALTER TABLE "{schema_name}"."{table_name}" RENAME CONSTRAINT "{temp_name}" TO "{name}" """)
+            else:
+                cur.execute(f"""ALTER INDEX "{schema_name}"."{temp_name}" RENAME TO "{name}" """)
+        self.log.info(f"Swapped {schema_name}.{shadow_table} in as {schema_name}.{table_name} "
+                      f"in {time.monotonic() - start:.3f}s")
+
+    def publish_shadow_table(self, cur, schema_name, table_name, shadow_table):
+        """Replace the table's rows with the shadow table's rows; the caller commits, so readers see all or nothing."""
+        self.truncate_table(cur, schema_name, table_name)
+        cur.execute(f"""INSERT INTO "{schema_name}"."{table_name}" SELECT * FROM "{schema_name}"."{shadow_table}" """)
+        self.drop_shadow_table(cur, schema_name, shadow_table)
+
+    def drop_shadow_table(self, cur, schema_name, shadow_table):
+        cur.execute(f"""DROP TABLE IF EXISTS "{schema_name}"."{shadow_table}" """)
+
+    def copy_range(self, copy_sql, file_path, start, end):
+        """COPY one byte range of the file on its own connection, committed into the shadow table."""
+        conn = PostgresHook(postgres_conn_id=self.db_conn_id).get_conn()
+        try:
+            with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                cur = conn.cursor()
+                cur.copy_expert(copy_sql, IterStream(iter_buffer_range(buffer, start, end)))
+                rows = cur.rowcount
+            conn.commit()
+            self.log.info(f"Loaded {rows} records from bytes {start}-{end} of {file_path}")
+            return rows
+        finally:
+            conn.close()
+
+    def use_parallel_copy(self, cur, schema_name, table_name, file_path):
+        """
+        The parallel COPY is only used when its shadow table is published without copying its rows: attached as
+        the partition or swapped in. A swap that is blocked (see get_swap_blocker) loads in a single COPY stream.
+        """
+        if self.copy_parallelism <= 1 or self.s3_client is not None or self.is_compressed(file_path):
+            return False
+        if self.load_strategy == "partition" or self.use_swap(cur, schema_name, table_name):
+            return True
+        self.log.info(f"Loading {file_path} in a single COPY stream into the truncated {schema_name}.{table_name}.")
+        return False
+
+    def parallel_copy_file(self, cur, file_path, data_start, schema_name, table_name, cols, delimiter, encoding,
+                           meta_values, column_defaults, partition_value=None):
+        """
+        Split the memory-mapped file at record boundaries into copy_parallelism ranges and COPY them concurrently
+        on separate connections into a shadow table, then publish the shadow table in a single transaction.
+        The table ends up either fully loaded or untouched: a failed range only drops the shadow table.
+        """
+        shadow_table = self.prepare_target_table(cur, schema_name, table_name, partition_value, unlogged=True)
+        try:
+            self.set_column_defaults(cur, schema_name, shadow_table, meta_values, column_defaults)
+            self.postgres_conn.commit()
+
+            with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                ranges = split_csv_ranges(buffer, data_start, self.copy_parallelism)
+            self.log.info(f"Loading {file_path} as {len(ranges)} parallel COPY streams: {ranges}")
+
+            copy_sql = self.get_copy_sql(schema_name, shadow_table, cols, delimiter, encoding=encoding)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                rows_loaded = sum(executor.map(lambda byte_range: self.copy_range(copy_sql, file_path, *byte_range),
+                                               ranges))
+
+            self.restore_column_defaults(cur, schema_name, shadow_table, meta_values, column_defaults)
+            self.publish_target_table(cur, schema_name, table_name, shadow_table, partition_value)
+            self.postgres_conn.commit()
+            return rows_loaded
+        except Exception:
+            self.postgres_conn.rollback()
+            self.drop_shadow_table(cur, schema_name, shadow_table)
+            self.postgres_conn.commit()
+            raise
+
+    def load_files_to_postgres(self, file_paths, dag_run_date):
+        """
+        Load every file of the batch into one target: a shadow (or partition staging) table is created and
+        committed, the files are COPYed into it concurrently over a pool of file_load_parallelism connections
+        (each file with its own FILE_NAME/FILE_DATE metadata), then it is published with a single commit.
+        A failed file only drops the shadow table, the live table is untouched.
+        """
+        cur = self.postgres_conn.cursor()
+        table_name_split = self.full_table_name.split(".")
+        schema_name = table_name_split[1]
+        table_name = table_name_split[2]
+
+        file_dates = {self.get_load_metadata(cur, os.path.basename(file_path), dag_run_date)["FILE_DATE"]
+                      for file_path in file_paths}
+        if self.load_strategy == "partition" and len(file_dates) > 1:
+            raise Exception(f"Files {file_paths} span several FILE_DATEs {sorted(file_dates)}, "
+                            f"the partition load_strategy replaces one FILE_DATE partition per load")
+        partition_value = sorted(file_dates)[0]
+
+        target_table = self.prepare_target_table(cur, schema_name, table_name, partition_value, unlogged=True)
         self.postgres_conn.commit()
 
-        self.log.info(f"Successfully loaded {len(df)} records from {file_name} into {self.full_table_name}")
+        pool_size = max(1, min(self.file_load_parallelism, len(file_paths)))
+        connections = queue.Queue()
+        for _ in range(pool_size):
+            connections.put(PostgresHook(postgres_conn_id=self.db_conn_id).get_conn())
+
+        def load_file(file_path):
+            conn = connections.get()
+            try:
+                return self.load_data_to_postgres(file_path, dag_run_date, conn, target_table)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                connections.put(conn)
+
+        try:
+            self.log.info(f"Loading {len(file_paths)} files into {schema_name}.{target_table} over {pool_size} connections")
+            with ThreadPoolExecutor(max_workers=pool_size) as executor:
+                rows_loaded = sum(executor.map(load_file, file_paths))
+
+            self.publish_target_table(cur, schema_name, table_name, target_table, partition_value)
+            self.postgres_conn.commit()
+        except Exception:
+            self.postgres_conn.rollback()
+            self.drop_shadow_table(cur, schema_name, target_table)
+            self.postgres_conn.commit()
+            raise
+        finally:
+            while not connections.empty():
+                connections.get().close()
+
+        self.log.info(f"Successfully loaded {rows_loaded} records from {len(file_paths)} files into {self.full_table_name}")
+        return rows_loaded
 
     def get_all_upstream_task_ids(self, context):
         """Get all upstream task IDs recursively by traversing the DAG structure in BFS order."""
@@ -185,11 +896,76 @@ class CopyFileToPostgresOperator(BaseOperator):
         
         return upstream_task_ids
 
+    def get_file_details(self,run_date):
+        temp_dir = tempfile.mkdtemp()
+        local_dir = os.path.join(temp_dir, "configs", self.dataset_name)
+
+        Path(local_dir).mkdir(exist_ok=True,parents=True)
+        self.log.info(f"Temporary directory created:{local_dir} to load configs" )
+
+        if self.bucket_name and self.bucket_name != "None":
+            # Use S3 to download configs
+            s3_folder = f"{os.path.join(self.configs_path, self.dataset_name)}"  # "dataset_configs/dev"
+            # Strip S3 protocol and bucket name from prefix if present
+            if s3_folder.startswith('s3://'):
+                s3_folder = s3_folder[5:]
+                if s3_folder.startswith(self.bucket_name + '/'):
+                    s3_folder = s3_folder[len(self.bucket_name)+1:]
+            s3_utils.download_s3_folder(self.s3_conn_id, self.bucket_name, s3_folder, local_dir)
+            self.log.info(f"Configs downloaded from S3 to {local_dir}")
+            # Verify files were actually downloaded
+            if not any(os.path.exists(os.path.join(local_dir, f)) for f in os.listdir(local_dir)):
+                raise Exception(f"No config files found in S3 at prefix '{s3_folder}' in bucket '{self.bucket_name}'. Local directory '{local_dir}' is empty after download attempt.")
+        else:
+            # Use local config path
+            source_dir = os.path.join(self.configs_path, self.dataset_name)
+            if os.path.exists(source_dir):
+                import shutil
+                shutil.copytree(source_dir, local_dir, dirs_exist_ok=True)
+                self.log.info(f"Configs copied from local path {source_dir} to {local_dir}")
+            else:
+                raise Exception(f"Local config path {source_dir} does not exist")
+
+        reader = ConfigReaderDBT(dataset_configs_path=local_dir,
+                                 dataset_name=self.dataset_name,
+                                 run_date=run_date)
+        configs = reader.get_configs()
+        self.log.info(f"Configs Read:{configs} ")
+        return local_dir,configs
+
     def execute(self, context):
         self.log.info(f"upstream_task_ids: {self.upstream_task_ids}")
         all_upstream_task_ids = self.get_all_upstream_task_ids(context)
         self.log.info(f"""all upstream task ids: {all_upstream_task_ids}""")
-        file_path = context['ti'].xcom_pull(task_ids=all_upstream_task_ids[1],key='downloaded_file_path')
         dag_run_date = datetime.fromtimestamp(context["data_interval_end"].timestamp(), pendulum.tz.UTC).strftime(
             '%Y-%m-%d')
-        self.load_data_to_postgres(file_path,dag_run_date)
\ No newline at end of file
+        if self.load_mode == "binary" and not self.file_schema and self.configs_path and self.dataset_name:
+            configs_downloaded_tmp_dir,configs = self.get_file_details(dag_run_date)
+            self.file_schema = configs[self.dataset_name]["mirror"]["file_schema"]
+            self.log.info(f"File schema from configs: {self.file_schema}")
+        if self.load_all_files:
+            if self.load_mode in ("streaming", "passthrough", "binary"):
+                file_paths = find_upstream_xcom(context, "files_found")
+            else:
+                # Local copies of every file pushed by DownloadOperator
+                file_paths = find_upstream_xcom(context, "files")
+            if not file_paths:
+                raise Exception("No files to load were pushed by the upstream tasks")
+            self.load_files_to_postgres(file_paths, dag_run_date)
+            return
+
+        if self.load_mode in ("streaming", "passthrough", "binary"):
+            # Read the acquired file directly, no DownloadOperator temp copy is needed
+            file_path = find_upstream_xcom(context, "files_found")[-1]
+        else:
+            file_path = context['ti'].xcom_pull(task_ids=all_upstream_task_ids[1],key='downloaded_file_path')
+        try:
+            self.load_data_to_postgres(file_path,dag_run_date)
+        except Exception:
+            if self.staging_table:
+                # Committed before the COPY, so the rollback doesn't drop it
+                self.postgres_conn.rollback()
+                self.drop_shadow_table(self.postgres_conn.cursor(), self.full_table_name.split(".")[1],
+                                       self.staging_table)
+                self.postgres_conn.commit()
+            raise
\ No newline at end of file
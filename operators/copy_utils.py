@@ -0,0 +1,110 @@
+import csv
+import io
+
+
+class IterStream:
+    """
+    Read-only file-like object over an iterator of bytes chunks, so a generator can be handed to
+    cursor.copy_expert() and be consumed as COPY FROM STDIN pulls data, without materializing the file.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer.extend(next(self.chunks))
+            except StopIteration:
+                break
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        while b"\n" not in self.buffer:
+            try:
+                self.buffer.extend(next(self.chunks))
+            except StopIteration:
+                break
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return data
+
+
+def iter_csv_copy_chunks(reader, keep_indices, extra_values, delimiter, encoding="utf-8", counter=None,
+                         chunk_bytes=1024 * 1024):
+    """
+    Re-serialize rows of a csv.reader for COPY ... CSV, keeping only the columns at keep_indices and
+    appending extra_values (the metadata columns) to every row. Yields encoded chunks of about
+    chunk_bytes. Rows are counted locally and added to counter["rows"] once the reader is exhausted
+    (before the last chunk is yielded), so the count is only complete after COPY has pulled every chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+    rows = 0
+    for row in reader:
+        writer.writerow([row[index] if index < len(row) else "" for index in keep_indices] + extra_values)
+        rows += 1
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode(encoding)
+            buffer.seek(0)
+            buffer.truncate()
+    if counter is not None:
+        counter["rows"] = counter.get("rows", 0) + rows
+    if buffer.tell():
+        yield buffer.getvalue().encode(encoding)
+
+
+def count_quotes(buffer, start, end, block_bytes=64 * 1024 * 1024):
+    quotes = 0
+    for offset in range(start, end, block_bytes):
+        quotes += buffer[offset:min(offset + block_bytes, end)].count(b'"')
+    return quotes
+
+
+def split_csv_ranges(buffer, start, parts):
+    """
+    Split buffer[start:] (e.g. a memory-mapped CSV file without its header) into up to parts byte ranges
+    that each begin right after a newline. A newline only ends a record when an even number of quote
+    characters precedes it (escaped quotes are doubled, so they keep the parity), which keeps quoted
+    newlines inside their range.
+    """
+    size = len(buffer)
+    boundaries = [start]
+    position = start
+    quotes = 0
+    for part in range(1, parts):
+        target = start + (size - start) * part // parts
+        if target <= position:
+            continue
+        quotes += count_quotes(buffer, position, target)
+        position = target
+        while True:
+            newline = buffer.find(b"\n", position)
+            if newline == -1:
+                position = size
+                break
+            quotes += count_quotes(buffer, position, newline)
+            position = newline + 1
+            if quotes % 2 == 0:
+                break
+        if position >= size:
+            break
+        boundaries.append(position)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def iter_buffer_range(buffer, start, end, chunk_bytes=1024 * 1024):
+    for offset in range(start, end, chunk_bytes):
+        yield buffer[offset:min(offset + chunk_bytes, end)]
@@ -0,0 +1,36 @@
+def get_all_upstream_task_ids(context):
+    """Get all upstream task IDs recursively by traversing the DAG structure in BFS order."""
+    dag = context['dag']
+    current_task_id = context['task'].task_id
+
+    # Get all tasks in the DAG
+    all_tasks = {task.task_id: task for task in dag.tasks}
+
+    # Find all upstream tasks recursively using BFS to maintain order
+    upstream_task_ids = []
+    visited = set()
+    queue = [current_task_id]
+
+    while queue:
+        task_id = queue.pop(0)
+        if task_id in visited:
+            continue
+        visited.add(task_id)
+
+        task = all_tasks.get(task_id)
+        if task:
+            for upstream_task_id in task.upstream_task_ids:
+                if upstream_task_id not in visited and upstream_task_id not in upstream_task_ids:
+                    upstream_task_ids.append(upstream_task_id)
+                    queue.append(upstream_task_id)
+
+    return upstream_task_ids
+
+
+def find_upstream_xcom(context, key):
+    """Pull key from the nearest upstream task (in BFS order) that pushed it."""
+    for task_id in get_all_upstream_task_ids(context):
+        value = context['ti'].xcom_pull(task_ids=task_id, key=key)
+        if value:
+            return value
+    return None
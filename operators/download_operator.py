@@ -1,21 +1,46 @@
 import os
+import shutil
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 from airflow.models import BaseOperator
 from airflow.providers.amazon.aws.hooks.s3 import S3Hook
+from boto3.s3.transfer import TransferConfig
 from datetime import datetime
 import pendulum
 
+from operators.cache_utils import DownloadCache
+
+# Objects above the threshold are fetched as parallel byte-range GETs of multipart_chunksize each
+default_transfer_config = {
+    "multipart_threshold": 64 * 1024 * 1024,
+    "multipart_chunksize": 16 * 1024 * 1024,
+    "max_concurrency": 8,
+}
+
+
 class DownloadOperator(BaseOperator):
 
-    def __init__(self, s3_conn_id=None, bucket_name=None, dataset_dir=None, file_name=None, datetime_pattern=None, *args, **kwargs):
+    def __init__(self, s3_conn_id=None, bucket_name=None, dataset_dir=None, file_name=None, datetime_pattern=None,
+                 max_download_workers=4, transfer_config=None, cache_dir=None, cache_max_bytes=10 * 1024 ** 3,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.bucket_name = bucket_name
         self.datetime_pattern = datetime_pattern
         self.file_pattern = file_name
         self.dataset_dir = dataset_dir
         self.s3_conn_id = s3_conn_id
+        # Number of files downloaded concurrently
+        self.max_download_workers = max_download_workers
+        # TransferConfig arguments overriding default_transfer_config, e.g. {"multipart_chunksize": 32 * 1024 * 1024}
+        self.transfer_config = TransferConfig(**{**default_transfer_config, **(transfer_config or {})})
+        # Optional worker-local cache shared by retries and backfills, disabled when cache_dir is None. Opened in
+        # execute(), so DAG parsing doesn't create the directory
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.cache = None
         
         # Only initialize S3 client if bucket_name is provided and not None/empty string
         if bucket_name and bucket_name != "None":
@@ -55,6 +80,7 @@ class DownloadOperator(BaseOperator):
 
         temp_dir = tempfile.mkdtemp()
         self.log.info(f"Temporary directory created at: {temp_dir}")
+        self.cache = DownloadCache(self.cache_dir, self.cache_max_bytes) if self.cache_dir else None
 
         self.log.info(f"""data_interval_end:{context["data_interval_end"]}""")
 
@@ -73,32 +99,78 @@ class DownloadOperator(BaseOperator):
 
         try:
 
-            # Download or copy the file
-            files_downloaded = []
-            for file_name in files_found:
-                download_path = os.path.join(temp_dir, os.path.basename(file_pattern))
-                
-                if self.s3_client is None:
-                    # Use local file system - copy from dataset_dir
-                    self.log.info(
-                        f"Copying file '{file_name}' from local path to '{download_path}'.")
-                    import shutil
-                    shutil.copy2(file_name, download_path)
-                    files_downloaded.append(download_path)
-                    self.log.info(f"File '{file_name}' successfully copied to '{download_path}'.")
-                else:
-                    # Use S3 - download from bucket
-                    self.log.info(
-                        f"Downloading file '{file_name}' from bucket '{self.bucket_name}' to '{download_path}'.")
-
-                    self.s3_client.download_file(self.bucket_name, file_name, download_path)
-                    files_downloaded.append(download_path)
-                    self.log.info(f"File '{file_name}' successfully downloaded to '{download_path}'.")
+            # Every file gets its own destination, files sharing a basename go to numbered sub-directories
+            download_paths = []
+            seen_names = set()
+            for index, file_name in enumerate(files_found):
+                base_name = os.path.basename(file_name)
+                download_dir = temp_dir if base_name not in seen_names else os.path.join(temp_dir, str(index))
+                os.makedirs(download_dir, exist_ok=True)
+                seen_names.add(base_name)
+                download_paths.append(os.path.join(download_dir, base_name))
+
+            # Download or copy the files concurrently
+            started_at = time.monotonic()
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_download_workers, len(files_found)))) as executor:
+                file_metrics = list(executor.map(self.download_file, files_found, download_paths))
+            elapsed = time.monotonic() - started_at
+
+            files_downloaded = [metrics["path"] for metrics in file_metrics]
+            download_path = files_downloaded[-1]
+            total_bytes = sum(metrics["bytes"] for metrics in file_metrics)
+            download_metrics = {
+                "files": file_metrics,
+                "total_bytes": total_bytes,
+                "total_seconds": round(elapsed, 3),
+                "total_mb_per_sec": round(total_bytes / (1024 * 1024) / elapsed, 2) if elapsed > 0 else None,
+            }
+            self.log.info(f"Downloaded {len(files_downloaded)} files ({total_bytes} bytes) in {elapsed:.2f}s: {download_metrics}")
 
             context['ti'].xcom_push(key='downloaded_file_path',value=download_path)
             context['ti'].xcom_push(key='files', value=files_downloaded)
+            context['ti'].xcom_push(key='download_metrics', value=download_metrics)
 
             return download_path
         except Exception as ex:
             self.log.error(ex.__str__())
-            return None
\ No newline at end of file
+            return None
+
+    def get_cache_key(self, file_name):
+        if self.s3_client is None:
+            stat = os.stat(file_name)
+            return DownloadCache.make_key("local", os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size)
+        etag = self.s3_client.head_object(Bucket=self.bucket_name, Key=file_name)["ETag"]
+        return DownloadCache.make_key("s3", self.bucket_name, file_name, etag)
+
+    def fetch_file(self, file_name, download_path):
+        if self.s3_client is None:
+            # Use local file system - copy from dataset_dir
+            shutil.copy2(file_name, download_path)
+        else:
+            # Use S3 - download from bucket, large objects as parallel ranged GETs
+            self.s3_client.download_file(self.bucket_name, file_name, download_path, Config=self.transfer_config)
+
+    def download_file(self, file_name, download_path):
+        started_at = time.monotonic()
+        source = "local path" if self.s3_client is None else f"bucket '{self.bucket_name}'"
+        cache_hit = False
+        if self.cache is not None:
+            cache_hit, method = self.cache.fetch(self.get_cache_key(file_name), download_path,
+                                                 lambda cache_path: self.fetch_file(file_name, cache_path))
+            state = "Cache hit" if cache_hit else "Cache miss"
+            self.log.info(f"{state} for '{file_name}' from {source}, {method} to '{download_path}'.")
+        else:
+            self.log.info(f"Fetching file '{file_name}' from {source} to '{download_path}'.")
+            self.fetch_file(file_name, download_path)
+            self.log.info(f"File '{file_name}' successfully fetched to '{download_path}'.")
+
+        elapsed = time.monotonic() - started_at
+        size = os.path.getsize(download_path)
+        return {
+            "file": file_name,
+            "path": download_path,
+            "bytes": size,
+            "seconds": round(elapsed, 3),
+            "mb_per_sec": round(size / (1024 * 1024) / elapsed, 2) if elapsed > 0 else None,
+            "cache_hit": cache_hit,
+        }
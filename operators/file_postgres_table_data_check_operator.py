@@ -1,5 +1,7 @@
 import os
+import queue
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
@@ -10,11 +12,19 @@ from core_utils import s3_utils
 from core_utils.config_reader_dbt import ConfigReaderDBT
 
 from operators.constants import file_schema_query, file_cols_query, postgres_table_schema_query, \
-    postgres_col_count_query
+    postgres_profile_columns_query, postgres_col_profile_query, postgres_file_date_partition_query, \
+    postgres_exact_distinct_sql, postgres_hll_distinct_sql, postgres_hll_extension_query, postgres_column_types_query
+from operators.input_utils import open_input
+from operators.profile_utils import StreamingFileProfiler, normalize_frame
+from operators.sketch_utils import HyperLogLog
+
+distinct_modes = ("exact", "approximate")
 
 
 class FilePostgresTableDataCheckOperator(BaseOperator):
-    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, table_name=None, dataset_name=None, encoding=None, *args, **kwargs):
+    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, table_name=None, dataset_name=None, encoding=None,
+                 profile_group_size=100, profile_parallelism=1, distinct_mode="exact", distinct_tolerance=0.02,
+                 profile_chunk_size=100000, max_distinct_in_memory=2000000, decompress_threads=1, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.table_name = table_name
         self.dataset_name = dataset_name
@@ -22,6 +32,22 @@ class FilePostgresTableDataCheckOperator(BaseOperator):
         self.s3_conn_id = s3_conn_id
         self.encoding = encoding
         self.configs_path = configs_path
+        # Columns profiled per table scan, and how many of these scans run concurrently on their own connections
+        self.profile_group_size = profile_group_size
+        self.profile_parallelism = profile_parallelism
+        if distinct_mode not in distinct_modes:
+            raise Exception(f"Unsupported distinct_mode '{distinct_mode}', expected one of {distinct_modes}")
+        # "approximate" compares HyperLogLog distinct counts within distinct_tolerance (relative error), columns
+        # outside of it are re-checked exactly
+        self.distinct_mode = distinct_mode
+        self.distinct_tolerance = distinct_tolerance
+        # The file is profiled in chunks of profile_chunk_size rows, distinct values beyond max_distinct_in_memory
+        # (64-bit hashes, over all columns) are spilled to disk
+        self.profile_chunk_size = profile_chunk_size
+        self.max_distinct_in_memory = max_distinct_in_memory
+        # Background threads decompressing gzip input (python-isal), 0 decompresses in the reading thread
+        self.decompress_threads = decompress_threads
+        self.db_conn_id = db_conn_id
         self.postgres_conn = PostgresHook(postgres_conn_id=db_conn_id).get_conn()
 
     def get_file_details(self,run_date):
@@ -131,16 +157,16 @@ class FilePostgresTableDataCheckOperator(BaseOperator):
                                                      mirror_table=mirror_table)
         self.log.info(f"Table columns query:{table_cols_query}")
 
-        # Load the file data into a DataFrame
-        file_df = pd.read_csv(file_path, sep=delimiter, encoding=self.encoding)
-        file_df.columns = file_df.columns.str.upper().str.replace(" ", "_")
-        self.log.info(f"File cols {list(file_df.columns)} ")
-
-        file_col_cnt_mappings = {}
-        for col in file_df.columns:
-            file_col_cnt_mappings[col]= {"total_count":file_df[col].count(),"distinct_count":file_df[col].nunique()}
+        precision = None
+        if self.distinct_mode == "approximate":
+            # Each sketch gets a third of the tolerance as standard error, so two estimates of the same
+            # cardinality practically never differ by more than the tolerance
+            precision = HyperLogLog.precision_for_error(self.distinct_tolerance / 3)
 
         cursor = self.postgres_conn.cursor()
+        column_types = self.get_column_types(cursor, mirror_schema, mirror_table)
+        file_col_cnt_mappings = self.profile_file(file_path, delimiter, precision, column_types=column_types)
+        self.log.info(f"File cols {list(file_col_cnt_mappings)} ")
 
         cursor.execute(f"{table_cols_query}")
         result = cursor.fetchall()
@@ -148,24 +174,11 @@ class FilePostgresTableDataCheckOperator(BaseOperator):
         table_cols_str = ','.join([f'"{col}"' for col in result[0][0].split(",")])
         self.log.info(f"Table columns: {table_cols_str}")
 
-        col_distinct_count_queries = postgres_col_count_query.format(mirror_db=mirror_db,
-                                                 mirror_schema=mirror_schema,
-                                                 mirror_table=mirror_table,
-                                                 file_date=run_date)
-
-        self.log.info(f"Table Data Query:{col_distinct_count_queries}")
-        cursor.execute(f"{col_distinct_count_queries}")
-        result = cursor.fetchall()
-
-        table_col_cnt_mappings = {}
-        for col, query in result:
-            self.log.info(f"column {col} query:{query}")
-            cursor.execute(f"{query}")
-            col_cnt_result = cursor.fetchall()
-            total_rec_cnt = col_cnt_result[0][0]
-            distinct_rec_cnt = col_cnt_result[0][1]
-
-            table_col_cnt_mappings[col] = {"total_count": total_rec_cnt, "distinct_count": distinct_rec_cnt}
+        if self.distinct_mode == "approximate":
+            table_col_cnt_mappings = self.profile_table_columns(cursor, mirror_schema, mirror_table, run_date,
+                                                                distinct_sql=self.get_approximate_distinct_sql(cursor, precision))
+        else:
+            table_col_cnt_mappings = self.profile_table_columns(cursor, mirror_schema, mirror_table, run_date)
 
         self.log.info(f"File column counts:{file_col_cnt_mappings}")
         self.log.info(f"Table column counts:{table_col_cnt_mappings}")
@@ -174,6 +187,11 @@ class FilePostgresTableDataCheckOperator(BaseOperator):
         # differences = self.compare_dataframes(file_df,table_df)
         result = self.compare_dicts(file_col_cnt_mappings,table_col_cnt_mappings)
 
+        if self.distinct_mode == "approximate" and result:
+            result = self.recheck_distinct_counts(result, file_path, delimiter, file_col_cnt_mappings,
+                                                  table_col_cnt_mappings, cursor, mirror_schema, mirror_table, run_date,
+                                                  column_types)
+
         if len(result)>0:
             self.log.info(f"File and Table has different data counts:{result}")
             raise Exception(f"File and Table has different data counts:{result}")
@@ -188,6 +206,142 @@ class FilePostgresTableDataCheckOperator(BaseOperator):
         # self.log.info(differences["rows_in_df2_not_in_df1"])
 
 
+    def get_profile_source(self, cursor, mirror_schema, mirror_table, file_date):
+        """
+        FROM source, WHERE clause and parameters of the profile queries: the FILE_DATE partition itself when the
+        table is partitioned by FILE_DATE, otherwise the table filtered on FILE_DATE.
+        """
+        cursor.execute(postgres_file_date_partition_query,
+                       (f'"{mirror_schema}"."{mirror_table}"', f"FOR VALUES IN ('{file_date}')"))
+        partition = cursor.fetchone()
+        if partition:
+            self.log.info(f"Profiling partition {mirror_schema}.{partition[0]} of FILE_DATE {file_date}")
+            return f'"{mirror_schema}"."{partition[0]}"', "", None
+        return f'"{mirror_schema}"."{mirror_table}"', 'WHERE "FILE_DATE" = %s', (file_date,)
+
+    def get_approximate_distinct_sql(self, cursor, precision):
+        """HLL distinct count expression when the hll extension is installed, else the exact COUNT(DISTINCT)."""
+        cursor.execute(postgres_hll_extension_query)
+        if cursor.fetchone()[0]:
+            # postgresql-hll supports up to 2^17 registers
+            return postgres_hll_distinct_sql.replace("{log2m}", str(min(precision, 17)))
+        self.log.info("The hll extension is not installed, table distinct counts are exact.")
+        return postgres_exact_distinct_sql
+
+    def within_tolerance(self, file_count, table_count):
+        if file_count is None or table_count is None:
+            return False
+        return abs(file_count - table_count) <= self.distinct_tolerance * max(file_count, table_count, 1)
+
+    def get_column_types(self, cursor, mirror_schema, mirror_table):
+        cursor.execute(postgres_column_types_query, (mirror_schema, mirror_table))
+        return {col.upper(): data_type for col, data_type in cursor.fetchall()}
+
+    def profile_file(self, file_path, delimiter, precision=None, columns=None, column_types=None):
+        """
+        Non-null and distinct counts of the file's columns (or only columns) in one streaming pass over chunks of
+        profile_chunk_size rows, so files larger than memory can be checked. Values are read as strings, only
+        empty values are nulls (as for COPY ... NULL ''), and normalized by the table's column_types so e.g. '7'
+        and '7.0' of a numeric column count as one distinct value, as they do in the table; distinct counts are
+        HyperLogLog estimates when a precision is given.
+        """
+        # Compressed files are decompressed as they are read
+        with open_input(file_path, threads=self.decompress_threads) as input_stream, \
+                StreamingFileProfiler(self.max_distinct_in_memory, precision) as profiler:
+            for chunk in pd.read_csv(input_stream, sep=delimiter, encoding=self.encoding, dtype=str,
+                                     keep_default_na=False, na_values=[""], chunksize=self.profile_chunk_size):
+                chunk.columns = chunk.columns.str.upper().str.replace(" ", "_")
+                chunk = chunk if columns is None else chunk[columns]
+                profiler.update(normalize_frame(chunk, column_types or {}))
+            return profiler.results()
+
+    def recheck_distinct_counts(self, differences, file_path, delimiter, file_col_cnt_mappings, table_col_cnt_mappings,
+                                cursor, mirror_schema, mirror_table, run_date, column_types=None):
+        """
+        Drop approximate distinct count differences within distinct_tolerance, and count the columns whose
+        only difference is a distinct count outside of it exactly on both sides. Returns the remaining differences.
+        """
+        recheck_cols = []
+        for col, diff in list(differences.items()):
+            if set(diff) != {"distinct_count"}:
+                continue
+            if self.within_tolerance(diff["distinct_count"]["dict1"], diff["distinct_count"]["dict2"]):
+                self.log.info(f"Column {col} distinct counts {diff['distinct_count']} are within tolerance "
+                              f"{self.distinct_tolerance}")
+                del differences[col]
+            elif col in file_col_cnt_mappings and col in table_col_cnt_mappings:
+                recheck_cols.append(col)
+
+        if not recheck_cols:
+            return differences
+
+        self.log.info(f"Re-checking exact distinct counts of columns {recheck_cols}")
+        exact_counts = self.profile_table_columns(cursor, mirror_schema, mirror_table, run_date, columns=recheck_cols)
+        exact_file_counts = self.profile_file(file_path, delimiter, columns=recheck_cols, column_types=column_types)
+        for col in recheck_cols:
+            file_col_cnt_mappings[col] = exact_file_counts[col]
+            table_col_cnt_mappings[col] = exact_counts[col]
+            del differences[col]
+        differences.update(self.compare_dicts({col: file_col_cnt_mappings[col] for col in recheck_cols},
+                                              {col: table_col_cnt_mappings[col] for col in recheck_cols}))
+        return differences
+
+    def profile_column_group(self, conn, columns, source, where_clause, params, distinct_sql=postgres_exact_distinct_sql):
+        """COUNT and distinct count (distinct_sql, COUNT(DISTINCT) by default) of every column of the group in one scan."""
+        aggregates = ",\n       ".join(f'COUNT("{col}"), {distinct_sql.format(col=col)}' for col in columns)
+        query = postgres_col_profile_query.format(aggregates=aggregates, source=source, where_clause=where_clause)
+        self.log.info(f"Table Data Query:{query}")
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        cursor.close()
+        return {col: {"total_count": row[2 * index], "distinct_count": row[2 * index + 1]}
+                for index, col in enumerate(columns)}
+
+    def profile_table_columns(self, cursor, mirror_schema, mirror_table, file_date, columns=None,
+                              distinct_sql=postgres_exact_distinct_sql):
+        """
+        Profile every column of the FILE_DATE rows with one aggregate query per group of profile_group_size
+        columns instead of one query (and one scan) per column. With profile_parallelism > 1 the groups run
+        concurrently over a pool of connections.
+        """
+        if columns is None:
+            cursor.execute(postgres_profile_columns_query.format(mirror_schema=mirror_schema, mirror_table=mirror_table))
+            columns = [row[0] for row in cursor.fetchall()]
+        source, where_clause, params = self.get_profile_source(cursor, mirror_schema, mirror_table, file_date)
+
+        groups = [columns[index:index + self.profile_group_size]
+                  for index in range(0, len(columns), self.profile_group_size)]
+        self.log.info(f"Profiling {len(columns)} columns in {len(groups)} queries")
+
+        table_col_cnt_mappings = {}
+        if self.profile_parallelism <= 1 or len(groups) <= 1:
+            for group in groups:
+                table_col_cnt_mappings.update(self.profile_column_group(self.postgres_conn, group, source,
+                                                                        where_clause, params, distinct_sql))
+            return table_col_cnt_mappings
+
+        pool_size = min(self.profile_parallelism, len(groups))
+        connections = queue.Queue()
+        for _ in range(pool_size):
+            connections.put(PostgresHook(postgres_conn_id=self.db_conn_id).get_conn())
+
+        def profile_group(group):
+            conn = connections.get()
+            try:
+                return self.profile_column_group(conn, group, source, where_clause, params, distinct_sql)
+            finally:
+                connections.put(conn)
+
+        try:
+            with ThreadPoolExecutor(max_workers=pool_size) as executor:
+                for group_counts in executor.map(profile_group, groups):
+                    table_col_cnt_mappings.update(group_counts)
+        finally:
+            while not connections.empty():
+                connections.get().close()
+        return table_col_cnt_mappings
+
     def get_all_upstream_task_ids(self, context):
         """Get all upstream task IDs recursively by traversing the DAG structure in BFS order."""
         dag = context['dag']
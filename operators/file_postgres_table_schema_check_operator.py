@@ -5,14 +5,27 @@ from pathlib import Path
 
 import pendulum
 from airflow.models import BaseOperator
+from airflow.providers.amazon.aws.hooks.s3 import S3Hook
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 from core_utils import s3_utils
 from core_utils.config_reader_dbt import ConfigReaderDBT
-import pandas as pd
+
+from operators.dag_utils import find_upstream_xcom
+from operators.header_utils import sniff_header, sniff_s3_headers
+
+header_sources = ("local", "s3")
 
 class FilePostgresTableSchemaCheckOperator(BaseOperator):
-    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, dataset_name=None, encoding=None, *args, **kwargs):
+    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, dataset_name=None, encoding=None,
+                 header_source="local", max_header_workers=8, header_range_bytes=64 * 1024, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if header_source not in header_sources:
+            raise Exception(f"Unsupported header_source '{header_source}', expected one of {header_sources}")
+        # "local" reads the header of the downloaded file, "s3" the headers of every acquired S3 object with
+        # ranged GETs of their first header_range_bytes, max_header_workers at a time, without downloading them
+        self.header_source = header_source
+        self.max_header_workers = max_header_workers
+        self.header_range_bytes = header_range_bytes
         self.dataset_name = dataset_name
         self.bucket_name = bucket_name
         self.s3_conn_id = s3_conn_id
@@ -89,34 +102,42 @@ class FilePostgresTableSchemaCheckOperator(BaseOperator):
         
         return upstream_task_ids
 
+    def get_file_headers(self, context, delimiter, header_row):
+        """Header (see header_utils.sniff_header) of the file(s) to check, by file."""
+        if self.header_source == "s3":
+            keys = find_upstream_xcom(context, "files_found")
+            if not keys:
+                raise Exception("No files_found XCom in the upstream tasks")
+            s3_client = S3Hook(aws_conn_id=self.s3_conn_id).get_conn()
+            self.log.info(f"Reading the headers of {len(keys)} S3 objects")
+            return sniff_s3_headers(s3_client, self.bucket_name, keys, delimiter, self.encoding, header_row,
+                                    self.max_header_workers, self.header_range_bytes)
+
+        all_upstream_task_ids = self.get_all_upstream_task_ids(context)
+        rawfile_path = context['ti'].xcom_pull(task_ids=all_upstream_task_ids[0],key='downloaded_file_path')
+        self.log.info(f"Reading file header from temporary area: {rawfile_path}")
+        return {rawfile_path: sniff_header(rawfile_path, delimiter, self.encoding, header_row)}
+
     def execute(self, context):
         dag_run_date = datetime.fromtimestamp(context["data_interval_end"].timestamp(),pendulum.tz.UTC).strftime('%Y-%m-%d')
         configs_downloaded_tmp_dir,configs = self.get_file_details(dag_run_date)
 
-        all_upstream_task_ids = self.get_all_upstream_task_ids(context)
-        rawfile_path = context['ti'].xcom_pull(task_ids=all_upstream_task_ids[0],key='downloaded_file_path')
         file_format_params = configs[self.dataset_name]["mirror"]["file_format_params"]
         delimiter = file_format_params["delimiter"]
-
-        self.log.info(f"Reading file from temporary area: {rawfile_path}")
-        # Read file as DataFrame
-        df = pd.read_csv(rawfile_path, delimiter=delimiter, encoding=self.encoding,nrows=100)
-
-        # Transform column names
-        df.columns = self.clean_column_names(df.columns)
-        file_cols = list(df.columns)
-
-        self.log.info(f"Received file header columns: {file_cols}")
-        file_cols_cnt = len(file_cols)
+        header_row = int(file_format_params.get("skip_header", 1) or 1)
 
         file_config_columns = list(configs[self.dataset_name]["mirror"]["file_schema"].keys())
         self.log.info(f"Configured columns : {file_config_columns}")
-
-
         file_config_cols_str = ",".join(file_config_columns)
-        file_cols_str = ",".join(file_cols)
 
-        if not set(file_cols) == set(file_config_columns):
-            raise(Exception(f"Received file columns:{file_cols_str} and Configured file cols:{file_config_cols_str} are not equal. "))
-        else:
-            self.log.info(f"Received file columns:{file_cols_str} and Configured file cols:{file_config_cols_str} are  equal. ")
+        for file_name, header in self.get_file_headers(context, delimiter, header_row).items():
+            # Transform column names
+            file_cols = self.clean_column_names(header["columns"])
+            self.log.info(f"Received file {file_name} header columns: {file_cols} (encoding {header['encoding']}, "
+                          f"BOM: {header['bom']}, quoted: {header['quoted']})")
+            file_cols_str = ",".join(file_cols)
+
+            if not set(file_cols) == set(file_config_columns):
+                raise(Exception(f"Received file {file_name} columns:{file_cols_str} and Configured file cols:{file_config_cols_str} are not equal. "))
+            else:
+                self.log.info(f"Received file {file_name} columns:{file_cols_str} and Configured file cols:{file_config_cols_str} are  equal. ")
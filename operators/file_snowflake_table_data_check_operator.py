@@ -2,6 +2,7 @@ import os
 import tempfile
 from datetime import datetime
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import pendulum
 from airflow.models import BaseOperator
@@ -9,17 +10,72 @@ from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
 from core_utils import s3_utils
 from core_utils.config_reader_dbt import ConfigReaderDBT
 
-from operators.constants import snowflake_table_schema_query, file_schema_query, file_cols_query
+from operators.constants import (snowflake_table_schema_query, file_schema_query, file_cols_query,
+                                 snowflake_table_columns_query, snowflake_staged_file_diff_query,
+                                 snowflake_staged_file_sample_query, snowflake_col_profile_query)
+from operators.snowflake_stage_utils import create_file_format, staged_file_location
+from operators.input_utils import open_input
+from operators.snowflake_fetch_utils import FetchMetrics, fetch_column, fetch_dataframe
+from operators.reconcile_utils import (bounded_bucket_filter, bucket_aggregates, bucket_aggregates_sql,
+                                       bucket_hashes_sql, diff_hash_multisets, differing_buckets, hash_rows,
+                                       reduce_hash_sum, row_hash_sql)
+
+comparison_modes = ("rows", "hash", "bucketed", "warehouse", "profile")
+distinct_modes = ("exact", "approximate")
+
+# Bucket lists longer than this stop the drill-down, the hashes of those buckets are fetched instead (restricted by
+# the previous level's bucket list, which is within this limit)
+max_bucket_list = 4096
+
 
 class FileSnowflakeTableDataCheckOperator(BaseOperator):
-    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, table_name=None, dataset_name=None, encoding=None, *args, **kwargs):
+    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, table_name=None, dataset_name=None, encoding=None,
+                 comparison_mode="rows", sample_size=10, chunk_size=100000, bucket_count=256, drill_down_rows=100000,
+                 stage_name=None, parquet_dir=None, distinct_mode="approximate", distinct_tolerance=0,
+                 remove_staged_file=True, decompress_threads=1, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.stage_name = stage_name
         self.table_name = table_name
         self.dataset_name = dataset_name
         self.bucket_name = bucket_name
         self.s3_conn_id = s3_conn_id
         self.configs_path = configs_path
         self.encoding = encoding
+        if comparison_mode not in comparison_modes:
+            raise Exception(f"Unsupported comparison_mode '{comparison_mode}', expected one of {comparison_modes}")
+        # "rows" compares the file and table DataFrames, "hash" compares multisets of 64-bit row hashes
+        # (8 bytes per row) and only fetches sample_size differing rows of each side, "bucketed" compares per-bucket
+        # row counts and hash sums and only fetches the hashes of the buckets that differ, "warehouse" diffs the
+        # staged file against the table with MINUS inside Snowflake and needs no local file, "profile" compares
+        # the row, non-null and distinct counts of every column of the staged file and the table
+        if comparison_mode in ("warehouse", "profile") and not stage_name:
+            raise Exception(f"comparison_mode '{comparison_mode}' needs the stage_name holding the file")
+        self.comparison_mode = comparison_mode
+        if distinct_mode not in distinct_modes:
+            raise Exception(f"Unsupported distinct_mode '{distinct_mode}', expected one of {distinct_modes}")
+        # "exact" profiles with COUNT(DISTINCT), "approximate" with APPROX_COUNT_DISTINCT compared within
+        # distinct_tolerance (relative difference). The estimate is deterministic, the same set of values gives the
+        # same count on both sides, so any tolerance above 0 lets that many missing or changed distinct values pass
+        self.distinct_mode = distinct_mode
+        self.distinct_tolerance = distinct_tolerance
+        # REMOVE this run's staged file once the "warehouse"/"profile" check passed, the COPY must keep it
+        # (SnowflakeCopyOperator(purge=False))
+        self.remove_staged_file = remove_staged_file
+        self.sample_size = sample_size
+        # Rows per file chunk / table fetch batch
+        self.chunk_size = chunk_size
+        if bucket_count < 2:
+            raise Exception(f"bucket_count must be at least 2, got {bucket_count}")
+        # Buckets per drill-down level, and the table row count of the differing buckets below which their hashes
+        # are fetched
+        self.bucket_count = bucket_count
+        self.drill_down_rows = drill_down_rows
+        # Directory the table rows read in "rows" mode are also written to as Parquet
+        self.parquet_dir = parquet_dir
+        # Background threads decompressing gzip input (python-isal), 0 decompresses in the reading thread
+        self.decompress_threads = decompress_threads
+        # Batches, bytes and time to first batch of every table read, pushed as the fetch_metrics XCom
+        self.fetch_metrics = []
         self.sf_conn = SnowflakeHook(snowflake_conn_id=db_conn_id).get_conn()
 
     def get_file_details(self,run_date):
@@ -59,24 +115,23 @@ class FileSnowflakeTableDataCheckOperator(BaseOperator):
         self.log.info(f"Configs Read:{configs} ")
         return local_dir,configs
 
-    def compare_file_table_data(self, run_date, file_path, delimiter=","):
-        # Query the target table
+    def get_table_parts(self):
         # Extract database and schema from connection as defaults
         default_db = self.sf_conn.database
         default_schema = self.sf_conn.schema
         mirror_db = self.table_name.split(".")[0] if "." in self.table_name else default_db
         mirror_schema = self.table_name.split(".")[1] if "." in self.table_name else default_schema
         mirror_table = self.table_name.split(".")[2] if "." in self.table_name else self.table_name
+        return mirror_db, mirror_schema, mirror_table
+
+    def compare_file_table_data(self, run_date, file_path, delimiter=","):
+        # Query the target table
+        mirror_db, mirror_schema, mirror_table = self.get_table_parts()
         table_cols_query = snowflake_table_schema_query.format(mirror_db=mirror_db,
                                                      mirror_schema=mirror_schema,
                                                      mirror_table=mirror_table)
         self.log.info(f"Table columns query:{table_cols_query}")
 
-        # Load the file data into a DataFrame
-        df_staging = pd.read_csv(file_path, sep=delimiter)
-        df_staging.columns = df_staging.columns.str.upper().str.replace(" ", "_")
-        self.log.info(f"df_staging cols {df_staging.columns} ,{df_staging}")
-
         cursor = self.sf_conn.cursor()
 
         cursor.execute(f"{table_cols_query}")
@@ -86,13 +141,29 @@ class FileSnowflakeTableDataCheckOperator(BaseOperator):
 
         table_cols_str = result[0][0]
 
+        if self.comparison_mode in ("hash", "bucketed"):
+            # Both sides hash the canonical text of each value for its column type
+            table_columns = self.get_table_columns(cursor)
+            cols = [col for col, *_ in table_columns]
+            column_types = {col: (data_type, scale) for col, data_type, precision, scale in table_columns}
+            reconcile = self.reconcile_row_hashes if self.comparison_mode == "hash" else self.reconcile_hash_buckets
+            return reconcile(cursor, run_date, file_path, delimiter, f"{mirror_db}.{mirror_schema}.{mirror_table}",
+                             cols, column_types)
+
+        # Load the file data into a DataFrame
+        df_staging = pd.read_csv(file_path, sep=delimiter)
+        df_staging.columns = df_staging.columns.str.upper().str.replace(" ", "_")
+        self.log.info(f"df_staging cols {df_staging.columns} ,{df_staging}")
+
         query = f"""
             SELECT {table_cols_str} FROM {mirror_db}.{mirror_schema}.{mirror_table}
             where FILE_DATE = '{run_date}'
             """
         self.log.info(f"Table Data Query:{query}")
 
-        df_target = pd.read_sql(query, self.sf_conn)
+        cursor.execute(query)
+        parquet_path = os.path.join(self.parquet_dir, f"{mirror_table}_{run_date}.parquet") if self.parquet_dir else None
+        df_target = fetch_dataframe(cursor, self.chunk_size, self.new_fetch_metrics("table_rows"), parquet_path)
         self.log.info(f"df_target cols {df_target.columns}, {df_target}")
 
         # Compare DataFrames
@@ -104,6 +175,314 @@ class FileSnowflakeTableDataCheckOperator(BaseOperator):
         # mismatched_rows = df_target.merge(df_staging, indicator=True, how='outer').query('_merge != "both"')
         # self.log.info(f"Differences between file and table: {mismatched_rows}")
 
+    def iter_file_chunks(self, file_path, delimiter, cols):
+        """The file's rows as DataFrames of strings (empty fields as '') with the columns in the order of cols."""
+        with open_input(file_path, threads=self.decompress_threads) as input_stream:
+            for chunk in pd.read_csv(input_stream, sep=delimiter, encoding=self.encoding, dtype=str,
+                                     keep_default_na=False, chunksize=self.chunk_size):
+                chunk.columns = chunk.columns.str.upper().str.replace(" ", "_")
+                missing_cols = [col for col in cols if col not in chunk.columns]
+                if missing_cols:
+                    raise Exception(f"Table columns {missing_cols} are not in the file {file_path}")
+                yield chunk[cols]
+
+    def new_fetch_metrics(self, name):
+        metrics = FetchMetrics(name)
+        self.fetch_metrics.append(metrics)
+        return metrics
+
+    def fetch_hashes(self, cursor, query):
+        self.log.info(f"Table hash query:{query}")
+        cursor.execute(query)
+        return fetch_column(cursor, np.uint64, self.chunk_size, self.new_fetch_metrics("row_hashes"))
+
+    def reconcile_row_hashes(self, cursor, run_date, file_path, delimiter, table_ref, cols, column_types):
+        """
+        Compare the file with the table's FILE_DATE rows as multisets of 64-bit row hashes: the file is hashed
+        chunk by chunk, the table computes the same hash (row_hash_sql) and only the hashes are fetched. Values are
+        hashed as their canonical text for the column type on both sides (reconcile_utils.canonical_sql). Rows
+        present more often on one side are reported with a sample of up to sample_size rows of each side.
+        """
+        hash_sql = row_hash_sql(cols, column_types)
+        file_hashes = self.hash_file_rows(file_path, delimiter, cols, column_types)
+        table_hashes = self.fetch_hashes(cursor, f"SELECT {hash_sql} FROM {table_ref} WHERE FILE_DATE = '{run_date}'")
+        self.log.info(f"Hashed {len(file_hashes)} file rows and {len(table_hashes)} table rows")
+
+        missing, extra = diff_hash_multisets(file_hashes, table_hashes)
+        self.report_hash_differences(cursor, run_date, file_path, delimiter, table_ref, cols, column_types, hash_sql,
+                                     missing, extra, len(file_hashes))
+
+    def hash_file_rows(self, file_path, delimiter, cols, column_types):
+        return np.concatenate([hash_rows(chunk, column_types) for chunk in self.iter_file_chunks(file_path, delimiter, cols)]
+                              or [np.empty(0, dtype=np.uint64)])
+
+    def reconcile_hash_buckets(self, cursor, run_date, file_path, delimiter, table_ref, cols, column_types):
+        """
+        Localize the differences between the file and the table's FILE_DATE rows without fetching the table:
+        rows are bucketed by row hash % bucket_count and each side's per-bucket row count and hash sum are compared
+        (the table computes them with a GROUP BY). Only the buckets that differ are split again, by
+        hash % bucket_count^2 and so on, until they hold at most drill_down_rows table rows; only their hashes are
+        fetched and diffed as in the "hash" mode. What is transferred grows with the differences, not the table.
+        """
+        hash_sql = row_hash_sql(cols, column_types)
+        file_hashes = self.hash_file_rows(file_path, delimiter, cols, column_types)
+        hash_source = f"SELECT {hash_sql} AS ROW_HASH FROM {table_ref} WHERE FILE_DATE = '{run_date}'"
+
+        modulus, buckets, level = 1, None, 0
+        while True:
+            level += 1
+            child_modulus = modulus * self.bucket_count
+            query = bucket_aggregates_sql(hash_source, child_modulus, modulus, buckets)
+            self.log.info(f"Level {level} bucket query:{query}")
+            cursor.execute(query)
+            aggregates = fetch_dataframe(cursor, self.chunk_size, self.new_fetch_metrics(f"bucket_level_{level}"))
+            table_buckets = {int(bucket): (int(row_count), reduce_hash_sum(hash_sum))
+                             for bucket, row_count, hash_sum in aggregates.itertuples(index=False)}
+            if buckets is not None:
+                file_hashes = file_hashes[np.isin(file_hashes % np.uint64(modulus), buckets)]
+            file_buckets = bucket_aggregates(file_hashes, child_modulus)
+
+            parent_modulus, parent_buckets = modulus, buckets
+            modulus, buckets = child_modulus, differing_buckets(file_buckets, table_buckets)
+            table_rows = sum(table_buckets.get(bucket, (0, 0))[0] for bucket in buckets)
+            self.log.info(f"Level {level}: {len(buckets)} of {len(file_buckets.keys() | table_buckets.keys())} "
+                          f"buckets differ, holding {table_rows} table rows")
+            if not buckets:
+                self.log.info(f"File and table {table_ref} have the same rows.")
+                return
+            if (table_rows <= self.drill_down_rows or len(buckets) > max_bucket_list
+                    or modulus * self.bucket_count >= 1 << 64):
+                break
+
+        filter_modulus, filter_buckets = bounded_bucket_filter(modulus, buckets, parent_modulus, parent_buckets,
+                                                               max_bucket_list)
+        table_hashes = self.fetch_hashes(cursor, bucket_hashes_sql(hash_source, filter_modulus, filter_buckets))
+        if filter_buckets is not buckets:
+            table_hashes = table_hashes[np.isin(table_hashes % np.uint64(modulus), buckets)]
+        file_hashes = file_hashes[np.isin(file_hashes % np.uint64(modulus), buckets)]
+        self.log.info(f"Fetched {len(table_hashes)} table row hashes of {len(buckets)} differing buckets")
+
+        missing, extra = diff_hash_multisets(file_hashes, table_hashes)
+        self.report_hash_differences(cursor, run_date, file_path, delimiter, table_ref, cols, column_types, hash_sql,
+                                     missing, extra, len(file_hashes))
+
+    def report_hash_differences(self, cursor, run_date, file_path, delimiter, table_ref, cols, column_types, hash_sql,
+                                missing, extra, compared_rows):
+        missing_rows = int(missing[:, 1].sum()) if len(missing) else 0
+        extra_rows = int(extra[:, 1].sum()) if len(extra) else 0
+        if not missing_rows and not extra_rows:
+            self.log.info(f"File and table {table_ref} have the same {compared_rows} rows.")
+            return
+
+        self.log.info(f"{missing_rows} file rows are missing from the table, {extra_rows} table rows are not in the file")
+        self.log_difference_samples(cursor, run_date, file_path, delimiter, table_ref, cols, column_types, hash_sql,
+                                    missing, extra)
+        raise Exception(f"File and Table {table_ref} differ: {missing_rows} file rows missing from the table, "
+                        f"{extra_rows} table rows not in the file")
+
+    def log_difference_samples(self, cursor, run_date, file_path, delimiter, table_ref, cols, column_types, hash_sql,
+                               missing, extra):
+        if len(missing):
+            sample_hashes = missing[:self.sample_size, 0]
+            samples = []
+            for chunk in self.iter_file_chunks(file_path, delimiter, cols):
+                samples.append(chunk[np.isin(hash_rows(chunk, column_types), sample_hashes)])
+                if sum(len(sample) for sample in samples) >= self.sample_size:
+                    break
+            self.log.info(f"File rows missing from the table (sample):\n{pd.concat(samples).head(self.sample_size)}")
+        if len(extra):
+            hash_list = ", ".join(str(value) for value in extra[:self.sample_size, 0])
+            query = f"""
+            SELECT {", ".join(f'"{col}"' for col in cols)} FROM {table_ref}
+            WHERE FILE_DATE = '{run_date}' AND {hash_sql} IN ({hash_list})
+            LIMIT {self.sample_size}
+            """
+            self.log.info(f"Table sample query:{query}")
+            cursor.execute(query)
+            sample = fetch_dataframe(cursor, self.chunk_size, self.new_fetch_metrics("table_sample"))
+            self.log.info(f"Table rows not in the file (sample):\n{sample}")
+
+    def get_table_columns(self, cursor):
+        """(COLUMN_NAME, DATA_TYPE, NUMERIC_PRECISION, NUMERIC_SCALE) of the table's data columns, in order."""
+        mirror_db, mirror_schema, mirror_table = self.get_table_parts()
+        cursor.execute(snowflake_table_columns_query.format(mirror_db=mirror_db, mirror_schema=mirror_schema,
+                                                            mirror_table=mirror_table))
+        table_columns = cursor.fetchall()
+        self.log.info(f"Table columns: {table_columns}")
+        return table_columns
+
+    def get_staged_file_columns(self, cursor, file_columns):
+        """
+        SELECT list reading the staged file's columns ($1, $2, ... in the configured file_schema order) as the
+        table's columns, each TRY_CAST to the table column's type as COPY INTO converts them.
+        """
+        table_columns = self.get_table_columns(cursor)
+
+        file_positions = {col.replace(" ", "_").upper(): index + 1 for index, col in enumerate(file_columns)}
+        missing_cols = [col for col, *_ in table_columns if col not in file_positions]
+        if missing_cols:
+            raise Exception(f"Table columns {missing_cols} are not in the configured file schema {file_columns}")
+
+        select_cols = []
+        for col, data_type, precision, scale in table_columns:
+            if data_type == "NUMBER" and precision is not None:
+                data_type = f"NUMBER({precision},{scale or 0})"
+            elif data_type == "TEXT":
+                data_type = "VARCHAR"
+            select_cols.append(f'TRY_CAST(${file_positions[col]} AS {data_type}) AS "{col}"')
+        return [col for col, *_ in table_columns], ",".join(select_cols)
+
+    def get_staged_file_name(self, context):
+        """Name of the file this run PUT to the stage, the staged_file_name XCom of MoveFileToSnowflakeOperator."""
+        staged_file_names = context['ti'].xcom_pull(task_ids=self.get_all_upstream_task_ids(context),
+                                                    key='staged_file_name') or []
+        staged_file_names = [name for name in staged_file_names if name]
+        if not staged_file_names:
+            raise Exception("No staged_file_name XCom found upstream, the file has to be PUT to the stage by "
+                            "MoveFileToSnowflakeOperator in this DAG run")
+        return staged_file_names[0]
+
+    def check_copy_keeps_staged_file(self, context):
+        """Refuse upstream COPY tasks that purge the staged file before this check can read it."""
+        dag = context['dag']
+        for task_id in self.get_all_upstream_task_ids(context):
+            if getattr(dag.get_task(task_id), "purge", False):
+                raise Exception(f"Task {task_id} purges the staged file after the COPY, the '{self.comparison_mode}' "
+                                f"check needs it kept: SnowflakeCopyOperator(purge=False)")
+
+    def check_staged_file_exists(self, cursor, staged_file_location):
+        cursor.execute(f"LIST @{staged_file_location}")
+        if not cursor.fetchall():
+            raise Exception(f"File @{staged_file_location} is not on the stage anymore, the COPY has to keep it for "
+                            f"the '{self.comparison_mode}' check: SnowflakeCopyOperator(purge=False)")
+
+    def remove_staged_file_after_check(self, cursor, staged_file_location):
+        if self.remove_staged_file:
+            cursor.execute(f"REMOVE @{staged_file_location}")
+            self.log.info(f"Removed checked file @{staged_file_location} from the stage.")
+
+    def get_staged_file_query(self, cursor, file_format_params, file_columns, staged_file_location):
+        """
+        Query reading this run's file on the stage (not every file the stage holds) through file_cols_query and
+        the dataset's file format, with the table's columns. Returns the columns, that query and the table
+        reference.
+        """
+        database = self.sf_conn.database
+        schema = self.sf_conn.schema
+        file_format_name = f"{database}.{schema}.ff_{self.dataset_name}_check".upper()
+        # AUTO, files PUT to the stage are gzipped unless AUTO_COMPRESS is off
+        create_file_format(conn=self.sf_conn, log=self.log, delimiter=file_format_params["delimiter"],
+                           skip_header=file_format_params["skip_header"],
+                           file_format_name=file_format_name,
+                           compression="AUTO")
+
+        cols, query_select_cols_str = self.get_staged_file_columns(cursor, file_columns)
+        mirror_db, mirror_schema, mirror_table = self.get_table_parts()
+        table_ref = f"{mirror_db}.{mirror_schema}.{mirror_table}"
+
+        file_rows_query = file_cols_query.format(file_format_name=file_format_name,
+                                                 stage_name=staged_file_location,
+                                                 query_select_cols_str=query_select_cols_str).strip().rstrip(";")
+        return cols, file_rows_query, table_ref
+
+    def compare_staged_file_table_data(self, run_date, file_format_params, file_columns, staged_file_location):
+        """
+        Diff the file on the stage against the table's FILE_DATE rows inside Snowflake: the staged file is read
+        through file_cols_query with the dataset's file format, and the two sides are compared with MINUS in both
+        directions. Only the row counts and up to sample_size differing rows of each side leave the warehouse.
+        MINUS compares distinct rows, so duplicated rows are covered by the row count check.
+        """
+        cursor = self.sf_conn.cursor()
+        cols, file_rows_query, table_ref = self.get_staged_file_query(cursor, file_format_params, file_columns,
+                                                                      staged_file_location)
+        table_cols_str = ",".join(f'"{col}"' for col in cols)
+        table_rows_query = f"SELECT {table_cols_str} FROM {table_ref} WHERE FILE_DATE = '{run_date}'"
+
+        query = snowflake_staged_file_diff_query.format(file_rows_query=file_rows_query,
+                                                        table_rows_query=table_rows_query)
+        self.log.info(f"Staged file diff query:{query}")
+        cursor.execute(query)
+        file_rows, table_rows, missing_rows, extra_rows = cursor.fetchone()
+        self.log.info(f"Staged file rows: {file_rows}, table rows: {table_rows}, file rows missing from the table: "
+                      f"{missing_rows}, table rows not in the file: {extra_rows}")
+        if file_rows == table_rows and not missing_rows and not extra_rows:
+            self.log.info(f"Staged file and table {table_ref} have the same {file_rows} rows.")
+            return
+
+        for minuend, subtrahend, row_count, label in (
+                ("FILE_ROWS", "TABLE_ROWS", missing_rows, "File rows missing from the table"),
+                ("TABLE_ROWS", "FILE_ROWS", extra_rows, "Table rows not in the file")):
+            if row_count:
+                query = snowflake_staged_file_sample_query.format(file_rows_query=file_rows_query,
+                                                                  table_rows_query=table_rows_query,
+                                                                  minuend=minuend, subtrahend=subtrahend,
+                                                                  sample_size=self.sample_size)
+                self.log.info(f"Staged file sample query:{query}")
+                cursor.execute(query)
+                sample = fetch_dataframe(cursor, self.chunk_size, self.new_fetch_metrics("staged_file_sample"))
+                self.log.info(f"{label} (sample):\n{sample}")
+        raise Exception(f"Staged file and Table {table_ref} differ: {file_rows} file rows, {table_rows} table rows, "
+                        f"{missing_rows} file rows missing from the table, {extra_rows} table rows not in the file")
+
+    def get_profile_query(self, source, cols):
+        aggregates = []
+        for index, col in enumerate(cols):
+            distinct_sql = f'APPROX_COUNT_DISTINCT("{col}")' if self.distinct_mode == "approximate" \
+                else f'COUNT(DISTINCT "{col}")'
+            aggregates.append(f'COUNT("{col}") AS C{index}_COUNT, {distinct_sql} AS C{index}_DISTINCT')
+        return snowflake_col_profile_query.format(aggregates=",\n       ".join(aggregates), source=source)
+
+    def compare_staged_file_table_profiles(self, run_date, file_format_params, file_columns, staged_file_location):
+        """
+        Column-level check of the staged file against the table's FILE_DATE rows: one query per side computes the
+        row count and every column's non-null and (approximate or exact) distinct counts in a single scan. The two
+        queries run concurrently (execute_async), only their one-row results leave the warehouse.
+        """
+        cursor = self.sf_conn.cursor()
+        cols, file_rows_query, table_ref = self.get_staged_file_query(cursor, file_format_params, file_columns,
+                                                                      staged_file_location)
+        table_cols_str = ",".join(f'"{col}"' for col in cols)
+        table_rows_query = f"SELECT {table_cols_str} FROM {table_ref} WHERE FILE_DATE = '{run_date}'"
+
+        cursors = {}
+        for side, source in (("file", file_rows_query), ("table", table_rows_query)):
+            query = self.get_profile_query(source, cols)
+            self.log.info(f"{side.capitalize()} profile query:{query}")
+            cursors[side] = self.sf_conn.cursor()
+            cursors[side].execute_async(query)
+        profiles = {}
+        for side, side_cursor in cursors.items():
+            # Waits for the query to finish
+            side_cursor.get_results_from_sfqid(side_cursor.sfqid)
+            row = side_cursor.fetchone()
+            profiles[side] = {"row_count": row[0],
+                              **{col: {"total_count": row[1 + 2 * index], "distinct_count": row[2 + 2 * index]}
+                                 for index, col in enumerate(cols)}}
+
+        differences = []
+        file_rows, table_rows = profiles["file"]["row_count"], profiles["table"]["row_count"]
+        if file_rows != table_rows:
+            differences.append(f"row count: file {file_rows}, table {table_rows}")
+        for col in cols:
+            file_profile, table_profile = profiles["file"][col], profiles["table"][col]
+            self.log.info(f"Column {col}: file {file_profile} (nulls {file_rows - file_profile['total_count']}), "
+                          f"table {table_profile} (nulls {table_rows - table_profile['total_count']})")
+            if file_profile["total_count"] != table_profile["total_count"]:
+                differences.append(f"{col} non-null count: file {file_profile['total_count']}, "
+                                   f"table {table_profile['total_count']}")
+            if not self.distinct_counts_match(file_profile["distinct_count"], table_profile["distinct_count"]):
+                differences.append(f"{col} distinct count: file {file_profile['distinct_count']}, "
+                                   f"table {table_profile['distinct_count']}")
+
+        if differences:
+            raise Exception(f"Staged file and Table {table_ref} profiles differ: {'; '.join(differences)}")
+        self.log.info(f"Staged file and table {table_ref} have the same {file_rows} rows and column counts.")
+
+    def distinct_counts_match(self, file_count, table_count):
+        if self.distinct_mode == "exact":
+            return file_count == table_count
+        return abs(file_count - table_count) <= self.distinct_tolerance * max(file_count, table_count, 1)
+
     def get_all_upstream_task_ids(self, context):
         """Get all upstream task IDs recursively by traversing the DAG structure in BFS order."""
         dag = context['dag']
@@ -134,13 +513,38 @@ class FileSnowflakeTableDataCheckOperator(BaseOperator):
 
     def execute(self, context):
         dag_run_date = datetime.fromtimestamp(context["data_interval_end"].timestamp(),pendulum.tz.UTC).strftime('%Y-%m-%d')
-        all_upstream_task_ids = self.get_all_upstream_task_ids(context)
-        file_path = context['ti'].xcom_pull(task_ids=all_upstream_task_ids[2],key='downloaded_file_path_duplicate')
         configs_downloaded_tmp_dir,configs = self.get_file_details(dag_run_date)
 
         file_format_params = configs[self.dataset_name]["mirror"]["file_format_params"]
+        if self.comparison_mode in ("warehouse", "profile"):
+            file_columns = list(configs[self.dataset_name]["mirror"]["file_schema"].keys())
+            self.check_copy_keeps_staged_file(context)
+            location = staged_file_location(self.stage_name, self.get_staged_file_name(context))
+            cursor = self.sf_conn.cursor()
+            self.check_staged_file_exists(cursor, location)
+            try:
+                if self.comparison_mode == "warehouse":
+                    self.compare_staged_file_table_data(dag_run_date, file_format_params, file_columns, location)
+                else:
+                    self.compare_staged_file_table_profiles(dag_run_date, file_format_params, file_columns, location)
+                self.remove_staged_file_after_check(cursor, location)
+            finally:
+                self.push_fetch_metrics(context)
+            return
+
+        all_upstream_task_ids = self.get_all_upstream_task_ids(context)
+        file_path = context['ti'].xcom_pull(task_ids=all_upstream_task_ids[2],key='downloaded_file_path_duplicate')
         delimiter = file_format_params["delimiter"]
 
-        self.compare_file_table_data(dag_run_date,file_path,delimiter)
+        try:
+            self.compare_file_table_data(dag_run_date,file_path,delimiter)
+        finally:
+            self.push_fetch_metrics(context)
+
+    def push_fetch_metrics(self, context):
+        fetch_metrics = [metrics.as_dict() for metrics in self.fetch_metrics]
+        for metrics in fetch_metrics:
+            self.log.info(f"Fetch metrics: {metrics}")
+        context['ti'].xcom_push(key='fetch_metrics', value=fetch_metrics)
 
 
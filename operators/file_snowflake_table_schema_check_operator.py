@@ -10,13 +10,25 @@ from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
 from core_utils import s3_utils
 from core_utils.config_reader_dbt import ConfigReaderDBT
 
-from operators.constants import snowflake_table_schema_query, file_schema_query, file_cols_query
+from operators.constants import file_schema_query, staged_file_header_query
+from operators.dag_utils import find_upstream_xcom
+from operators.header_utils import read_header
+from operators.snowflake_stage_utils import create_file_format, staged_file_location
+
+header_modes = ("infer", "probe", "local")
 
 
 class FileSnowflakeTableSchemaCheckOperator(BaseOperator):
-    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, stage_name=None, table_name=None, encoding=None, dataset_name=None, *args, **kwargs):
+    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, stage_name=None, table_name=None, encoding=None, dataset_name=None, header_mode="infer", *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.stage_name = stage_name
+        if header_mode not in header_modes:
+            raise Exception(f"Unsupported header_mode '{header_mode}', expected one of {header_modes}")
+        # How the file header is read:
+        # "infer": INFER_SCHEMA for the column count, then the header record of this run's staged file
+        # "probe": only the header record of this run's staged file, without INFER_SCHEMA
+        # "local": the header line of the downloaded file, nothing is read from the stage
+        self.header_mode = header_mode
         self.table_name = table_name
         self.dataset_name = dataset_name
         self.bucket_name = bucket_name
@@ -62,89 +74,89 @@ class FileSnowflakeTableSchemaCheckOperator(BaseOperator):
         self.log.info(f"Configs Read:{configs} ")
         return local_dir,configs
 
-    def create_file_format(self,conn, file_format_name, file_type="CSV", delimiter=",",skip_header=1, compression="NONE"):
-        # Define the SQL command to create the file format
-
-        create_file_format_sql = f"""
-        CREATE OR REPLACE FILE FORMAT {file_format_name}
-        TYPE = {file_type}
-        FIELD_OPTIONALLY_ENCLOSED_BY = '"'
-        FIELD_DELIMITER = '{delimiter}'
-        SKIP_HEADER = {skip_header}      
-        TRIM_SPACE=TRUE,
-        REPLACE_INVALID_CHARACTERS=TRUE,
-        DATE_FORMAT='YYYY-MM-DD',
-        TIME_FORMAT=AUTO,
-        TIMESTAMP_FORMAT=AUTO
-        ERROR_ON_COLUMN_COUNT_MISMATCH = TRUE
-        COMPRESSION = {compression};
-        """
-        self.log.info(f"File format sql: {create_file_format_sql}")
-
-        # Execute the SQL command to create the file format
-        with conn.cursor() as cur:
-            cur.execute(create_file_format_sql)
-            self.log.info(f"File format {file_format_name} created successfully.")
+    def get_staged_file_locations(self, context):
+        """Stage locations of the file(s) this run PUT to the stage, the staged_file_name XCom of MoveFileToSnowflakeOperator."""
+        staged_files = find_upstream_xcom(context, 'staged_file_name')
+        if not staged_files:
+            raise Exception("No staged_file_name XCom found upstream, the file has to be PUT to the stage by "
+                            "MoveFileToSnowflakeOperator in this DAG run")
+        staged_files = [staged_files] if isinstance(staged_files, str) else staged_files
+        return [staged_file_location(self.stage_name, staged_file) for staged_file in staged_files]
 
+    def probe_staged_headers(self, cursor, file_format_name, staged_file_locations, cols_cnt):
+        """
+        Header record of each staged file, $1..$cols_cnt of its first record (the file format skips the lines
+        before the header) with LIMIT 1 per file, the files combined with UNION ALL into one query. Returns
+        {file location: header values}, columns missing from a file are dropped.
+        """
+        query_select_cols_str = ",".join([f"${index+1}" for index in range(cols_cnt)])
+        query = "\nUNION ALL\n".join(
+            "(" + staged_file_header_query.format(file_format_name=file_format_name,
+                                                  stage_location=location,
+                                                  query_select_cols_str=query_select_cols_str).strip() + ")"
+            for location in staged_file_locations)
+        self.log.info(f"Staged file headers query:{query}")
+        cursor.execute(query)
+        result = cursor.fetchall()
+        missing_files = set(staged_file_locations) - {row[0] for row in result}
+        if missing_files:
+            raise Exception(f"No header record found in staged files {sorted(missing_files)}")
+        return {row[0]: [col for col in row[1:] if col is not None] for row in result}
+
+    def get_local_header(self, context, delimiter, skip_header):
+        file_path = find_upstream_xcom(context, 'downloaded_file_path')
+        if not file_path:
+            raise Exception("No downloaded_file_path found in the upstream tasks' XComs")
+        self.log.info(f"Reading the header of {file_path}")
+        return {file_path: read_header(file_path, delimiter, self.encoding, header_row=skip_header)}
+
+    def check_file_columns(self, file_name, file_cols, file_config_columns):
+        file_cols_ordered = [f"""{col.replace(" ","_").upper()}""" for col in file_cols]
+        file_cols_str = ",".join(file_cols_ordered)
+        file_config_cols_str = ",".join(file_config_columns)
+        if not set(file_cols_ordered) == set(file_config_columns):
+            raise(Exception(f"Received file {file_name} columns:{file_cols_str} and Configured file cols:{file_config_cols_str} are not equal. "))
+        self.log.info(f"Received file {file_name} columns:{file_cols_str} and Configured file cols:{file_config_cols_str} are  equal. ")
 
     def execute(self, context):
         dag_run_date = datetime.fromtimestamp(context["data_interval_end"].timestamp(),pendulum.tz.UTC).strftime('%Y-%m-%d')
         configs_downloaded_tmp_dir,configs = self.get_file_details(dag_run_date)
 
         file_format_params = configs[self.dataset_name]["mirror"]["file_format_params"]
+        file_config_columns = list(configs[self.dataset_name]["mirror"]["file_schema"].keys())
+        if self.header_mode == "local":
+            headers = self.get_local_header(context, file_format_params["delimiter"], int(file_format_params["skip_header"]))
+            for file_name, file_cols in headers.items():
+                self.check_file_columns(file_name, file_cols, file_config_columns)
+            return
+
         # Extract database and schema from connection
         database = self.sf_conn.database
         schema = self.sf_conn.schema
         file_format_name = f"{database}.{schema}.ff_{self.dataset_name}_tmp".upper()
         delimiter = file_format_params["delimiter"]
         compression = 'GZIP' if file_format_params["compressed"] else None
-        self.create_file_format(conn=self.sf_conn, delimiter=delimiter,
-                                skip_header=int(file_format_params["skip_header"])-1,
-                                file_format_name=file_format_name,
-                                compression=compression)
+        create_file_format(conn=self.sf_conn, log=self.log, delimiter=delimiter,
+                           skip_header=int(file_format_params["skip_header"])-1,
+                           file_format_name=file_format_name,
+                           compression=compression)
 
 
         cursor = self.sf_conn.cursor()
+        staged_file_locations = self.get_staged_file_locations(context)
+        if self.header_mode == "probe":
+            # One more column than configured, so a file with extra columns is caught
+            headers = self.probe_staged_headers(cursor, file_format_name, staged_file_locations,
+                                                len(file_config_columns) + 1)
+            for file_name, file_cols in headers.items():
+                self.check_file_columns(file_name, file_cols, file_config_columns)
+            return
+
         file_schema_query_formatted = file_schema_query.format(file_format_name=file_format_name,
-                                 stage_name=self.stage_name)
+                                                               stage_name=staged_file_locations[0])
         cursor.execute(f"{file_schema_query_formatted}")
         result = cursor.fetchall()
         self.log.info(f"Received file header columns count: {result[0]}")
-        file_cols_cnt = result[0][0]
-        query_select_cols_str  = ",".join([f"${index+1}" for index,val in enumerate(range(file_cols_cnt)) ])
-
-        file_cols_query_formatted = file_cols_query.format(file_format_name=file_format_name,
-                                 stage_name=self.stage_name,
-                                 query_select_cols_str=query_select_cols_str)
-        self.log.info(f"Staged file columns query:{file_cols_query_formatted}")
-        cursor.execute(f"{file_cols_query_formatted}")
-        result = cursor.fetchall()
-        self.log.info(f"Received file header columns: {result[0]}")
-
-        file_cols_ordered = [f"""{col.replace(" ","_").upper()}""" for col in list(result[0])]
-        self.log.info(f"File columns formatted: {file_cols_ordered}")
-        file_cols_str = ",".join(file_cols_ordered)
-
-        # mirror_db = self.table_name.split(".")[0] if "." in self.table_name else "MIRROR_DB"
-        # mirror_schema = self.table_name.split(".")[1] if "." in self.table_name else "MIRROR"
-        # mirror_table = self.table_name.split(".")[2] if "." in self.table_name else self.table_name
-        file_config_columns = list(configs[self.dataset_name]["mirror"]["file_schema"].keys())
-        self.log.info(f"Configured columns : {file_config_columns}")
-
-        # table_cols_query = table_schema_query.format(mirror_db=mirror_db,
-        #                                              mirror_schema=mirror_schema,
-        #                                              mirror_table=mirror_table)
-        # self.log.info(f"Table columns query:{table_cols_query}")
-        #
-        # cursor.execute(f"{table_cols_query}")
-        # result = cursor.fetchall()
-        #
-        # self.log.info(f"Table columns: {result[0]}")
-        #
-        # table_cols_str = result[0][0]
-        # table_cols = table_cols_str.split(",")
-        file_config_cols_str = ",".join(file_config_columns)
-        if not set(file_cols_ordered) == set(file_config_columns):
-            raise(Exception(f"Received file columns:{file_cols_str} and Configured file cols:{file_config_cols_str} are not equal. "))
-        else:
-            self.log.info(f"Received file columns:{file_cols_str} and Configured file cols:{file_config_cols_str} are  equal. ")
+        headers = self.probe_staged_headers(cursor, file_format_name, staged_file_locations, result[0][0])
+        for file_name, file_cols in headers.items():
+            self.check_file_columns(file_name, file_cols, file_config_columns)
@@ -0,0 +1,88 @@
+import codecs
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from operators.input_utils import open_input
+
+# Byte order marks, longest first (the UTF-32 LE mark starts with the UTF-16 LE one)
+byte_order_marks = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_bom(head):
+    """Encoding (one that strips the mark) of a byte order mark at the start of head, None without one."""
+    for bom, encoding in byte_order_marks:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def sniff_header(source, delimiter=",", encoding=None, header_row=1):
+    """
+    Read the header_row-th record of a local path or binary stream and nothing after it: gzip/zstd/bz2 input is
+    decompressed as it is read (open_input), a BOM overrides encoding, and quoted names (with delimiters or line
+    breaks inside) are parsed by the csv module. Returns the columns, the encoding used, whether the file has a
+    BOM, whether the header is quoted, and whether the record ended with a line break (False when the input
+    ended inside it, e.g. a truncated ranged read).
+    """
+    with open_input(source, buffer_size=64 * 1024) as stream:
+        bom_encoding = detect_bom(stream.peek(4)[:4])
+        text = io.TextIOWrapper(stream, encoding=bom_encoding or encoding or "utf-8", newline="")
+        raw_lines = []
+
+        def lines():
+            for line in text:
+                raw_lines.append(line)
+                yield line
+
+        record_start = 0
+        for row_number, row in enumerate(csv.reader(lines(), delimiter=delimiter), 1):
+            if row_number == header_row:
+                record = "".join(raw_lines[record_start:])
+                return {"columns": row, "encoding": text.encoding, "bom": bom_encoding is not None,
+                        "quoted": '"' in record, "complete": record.endswith(("\n", "\r"))}
+            record_start = len(raw_lines)
+    raise Exception(f"{source} has fewer than {header_row} records, no header found")
+
+
+def read_header(source, delimiter=",", encoding=None, header_row=1):
+    """Column names in the header_row-th record of a local path or binary stream, see sniff_header()."""
+    return sniff_header(source, delimiter, encoding, header_row)["columns"]
+
+
+def sniff_s3_header(s3_client, bucket_name, key, delimiter=",", encoding=None, header_row=1,
+                    range_bytes=64 * 1024, max_range_bytes=16 * 1024 * 1024):
+    """
+    sniff_header() of an S3 object from a ranged GET of its first range_bytes, without downloading it. The range
+    is doubled (up to max_range_bytes) while the header record runs past it.
+    """
+    while True:
+        response = s3_client.get_object(Bucket=bucket_name, Key=key, Range=f"bytes=0-{range_bytes - 1}")
+        object_size = int(response.get("ContentRange", "/0").split("/")[-1] or 0)
+        truncated = object_size > range_bytes
+        try:
+            header = sniff_header(response["Body"], delimiter, encoding, header_row)
+            if not truncated or header["complete"]:
+                return header
+        except Exception:
+            # A compressed stream or a multibyte character cut by the range end
+            if not truncated:
+                raise
+        if range_bytes >= max_range_bytes:
+            raise Exception(f"No complete header found in the first {range_bytes} bytes of s3://{bucket_name}/{key}")
+        range_bytes *= 2
+
+
+def sniff_s3_headers(s3_client, bucket_name, keys, delimiter=",", encoding=None, header_row=1, max_workers=8,
+                     range_bytes=64 * 1024):
+    """sniff_s3_header() of every key, max_workers ranged GETs at a time. Returns {key: header}."""
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keys)))) as executor:
+        headers = executor.map(lambda key: sniff_s3_header(s3_client, bucket_name, key, delimiter, encoding,
+                                                           header_row, range_bytes), keys)
+        return dict(zip(keys, headers))
@@ -0,0 +1,98 @@
+import bz2
+import gzip
+import io
+
+# Leading bytes of the compressed formats found in our feeds
+codec_magic = {
+    "gzip": b"\x1f\x8b",
+    "zstd": b"\x28\xb5\x2f\xfd",
+    "bz2": b"BZh",
+}
+
+
+class InputStream(io.RawIOBase):
+    """
+    Raw reader over source with head (bytes already read to detect the codec) put back in front. Closing it
+    closes source and the underlying streams, which decompressors given a file object leave open.
+    """
+
+    def __init__(self, source, head=b"", underlying=()):
+        self.source = source
+        self.head = head
+        self.underlying = underlying
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.head:
+            data, self.head = self.head[:len(buffer)], self.head[len(buffer):]
+        else:
+            data = self.source.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.source.close()
+            for stream in self.underlying:
+                stream.close()
+        super().close()
+
+
+def detect_codec(head):
+    for codec, magic in codec_magic.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def sniff_codec(file_path):
+    """Codec of a local file from its first bytes, None when it is not compressed."""
+    with open(file_path, "rb") as file:
+        return detect_codec(file.read(4))
+
+
+def decompress_stream(stream, codec, threads=1):
+    """
+    Wrap a binary stream in an incremental decompressor. gzip uses python-isal's threaded reader (decompression
+    runs in a background thread) when it is installed, zstd requires the zstandard package.
+    """
+    if codec == "gzip":
+        try:
+            from isal import igzip_threaded
+            return igzip_threaded.open(stream, "rb", threads=threads)
+        except ImportError:
+            return gzip.GzipFile(fileobj=stream, mode="rb")
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("The zstandard package is required to read zstd compressed files")
+        return zstandard.ZstdDecompressor().stream_reader(stream, read_size=1024 * 1024, closefd=True)
+    if codec == "bz2":
+        return bz2.BZ2File(stream, mode="rb")
+    return stream
+
+
+def open_input(source, buffer_size=1024 * 1024, threads=1):
+    """
+    Open a local path or a binary file object (e.g. an S3 StreamingBody) as a buffered binary reader, detecting
+    gzip/zstd/bz2 compression from the magic bytes and decompressing as the reader is consumed. The result can be
+    passed to pd.read_csv or io.TextIOWrapper like an uncompressed file. threads is the number of background
+    threads decompressing gzip with python-isal (0 decompresses in the calling thread, a negative value uses
+    every core).
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        stream = open(source, "rb", buffering=buffer_size)
+        codec = detect_codec(stream.peek(4)[:4])
+    else:
+        # Streams without peek(): read the magic bytes and put them back in front of the rest
+        head = source.read(4)
+        codec = detect_codec(head)
+        stream = io.BufferedReader(InputStream(source, head), buffer_size)
+
+    if codec is None:
+        return stream
+    return io.BufferedReader(InputStream(decompress_stream(stream, codec, threads), underlying=[stream]),
+                             buffer_size)
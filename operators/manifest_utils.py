@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+
+class AcquisitionManifest:
+    """
+    Persistent record of the S3 objects already listed for a dataset, stored in a local SQLite file.
+
+    Every listed object is recorded with the ETag, size and last-modified time list_objects_v2 returns
+    for it (no per-key requests). The greatest key seen is used as the StartAfter high-water mark of the
+    next listing, so later runs only list new keys, and the keys that are new or whose ETag changed are
+    collected in delta_keys. Each key also keeps the run date that recorded it (or its last ETag change), so a
+    rerun of that date gets the same keys back once the first run committed.
+    """
+
+    def __init__(self, manifest_path, dataset, run_date=None):
+        self.manifest_path = manifest_path
+        self.dataset = dataset
+        self.run_date = run_date
+        self.new_keys = 0
+        self.changed_keys = 0
+        self.seen_keys = set()
+        self.delta_keys = set()
+        self.lock = threading.Lock()
+
+        Path(os.path.dirname(os.path.abspath(manifest_path))).mkdir(exist_ok=True, parents=True)
+        # Pages are recorded from the listing thread pool, access is serialized with self.lock
+        self.conn = sqlite3.connect(manifest_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS acquisition_manifest (
+                dataset TEXT NOT NULL,
+                key TEXT NOT NULL,
+                etag TEXT,
+                size INTEGER,
+                last_modified TEXT,
+                first_seen TEXT,
+                last_seen TEXT,
+                run_date TEXT,
+                PRIMARY KEY (dataset, key)
+            )
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(acquisition_manifest)")]
+        if "run_date" not in columns:
+            # Manifests written before run dates were recorded
+            self.conn.execute("ALTER TABLE acquisition_manifest ADD COLUMN run_date TEXT")
+        self.conn.commit()
+
+    def get_high_water_mark(self):
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(key) FROM acquisition_manifest WHERE dataset = ?",
+                                    (self.dataset,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, contents):
+        """Upsert one page of list_objects_v2 Contents, counting new and changed (ETag differs) keys."""
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            for obj in contents:
+                key = obj["Key"]
+                etag = obj.get("ETag")
+                last_modified = obj.get("LastModified")
+                last_modified = last_modified.isoformat() if hasattr(last_modified, "isoformat") else last_modified
+                existing = self.conn.execute("SELECT etag, run_date FROM acquisition_manifest "
+                                             "WHERE dataset = ? AND key = ?", (self.dataset, key)).fetchone()
+                run_date = self.run_date
+                if existing is None:
+                    self.new_keys += 1
+                    self.delta_keys.add(key)
+                elif existing[0] != etag:
+                    self.changed_keys += 1
+                    self.delta_keys.add(key)
+                else:
+                    run_date = existing[1]
+                    if run_date is not None and run_date == self.run_date:
+                        # Recorded by an earlier run of this date
+                        self.delta_keys.add(key)
+                self.conn.execute("""
+                    INSERT INTO acquisition_manifest (dataset, key, etag, size, last_modified, first_seen, last_seen,
+                                                      run_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (dataset, key) DO UPDATE SET
+                        etag = excluded.etag, size = excluded.size,
+                        last_modified = excluded.last_modified, last_seen = excluded.last_seen,
+                        run_date = excluded.run_date
+                """, (self.dataset, key, etag, obj.get("Size"), last_modified, now, now, run_date))
+                self.seen_keys.add(key)
+
+    def remove(self, keys):
+        with self.lock:
+            self.conn.executemany("DELETE FROM acquisition_manifest WHERE dataset = ? AND key = ?",
+                                  [(self.dataset, key) for key in keys])
+
+    def run_date_keys(self):
+        """Keys recorded by an earlier, committed run of this run date."""
+        if self.run_date is None:
+            return set()
+        with self.lock:
+            rows = self.conn.execute("SELECT key FROM acquisition_manifest WHERE dataset = ? AND run_date = ?",
+                                     (self.dataset, self.run_date)).fetchall()
+        return {row[0] for row in rows}
+
+    def matching_delta_keys(self, pattern):
+        """
+        New and changed keys recorded by this listing, and the keys an earlier run of this date recorded, that
+        match the compiled pattern.
+        """
+        return sorted(key for key in self.delta_keys | self.run_date_keys() if pattern.search(key))
+
+    def remove_unseen(self, prefixes):
+        """After a full listing of prefixes, drop the keys under them that no longer exist in the bucket."""
+        prefixes = tuple(prefixes)
+        with self.lock:
+            rows = self.conn.execute("SELECT key FROM acquisition_manifest WHERE dataset = ?",
+                                     (self.dataset,)).fetchall()
+        stale_keys = [row[0] for row in rows if row[0].startswith(prefixes) and row[0] not in self.seen_keys]
+        self.remove(stale_keys)
+        return len(stale_keys)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -7,9 +7,11 @@ from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
 
 
 class MoveFileToSnowflakeOperator(BaseOperator):
-    def __init__(self, db_conn_id, stage_name, *args, **kwargs):
+    def __init__(self, db_conn_id, stage_name, keep_local_copy=True, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.stage_name = stage_name
+        # Duplicate the file for a data check reading it locally, not needed when it compares the staged file
+        self.keep_local_copy = keep_local_copy
         self.sf_conn = SnowflakeHook(snowflake_conn_id=db_conn_id).get_conn()
 
 
@@ -48,14 +50,19 @@ class MoveFileToSnowflakeOperator(BaseOperator):
         cursor = self.sf_conn.cursor()
         file_name = os.path.basename(file_path)
 
-        duplicate_file_path = os.path.join(os.path.dirname(file_path),f"duplicate_{file_name}")
+        if self.keep_local_copy:
+            duplicate_file_path = os.path.join(os.path.dirname(file_path),f"duplicate_{file_name}")
 
-        self.log.info(f"Duplicating file {file_path} to {duplicate_file_path} for later use.")
+            self.log.info(f"Duplicating file {file_path} to {duplicate_file_path} for later use.")
 
-        shutil.copy(file_path, duplicate_file_path)
-        self.log.info(f"Successfully copied to  {duplicate_file_path}.")
+            shutil.copy(file_path, duplicate_file_path)
+            self.log.info(f"Successfully copied to  {duplicate_file_path}.")
 
-        context['ti'].xcom_push(key='downloaded_file_path_duplicate', value=duplicate_file_path)
+            context['ti'].xcom_push(key='downloaded_file_path_duplicate', value=duplicate_file_path)
 
         cursor.execute(f"PUT file://{file_path} @{self.stage_name}")
-        self.log.info(f"File {file_path} loaded to stage {self.stage_name}.")
\ No newline at end of file
+        # source, target, ...: the target is the name on the stage, e.g. with the .gz added by AUTO_COMPRESS
+        staged_file_name = cursor.fetchone()[1]
+        self.log.info(f"File {file_path} loaded to stage {self.stage_name} as {staged_file_name}.")
+
+        context['ti'].xcom_push(key='staged_file_name', value=staged_file_name)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import re
+import struct
+
+import numpy as np
+import pandas as pd
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+POSTGRES_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+# Type names from dataset configs and information_schema mapped to the binary wire type they are sent as
+type_aliases = {
+    "smallint": "smallint", "int2": "smallint",
+    "integer": "integer", "int": "integer", "int4": "integer",
+    "bigint": "bigint", "int8": "bigint",
+    "real": "real", "float4": "real",
+    "double precision": "double precision", "float8": "double precision", "float": "double precision",
+    "double": "double precision",
+    "boolean": "boolean", "bool": "boolean",
+    "date": "date",
+    "timestamp": "timestamp", "timestamp without time zone": "timestamp", "datetime": "timestamp",
+    "timestamptz": "timestamptz", "timestamp with time zone": "timestamptz",
+    "text": "text", "varchar": "text", "character varying": "text", "char": "text", "character": "text",
+    "string": "text", "bpchar": "text",
+}
+
+fixed_width_types = {
+    "smallint": ">i2",
+    "integer": ">i4",
+    "bigint": ">i8",
+    "real": ">f4",
+    "double precision": ">f8",
+}
+
+true_values = {"true", "t", "1", "yes", "y"}
+false_values = {"false", "f", "0", "no", "n"}
+
+
+def normalize_type(type_name):
+    """Return the wire type for a configured or information_schema type name, None when binary COPY can't send it."""
+    if isinstance(type_name, dict):
+        type_name = type_name.get("type") or type_name.get("data_type")
+    if not type_name:
+        return None
+    type_name = re.sub(r"\(.*\)", "", str(type_name)).strip().lower()
+    return type_aliases.get(type_name)
+
+
+def check_range(values, dtype, wire_type, series):
+    """Raise instead of letting values outside dtype wrap around (integers) or become infinite (real)."""
+    if np.issubdtype(dtype, np.integer):
+        limits = np.iinfo(dtype)
+        if not np.all(np.mod(values, 1) == 0):
+            raise Exception(f"Column {series.name} has non-integer values for {wire_type}")
+        invalid = (values < limits.min) | (values > limits.max)
+    else:
+        invalid = np.isfinite(values) & (np.abs(values) > np.finfo(dtype).max)
+    if invalid.any():
+        raise Exception(f"Column {series.name} has values out of the {wire_type} range, "
+                        f"e.g. {series[~series.isna()].iloc[int(np.argmax(invalid))]!r}")
+
+
+def encode_column(series, wire_type):
+    """
+    Encode a column of raw (string) values with vectorized pandas/NumPy conversions. Returns (lengths, payload):
+    the field length of every row (-1 for NULL) and the payloads of the non-null rows as one uint8 array.
+    """
+    mask = series.isna().to_numpy()
+    values = series[~mask]
+
+    if wire_type in fixed_width_types:
+        dtype = np.dtype(fixed_width_types[wire_type])
+        # Only the non-null values, so integer columns stay int64 instead of going through float64. astype()
+        # parses strings several times faster than to_numeric(), which is left for values it rejects (e.g. '1.5'
+        # or beyond int64) so they are reported by check_range
+        try:
+            numbers = values.astype(np.int64 if dtype.kind == "i" else np.float64).to_numpy()
+        except (ValueError, OverflowError):
+            numbers = pd.to_numeric(values, errors="raise").to_numpy()
+        check_range(numbers, dtype.newbyteorder("="), wire_type, series)
+        payload = numbers.astype(dtype).view(np.uint8)
+        return np.where(mask, -1, dtype.itemsize).astype(np.int64), payload
+
+    if wire_type == "boolean":
+        tokens = values.astype(str).str.strip().str.lower()
+        is_true, is_false = tokens.isin(true_values), tokens.isin(false_values)
+        if not (is_true | is_false).all():
+            raise Exception(f"Column {series.name} has values that are not booleans, "
+                            f"e.g. {values[~(is_true | is_false)].iloc[0]!r}")
+        return np.where(mask, -1, 1).astype(np.int64), is_true.to_numpy(dtype=np.uint8)
+
+    if wire_type == "date":
+        dates = pd.to_datetime(values, errors="raise").to_numpy(dtype="datetime64[D]")
+        days = (dates - POSTGRES_EPOCH.astype("datetime64[D]")).astype("timedelta64[D]").astype(np.int64)
+        return np.where(mask, -1, 4).astype(np.int64), days.astype(">i4").view(np.uint8)
+
+    if wire_type in ("timestamp", "timestamptz"):
+        timestamps = pd.to_datetime(values, errors="raise", utc=(wire_type == "timestamptz"))
+        if wire_type == "timestamptz":
+            timestamps = timestamps.dt.tz_localize(None)
+        micros = (timestamps.to_numpy(dtype="datetime64[us]") - POSTGRES_EPOCH).astype("timedelta64[us]").astype(np.int64)
+        return np.where(mask, -1, 8).astype(np.int64), micros.astype(">i8").view(np.uint8)
+
+    if wire_type == "text":
+        encoded = values.astype(str).str.encode("utf-8")
+        lengths = np.full(len(series), -1, dtype=np.int64)
+        lengths[~mask] = encoded.str.len().to_numpy(dtype=np.int64)
+        return lengths, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    raise Exception(f"Type {wire_type} is not supported by the binary COPY writer")
+
+
+def scatter(out, starts, sizes, payload):
+    """Copy payload, the concatenation of segments of sizes bytes, to out at the given start offsets."""
+    sizes = np.maximum(sizes, 0)
+    source_starts = np.cumsum(sizes) - sizes
+    out[np.repeat(starts - source_starts, sizes) + np.arange(int(sizes.sum()))] = payload
+
+
+def encode_batch(df, wire_types, constant_fields=()):
+    """
+    Encode a DataFrame as PGCOPY tuples (without header/trailer) into one buffer assembled with NumPy: row sizes
+    and field offsets come from the column lengths, every column's length prefixes and payloads are scattered
+    into place in a few array operations. wire_types gives the wire type per column of df, constant_fields are
+    pre-encoded fields (e.g. metadata columns) appended to every row.
+    """
+    rows = len(df)
+    field_count = np.frombuffer(struct.pack(">h", df.shape[1] + len(constant_fields)), dtype=np.uint8)
+    suffix = np.frombuffer(b"".join(constant_fields), dtype=np.uint8)
+    columns = [encode_column(df[col], wire_types[col]) for col in df.columns]
+
+    # Field count, then a 4-byte length (and the payload) per field, then the constant fields
+    row_sizes = np.full(rows, len(field_count) + len(suffix), dtype=np.int64)
+    for lengths, _ in columns:
+        row_sizes += 4 + np.maximum(lengths, 0)
+    row_ends = np.cumsum(row_sizes)
+    out = np.empty(int(row_ends[-1]) if rows else 0, dtype=np.uint8)
+
+    position = row_ends - row_sizes
+    scatter(out, position, np.full(rows, len(field_count)), np.tile(field_count, rows))
+    position = position + len(field_count)
+    for lengths, payload in columns:
+        scatter(out, position, np.full(rows, 4), lengths.astype(">i4").view(np.uint8))
+        position += 4
+        scatter(out, position, lengths, payload)
+        position += np.maximum(lengths, 0)
+    scatter(out, position, np.full(rows, len(suffix)), np.tile(suffix, rows))
+    return out.tobytes()
+
+
+def encode_value(value, wire_type):
+    """Encode a single field, e.g. a metadata column that is the same for every row."""
+    lengths, payload = encode_column(pd.Series([value], dtype=object), wire_type)
+    return struct.pack(">i", int(lengths[0])) + payload.tobytes()
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from operators.sketch_utils import HyperLogLog, hash_values
+
+# information_schema data types whose file values are told apart as numbers or booleans by the table
+numeric_types = {"smallint", "integer", "bigint", "numeric", "real", "double precision"}
+boolean_types = {"boolean"}
+true_values = {"true", "t", "yes", "y", "on", "1"}
+false_values = {"false", "f", "no", "n", "off", "0"}
+
+
+def normalize_values(series, data_type):
+    """
+    File values (strings) of a column rendered the way the table's data_type tells them apart, so their distinct
+    count matches COUNT(DISTINCT) on the loaded column: numbers without surrounding whitespace, '+' sign and
+    leading or trailing zeros ('007', ' 7', '7.0' -> '7'; '1.50' -> '1.5'), booleans as 'true'/'false'. Values of
+    other types, and exponent notation, are compared as read.
+    """
+    if data_type in numeric_types:
+        values = series.str.strip().str.replace(r"^\+", "", regex=True)
+        values = values.str.replace(r"^(-?)0+(?=\d)", r"\1", regex=True)
+        values = values.str.replace(r"(\.\d*?)0+$", r"\1", regex=True).str.replace(r"\.$", "", regex=True)
+        return values.mask(values == "-0", "0")
+    if data_type in boolean_types:
+        tokens = series.str.strip().str.lower()
+        return tokens.mask(tokens.isin(true_values), "true").mask(tokens.isin(false_values), "false")
+    return series
+
+
+def normalize_frame(df, column_types):
+    """normalize_values() of every column of df with a type in column_types ({column: information_schema type})."""
+    return df.apply(lambda series: normalize_values(series, column_types.get(series.name)))
+
+
+class ColumnProfile:
+    """Non-null count and distinct values (as 64-bit hashes, or a HyperLogLog sketch) of one column."""
+
+    def __init__(self, name, precision=None):
+        self.name = name
+        self.total_count = 0
+        self.sketch = HyperLogLog(precision) if precision else None
+        self.pending = []
+        self.pending_size = 0
+        self.spill_files = None
+
+    def update(self, series):
+        self.total_count += int(series.count())
+        hashes = hash_values(series)
+        if self.sketch is not None:
+            self.sketch.add_hashes(hashes)
+            return
+        hashes = np.unique(hashes)
+        if self.spill_files is not None:
+            self.write_buckets(hashes)
+            return
+        self.pending.append(hashes)
+        self.pending_size += len(hashes)
+        if len(self.pending) > 16:
+            self.consolidate()
+
+    def consolidate(self):
+        if len(self.pending) > 1:
+            self.pending = [np.unique(np.concatenate(self.pending))]
+            self.pending_size = len(self.pending[0])
+
+    def spill(self, spill_dir, buckets):
+        """Move the in-memory hashes to bucket files (by their top bits), later hashes are appended there."""
+        self.spill_files = [os.path.join(spill_dir, f"{id(self)}_{bucket}.bin") for bucket in range(buckets)]
+        self.write_buckets(np.concatenate(self.pending) if self.pending else np.empty(0, dtype=np.uint64))
+        self.pending = []
+        self.pending_size = 0
+
+    def write_buckets(self, hashes):
+        buckets = len(self.spill_files)
+        bucket_ids = (hashes >> np.uint64(58)).astype(np.int64) % buckets
+        for bucket in np.unique(bucket_ids):
+            with open(self.spill_files[bucket], "ab") as file:
+                file.write(hashes[bucket_ids == bucket].tobytes())
+
+    def distinct_count(self):
+        if self.sketch is not None:
+            return self.sketch.estimate()
+        if self.spill_files is None:
+            self.consolidate()
+            return self.pending_size
+        # A value always lands in the same bucket, so distinct counts of the buckets add up
+        distinct = 0
+        for path in self.spill_files:
+            if os.path.exists(path):
+                distinct += len(np.unique(np.fromfile(path, dtype=np.uint64)))
+        return distinct
+
+
+class StreamingFileProfiler:
+    """
+    One-pass, bounded-memory profile (non-null and distinct counts per column) of a file read as DataFrame chunks.
+
+    Distinct values are tracked as 64-bit hashes (8 bytes each whatever the value size). When the columns hold
+    more than max_distinct_in_memory hashes in total, the largest column is spilled to hash-bucket files under
+    spill_dir and its distinct count is computed one bucket at a time at the end. With a precision, columns are
+    counted with HyperLogLog sketches instead and nothing is spilled.
+    """
+
+    def __init__(self, max_distinct_in_memory=2000000, precision=None, spill_dir=None, buckets=64):
+        self.max_distinct_in_memory = max_distinct_in_memory
+        self.precision = precision
+        self.spill_dir = spill_dir
+        self.buckets = buckets
+        self.temp_dir = None
+        self.columns = {}
+
+    def update(self, df):
+        for col in df.columns:
+            if col not in self.columns:
+                self.columns[col] = ColumnProfile(col, self.precision)
+            self.columns[col].update(df[col])
+        self.enforce_memory_limit()
+
+    def enforce_memory_limit(self):
+        in_memory = [profile for profile in self.columns.values() if profile.spill_files is None and profile.sketch is None]
+        while in_memory and sum(profile.pending_size for profile in in_memory) > self.max_distinct_in_memory:
+            largest = max(in_memory, key=lambda profile: profile.pending_size)
+            largest.consolidate()
+            if sum(profile.pending_size for profile in in_memory) <= self.max_distinct_in_memory:
+                break
+            if self.temp_dir is None:
+                self.temp_dir = tempfile.mkdtemp(prefix="profile_spill_", dir=self.spill_dir)
+            largest.spill(self.temp_dir, self.buckets)
+            in_memory.remove(largest)
+
+    def results(self):
+        return {col: {"total_count": profile.total_count, "distinct_count": profile.distinct_count()}
+                for col, profile in self.columns.items()}
+
+    def close(self):
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,186 @@
+import decimal
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Fields are joined with the ASCII unit separator before hashing, on both sides
+FIELD_SEPARATOR = "\x1f"
+
+
+# Snowflake column types the file values can be rendered for exactly as the table renders them, by hash kind.
+# FLOAT (text rendering isn't reproducible), TIMESTAMP_TZ/LTZ (session time zone), VARIANT etc. are refused
+hash_kinds = {
+    "TEXT": "text",
+    "NUMBER": "number",
+    "DATE": "date",
+    "TIMESTAMP_NTZ": "timestamp",
+    "BOOLEAN": "boolean",
+}
+
+boolean_tokens = {"true": "true", "t": "true", "yes": "true", "y": "true", "on": "true", "1": "true",
+                  "false": "false", "f": "false", "no": "false", "n": "false", "off": "false", "0": "false"}
+
+
+def get_hash_kind(col, data_type):
+    hash_kind = hash_kinds.get(str(data_type).upper())
+    if hash_kind is None:
+        raise Exception(f"Column {col} of type {data_type} can't be hashed identically on the file and table side, "
+                        f"use comparison_mode 'rows' or 'warehouse' for this table")
+    return hash_kind
+
+
+def canonical_sql(col, data_type, scale):
+    """Canonical text of a typed table column, as canonical_values() renders the file's text for that type."""
+    hash_kind = get_hash_kind(col, data_type)
+    if hash_kind == "number":
+        # The unscaled integer (1.50 in NUMBER(10,2) -> '150'), independent of how NUMBER is rendered as text
+        return f"""("{col}" * {10 ** int(scale or 0)})::NUMBER(38,0)::VARCHAR"""
+    if hash_kind == "date":
+        return f"""TO_VARCHAR("{col}", 'YYYY-MM-DD')"""
+    if hash_kind == "timestamp":
+        return f"""TO_VARCHAR("{col}", 'YYYY-MM-DD HH24:MI:SS.FF6')"""
+    if hash_kind == "boolean":
+        return f"""IFF("{col}", 'true', 'false')"""
+    return f'"{col}"::VARCHAR'
+
+
+def canonical_number(value, scale):
+    try:
+        # COPY rounds values with more decimals than the column scale half away from zero
+        unscaled = decimal.Decimal(value).scaleb(scale).quantize(decimal.Decimal(1), rounding=decimal.ROUND_HALF_UP)
+    except decimal.InvalidOperation:
+        return value
+    return str(int(unscaled))
+
+
+def canonical_values(series, data_type, scale):
+    """
+    Render the file's text values of a column the way canonical_sql() renders the loaded column: values are
+    trimmed (the file format has TRIM_SPACE) and empty values are NULL (''). Values that don't parse as the column
+    type are left as they are, so they show up as differences.
+    """
+    hash_kind = get_hash_kind(series.name, data_type)
+    values = series.fillna("").astype(str).str.strip()
+    present = values != ""
+    if hash_kind == "number":
+        scale = int(scale or 0)
+        return values.where(~present, values.map(lambda value: canonical_number(value, scale) if value else value))
+    if hash_kind in ("date", "timestamp"):
+        if hash_kind == "date":
+            # The file format's DATE_FORMAT
+            parsed = pd.to_datetime(values.where(present), format="%Y-%m-%d", errors="coerce")
+            rendered = parsed.dt.strftime("%Y-%m-%d")
+        else:
+            parsed = pd.to_datetime(values.where(present), format="ISO8601", errors="coerce")
+            rendered = parsed.dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+        return values.where(parsed.isna(), rendered)
+    if hash_kind == "boolean":
+        tokens = values.str.lower().map(boolean_tokens)
+        return values.where(tokens.isna() | ~present, tokens)
+    return values
+
+
+def row_hash_sql(cols, column_types):
+    """
+    Snowflake expression of the 64-bit row hash computed by hash_rows(): the lower 64 bits of the MD5 of the
+    canonical text of the column values (canonical_sql, NULL as '') joined with FIELD_SEPARATOR. column_types
+    maps each column to its (DATA_TYPE, NUMERIC_SCALE). HASH() can't be reproduced outside Snowflake, MD5 can.
+    """
+    values = ", ".join(f"COALESCE({canonical_sql(col, *column_types[col])}, '')" for col in cols)
+    return f"MD5_NUMBER_LOWER64(CONCAT_WS(CHAR(31), {values}))"
+
+
+def hash_rows(df, column_types):
+    """
+    64-bit hash of every row of a DataFrame of file strings (NaN as ''), matching row_hash_sql(). The canonical
+    values, the joining and the encoding are vectorized per column and the lower 64 bits are taken from all the
+    digests at once; MD5 itself has no vectorized implementation in NumPy/pandas, so it stays one hashlib call per
+    row (pandas' vectorized hash_pandas_object can't be reproduced by Snowflake).
+    """
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    columns = [canonical_values(df[col], *column_types[col]) for col in df.columns]
+    rows = columns[0].str.cat(columns[1:], sep=FIELD_SEPARATOR).str.encode("utf-8")
+    md5 = hashlib.md5
+    digests = b"".join([md5(row).digest() for row in rows])
+    # Each digest is a 128-bit big-endian integer, its lower 64 bits are the second 8 bytes
+    return np.frombuffer(digests, dtype=">u8")[1::2].astype(np.uint64)
+
+
+def diff_hash_multisets(file_hashes, table_hashes):
+    """
+    Compare two multisets of row hashes. Returns (missing, extra): arrays of (hash, count) rows that are in the
+    file more often than in the table, and in the table more often than in the file.
+    """
+    file_unique, file_counts = np.unique(file_hashes, return_counts=True)
+    table_unique, table_counts = np.unique(table_hashes, return_counts=True)
+    all_hashes = np.union1d(file_unique, table_unique)
+
+    difference = np.zeros(len(all_hashes), dtype=np.int64)
+    difference[np.searchsorted(all_hashes, file_unique)] += file_counts
+    difference[np.searchsorted(all_hashes, table_unique)] -= table_counts
+
+    missing = np.flatnonzero(difference > 0)
+    extra = np.flatnonzero(difference < 0)
+    return (np.stack([all_hashes[missing], difference[missing].astype(np.uint64)], axis=1),
+            np.stack([all_hashes[extra], (-difference[extra]).astype(np.uint64)], axis=1))
+
+
+def bucket_aggregates(hashes, modulus):
+    """
+    Per-bucket (row count, sum of the row hashes mod 2^64) of row hashes bucketed by hash % modulus, as a dict
+    keyed by bucket. Matches bucket_aggregates_sql(), whose sums are reduced with reduce_hash_sum().
+    """
+    buckets, inverse, counts = np.unique(hashes % np.uint64(modulus), return_inverse=True, return_counts=True)
+    sums = np.zeros(len(buckets), dtype=np.uint64)
+    # uint64 additions wrap around, i.e. sum mod 2^64
+    np.add.at(sums, inverse, hashes)
+    return {int(bucket): (int(count), int(hash_sum)) for bucket, count, hash_sum in zip(buckets, counts, sums)}
+
+
+def bucket_aggregates_sql(hash_source, modulus, parent_modulus=None, parent_buckets=None):
+    """
+    Snowflake query of the per-bucket row count and hash sum of the ROW_HASH column of hash_source, restricted
+    to the given buckets of the previous (coarser) level.
+    """
+    return f"""
+    SELECT MOD(ROW_HASH, {modulus}) AS BUCKET, COUNT(*) AS ROW_COUNT, SUM(ROW_HASH) AS HASH_SUM
+    FROM ({hash_source})
+    {bucket_filter_sql(parent_modulus, parent_buckets)}
+    GROUP BY 1
+    """
+
+
+def bucket_hashes_sql(hash_source, modulus=None, buckets=None):
+    """Snowflake query of the ROW_HASH column of hash_source, restricted to the given buckets (all rows if None)."""
+    return f"SELECT ROW_HASH FROM ({hash_source}) {bucket_filter_sql(modulus, buckets)}".rstrip()
+
+
+def bucket_filter_sql(modulus, buckets):
+    if buckets is None:
+        return ""
+    return f"WHERE MOD(ROW_HASH, {modulus}) IN ({', '.join(str(bucket) for bucket in buckets)})"
+
+
+def bounded_bucket_filter(modulus, buckets, parent_modulus, parent_buckets, max_buckets):
+    """
+    The (modulus, buckets) to restrict a query to: the given buckets, or when there are more than max_buckets of
+    them, the buckets of the previous level they split from (None buckets, i.e. no filter, above the first level).
+    The previous level's list is only split further when it is within max_buckets, so the IN list stays bounded;
+    the rows of the other buckets it lets through are filtered out after the fetch.
+    """
+    if len(buckets) <= max_buckets:
+        return modulus, buckets
+    return parent_modulus, parent_buckets
+
+
+def reduce_hash_sum(value):
+    # SUM() of the 64-bit hashes is an exact NUMBER(38,0) in Snowflake
+    return int(value) % (1 << 64)
+
+
+def differing_buckets(file_buckets, table_buckets):
+    """Buckets whose row count or hash sum differ between the file and the table, sorted."""
+    return sorted(bucket for bucket in file_buckets.keys() | table_buckets.keys()
+                  if file_buckets.get(bucket) != table_buckets.get(bucket))
@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def iter_object_pages(s3_client, bucket_name, prefix, delimiter=None, start_after=None):
+    """
+    Yield every list_objects_v2 response under prefix, following NextContinuationToken until IsTruncated is false.
+    """
+    params = {"Bucket": bucket_name, "Prefix": prefix}
+    if delimiter:
+        params["Delimiter"] = delimiter
+    if start_after:
+        params["StartAfter"] = start_after
+
+    while True:
+        response = s3_client.list_objects_v2(**params)
+        yield response
+        if not response.get("IsTruncated"):
+            break
+        params["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def match_page(response, pattern, stats, on_page=None):
+    """Apply the regex to a single page of results and return the matching objects."""
+    contents = response.get("Contents", [])
+    stats["pages"] += 1
+    stats["keys"] += len(contents)
+    if on_page is not None:
+        on_page(contents)
+    return [obj for obj in contents if pattern.search(obj["Key"])]
+
+
+def list_prefix(s3_client, bucket_name, prefix, pattern, start_after=None, on_page=None):
+    """Paginate a single prefix serially, filtering each page as it arrives."""
+    stats = {"pages": 0, "keys": 0}
+    matches = []
+    for response in iter_object_pages(s3_client, bucket_name, prefix, start_after=start_after):
+        matches.extend(match_page(response, pattern, stats, on_page))
+    return matches, stats
+
+
+def split_prefix(s3_client, bucket_name, prefix, pattern, stats, on_page=None):
+    """
+    List one level of prefix with Delimiter='/'. Keys sitting directly under prefix are matched here,
+    the CommonPrefixes are returned so they can be listed concurrently.
+    """
+    sub_prefixes = []
+    matches = []
+    for response in iter_object_pages(s3_client, bucket_name, prefix, delimiter="/"):
+        matches.extend(match_page(response, pattern, stats, on_page))
+        sub_prefixes.extend(common_prefix["Prefix"] for common_prefix in response.get("CommonPrefixes", []))
+    return sub_prefixes, matches
+
+
+def list_matching_objects(s3_client, bucket_name, prefix, pattern, sub_prefixes=None, max_workers=8,
+                          max_split_depth=3, on_page=None):
+    """
+    List every object under prefix whose key matches the compiled pattern.
+
+    Small prefixes are listed serially: when the first page is not truncated no extra call is made.
+    Large prefixes (first page truncated) are split into sub-prefixes, either the explicit sub_prefixes
+    (e.g. a rendered date partition) or the CommonPrefixes discovered with Delimiter='/', and the
+    sub-prefixes are paginated concurrently on a pool of at most max_workers threads.
+    on_page, when given, receives the raw Contents of every page and may be called from worker threads.
+
+    Returns (matching objects sorted by key, listing stats).
+    """
+    stats = {"pages": 0, "keys": 0, "prefixes": 1}
+
+    if sub_prefixes:
+        prefixes = sorted({prefix + sub_prefix for sub_prefix in sub_prefixes})
+        matches = []
+    else:
+        pages = iter_object_pages(s3_client, bucket_name, prefix)
+        first_page = next(pages)
+        if not first_page.get("IsTruncated") or max_workers <= 1:
+            matches = match_page(first_page, pattern, stats, on_page)
+            for response in pages:
+                matches.extend(match_page(response, pattern, stats, on_page))
+            return sorted(matches, key=lambda obj: obj["Key"]), stats
+        pages.close()
+
+        # Split the keyspace on "/", descending through single-child levels (e.g. "year=2026/")
+        # until there is more than one sub-prefix to hand to the thread pool
+        prefixes = [prefix]
+        matches = []
+        depth = 0
+        while len(prefixes) == 1 and depth < max_split_depth:
+            children, direct_matches = split_prefix(s3_client, bucket_name, prefixes[0], pattern, stats, on_page)
+            matches.extend(direct_matches)
+            prefixes = children
+            depth += 1
+
+    stats["prefixes"] = max(len(prefixes), 1)
+    if prefixes:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prefixes)))) as executor:
+            futures = [executor.submit(list_prefix, s3_client, bucket_name, sub_prefix, pattern, None, on_page)
+                       for sub_prefix in prefixes]
+            for future in as_completed(futures):
+                prefix_matches, prefix_stats = future.result()
+                matches.extend(prefix_matches)
+                stats["pages"] += prefix_stats["pages"]
+                stats["keys"] += prefix_stats["keys"]
+
+    return sorted(matches, key=lambda obj: obj["Key"]), stats
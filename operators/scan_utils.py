@@ -0,0 +1,158 @@
+import os
+import re
+
+REGEX_METACHARS = set(".^$*+?{}[]|()")
+
+
+def split_pattern_segments(pattern, separator="/"):
+    """Split a regex on the separator characters that are not escaped, inside a character class or inside a group."""
+    segments = []
+    current = []
+    class_depth = 0
+    group_depth = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\" and index + 1 < len(pattern):
+            current.append(pattern[index:index + 2])
+            index += 2
+            continue
+        if char == "[":
+            class_depth += 1
+        elif char == "]" and class_depth:
+            class_depth -= 1
+        elif char == "(" and not class_depth:
+            group_depth += 1
+        elif char == ")" and not class_depth and group_depth:
+            group_depth -= 1
+        elif char == separator and not class_depth and not group_depth:
+            segments.append("".join(current))
+            current = []
+            index += 1
+            continue
+        current.append(char)
+        index += 1
+    segments.append("".join(current))
+    return segments
+
+
+def literal_prefix(segment):
+    """
+    Return (prefix, is_literal): the literal text every match of segment starts with, and whether the
+    whole segment is literal (no unescaped regex metacharacters).
+    """
+    prefix = []
+    index = 0
+    while index < len(segment):
+        char = segment[index]
+        if char == "\\" and index + 1 < len(segment):
+            escaped = segment[index + 1]
+            if escaped.isalnum():
+                # \d, \w, \s ... are classes, not literals
+                break
+            literal, width = escaped, 2
+        elif char in REGEX_METACHARS:
+            break
+        else:
+            literal, width = char, 1
+        next_char = segment[index + width] if index + width < len(segment) else ""
+        if next_char in ("*", "?", "{"):
+            # The quantifier makes this character optional or repeated
+            break
+        prefix.append(literal)
+        index += width
+    return "".join(prefix), index == len(segment)
+
+
+class PartitionPrunedScanner:
+    """
+    Lazily scan a local directory for files matching a rendered file_pattern using os.scandir.
+
+    Paths are matched with pattern.search() like the full os.walk, so an unanchored pattern can match at
+    any depth and nothing is pruned for it. When the pattern is anchored with '^' followed by root_dir
+    (e.g. "^/data/netflix/2026/01/15/.*\\.csv"), its directory part (everything before the last '/') is
+    matched one level at a time below root_dir, so only subdirectories matching the corresponding segment
+    (e.g. the rendered "2026/01/15" date partition) are descended into, and literal segments are resolved
+    without listing their parent at all. Below the last directory segment every subdirectory is walked. A
+    path is yielded when it contains the literal prefix of the pattern's last segment and pattern.search()
+    matches it. entries_visited counts the directory entries examined.
+    """
+
+    def __init__(self, root_dir, file_pattern):
+        self.root_dir = root_dir
+        self.pattern = re.compile(file_pattern)
+        self.entries_visited = 0
+        self.files_visited = 0
+        if len(split_pattern_segments(file_pattern, separator="|")) > 1:
+            # A top-level alternation can match unrelated paths, nothing can be pruned
+            self.dir_segments = []
+            self.required_literal = ""
+        elif not file_pattern.startswith("^"):
+            # search() matches an unanchored pattern anywhere in the path, e.g. below another directory level
+            self.dir_segments = []
+            self.required_literal = literal_prefix(split_pattern_segments(file_pattern)[-1])[0]
+        else:
+            self.dir_segments = self.get_dir_segments(file_pattern)
+            self.required_literal = literal_prefix(split_pattern_segments(file_pattern.lstrip("^"))[-1])[0]
+
+    def get_dir_segments(self, file_pattern):
+        segments = split_pattern_segments(file_pattern.lstrip("^"))[:-1]
+
+        # The anchored pattern has to start with root_dir for its remaining segments to line up with the levels
+        # below root_dir, otherwise walk everything
+        root_parts = os.path.normpath(self.root_dir).split(os.sep)
+        literals = [literal_prefix(segment) for segment in segments]
+        if len(segments) < len(root_parts) or not all(is_literal and value == part for (value, is_literal), part
+                                                      in zip(literals, root_parts)):
+            return []
+        segments = segments[len(root_parts):]
+
+        dir_segments = []
+        for segment in segments:
+            value, is_literal = literal_prefix(segment)
+            try:
+                dir_segments.append((value if is_literal else None, re.compile(segment)))
+            except re.error:
+                # A group split across "/" cannot be pruned level by level, walk everything instead
+                return []
+        return dir_segments
+
+    def scan(self):
+        if os.path.isdir(self.root_dir):
+            yield from self.scan_dir(self.root_dir, 0)
+
+    def scan_dir(self, path, depth):
+        if depth < len(self.dir_segments):
+            literal, regex = self.dir_segments[depth]
+            if literal is not None:
+                # Literal partition directory: look it up directly instead of listing the parent
+                self.entries_visited += 1
+                child = os.path.join(path, literal)
+                if os.path.isdir(child):
+                    yield from self.scan_dir(child, depth + 1)
+                return
+
+            sub_dirs = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    self.entries_visited += 1
+                    if entry.is_dir() and regex.fullmatch(entry.name):
+                        sub_dirs.append(entry.path)
+            for sub_dir in sorted(sub_dirs):
+                yield from self.scan_dir(sub_dir, depth + 1)
+            return
+
+        sub_dirs = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                self.entries_visited += 1
+                if entry.is_dir():
+                    # Like os.walk, symlinked directories are not followed
+                    if not entry.is_symlink():
+                        sub_dirs.append(entry.path)
+                elif entry.is_file():
+                    self.files_visited += 1
+                    if self.required_literal in entry.path and self.pattern.search(entry.path):
+                        yield entry.path
+        for sub_dir in sorted(sub_dirs):
+            yield from self.scan_dir(sub_dir, depth + 1)
@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def bit_length(values):
+    """Vectorized int.bit_length() of uint64 values, exact (32-bit halves convert to float64 without rounding)."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def hash_values(series):
+    """64-bit hashes of the non-null values of a column."""
+    return pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch over 64-bit hashes, updated a batch of hashes at a time with NumPy.
+
+    Up to exact_limit distinct hashes are kept as a set, so small columns are counted exactly (64-bit hash
+    collisions aside); past it the sketch switches to 2^precision registers with a relative standard error
+    of about 1.04 / sqrt(2^precision).
+    """
+
+    def __init__(self, precision=14, exact_limit=None):
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.exact_limit = self.register_count // 4 if exact_limit is None else exact_limit
+        self.exact_hashes = set()
+        self.registers = None
+
+    @staticmethod
+    def precision_for_error(relative_error):
+        """Smallest precision whose standard error is at most relative_error."""
+        return min(18, max(4, math.ceil(math.log2((1.04 / relative_error) ** 2))))
+
+    @staticmethod
+    def standard_error(precision):
+        return 1.04 / math.sqrt(1 << precision)
+
+    def add_hashes(self, hashes):
+        if self.registers is None:
+            self.exact_hashes.update(np.unique(hashes).tolist())
+            if len(self.exact_hashes) <= self.exact_limit:
+                return
+            hashes = np.fromiter(self.exact_hashes, dtype=np.uint64, count=len(self.exact_hashes))
+            self.exact_hashes = set()
+            self.registers = np.zeros(self.register_count, dtype=np.uint8)
+
+        width = 64 - self.precision
+        indexes = (hashes >> np.uint64(width)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << width) - 1)
+        # Position of the leftmost 1-bit in the remaining width bits
+        ranks = (width - bit_length(remainder) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, indexes, ranks)
+
+    def merge(self, other):
+        """Fold in another sketch of the same precision, as if its hashes had been added to this one."""
+        if other.precision != self.precision:
+            raise Exception(f"Can't merge a HyperLogLog of precision {other.precision} into one of precision "
+                            f"{self.precision}")
+        if other.registers is None:
+            self.add_hashes(np.fromiter(other.exact_hashes, dtype=np.uint64, count=len(other.exact_hashes)))
+            return self
+        if self.registers is None:
+            hashes = np.fromiter(self.exact_hashes, dtype=np.uint64, count=len(self.exact_hashes))
+            self.exact_hashes = set()
+            self.registers = np.zeros(self.register_count, dtype=np.uint8)
+            self.add_hashes(hashes)
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def add_series(self, series):
+        self.add_hashes(hash_values(series))
+        return self
+
+    def estimate(self):
+        if self.registers is None:
+            return len(self.exact_hashes)
+        m = self.register_count
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw_estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zero_registers = int(np.count_nonzero(self.registers == 0))
+        if raw_estimate <= 2.5 * m and zero_registers:
+            # Small range correction (linear counting)
+            return int(round(m * math.log(m / zero_registers)))
+        return int(round(raw_estimate))
@@ -12,12 +12,16 @@ from core_utils.config_reader_dbt import ConfigReaderDBT
 from core_utils.file_utils import read_and_infer,identify_delimiter
 
 from operators.constants import mirror_file_meta_cols, mirror_meta_cols
+from operators.dag_utils import find_upstream_xcom
+from operators.snowflake_stage_utils import create_file_format
 
 
 class SnowflakeCopyOperator(BaseOperator):
-    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, stage_name=None, table_name=None, encoding=None, dataset_name=None, *args, **kwargs):
+    def __init__(self, db_conn_id, s3_conn_id=None, bucket_name=None, configs_path=None, stage_name=None, table_name=None, encoding=None, dataset_name=None, purge=True, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.stage_name = stage_name
+        # Remove the file from the stage after loading it, keep it (False) for an in-warehouse data check
+        self.purge = purge
         self.table_name = table_name
         self.dataset_name = dataset_name
         self.bucket_name = bucket_name
@@ -27,47 +31,20 @@ class SnowflakeCopyOperator(BaseOperator):
         self.file_format_props = kwargs.get("file_format",None)
         self.sf_conn = SnowflakeHook(snowflake_conn_id=db_conn_id).get_conn()
 
-    def get_snowflake_stg_file_details(self):
-        try:
-            list_files_query = f"list @{self.stage_name}"
-            with self.sf_conn.cursor() as cur:
-                cur.execute(list_files_query)
-                result = cur.fetchall()
-                stage_file_name = result[0][0].split("/")[-1]
-                # file_name = stage_file_name.replace(".gz", "") if stage_file_name.endswith(".gz") else stage_file_name
-                # db_schema = ".".join(self.table_name.split(".")[:-1])
-                # file_format = f"""{db_schema}.ff_{self.stage_name.split(".")[-1][4:].lower().split('.')[0]}"""
-                # compression = "gzip" if stage_file_name != "csv" else "NONE"
-                self.log.info(f"Stage file:{stage_file_name}")
-            return stage_file_name
-        except Exception as ex:
-            self.log.error(f"Query Result:{result} and error is:{ex.__str__()}")
-
-    def create_file_format(self,conn, file_format_name, file_type="CSV", delimiter=",",skip_header=1, compression="NONE"):
-        # Define the SQL command to create the file format
-
-        create_file_format_sql = f"""
-        CREATE OR REPLACE FILE FORMAT {file_format_name}
-        TYPE = {file_type}
-        FIELD_OPTIONALLY_ENCLOSED_BY = '"'
-        FIELD_DELIMITER = '{delimiter}'
-        SKIP_HEADER = {skip_header}      
-        TRIM_SPACE=TRUE,
-        REPLACE_INVALID_CHARACTERS=TRUE,
-        DATE_FORMAT='YYYY-MM-DD',
-        TIME_FORMAT=AUTO,
-        TIMESTAMP_FORMAT=AUTO
-        ERROR_ON_COLUMN_COUNT_MISMATCH = TRUE
-        COMPRESSION = {compression};
+    def get_snowflake_stg_file_details(self, context):
         """
-        self.log.info(f"File format sql: {create_file_format_sql}")
-
-        # Execute the SQL command to create the file format
-        with conn.cursor() as cur:
-            cur.execute(create_file_format_sql)
-            self.log.info(f"File format {file_format_name} created successfully.")
+        Name(s) of the file(s) this run PUT to the stage, the staged_file_name XCom of MoveFileToSnowflakeOperator.
+        Only these are loaded, files left on the stage by other runs (e.g. kept for a failed data check) are not.
+        """
+        staged_files = find_upstream_xcom(context, 'staged_file_name')
+        if not staged_files:
+            raise Exception("No staged_file_name XCom found upstream, the file has to be PUT to the stage by "
+                            "MoveFileToSnowflakeOperator in this DAG run")
+        staged_files = [staged_files] if isinstance(staged_files, str) else list(staged_files)
+        self.log.info(f"Stage files:{staged_files}")
+        return staged_files
 
-    def copy_into_table(self,conn, stage_name, table_name,columns, file_format_name, file_path,run_date):
+    def copy_into_table(self,conn, stage_name, table_name,columns, file_format_name, file_names,run_date):
 
         cols_list_str = ",".join([f"${index+1} as {col_name.upper()}" for index, col_name in enumerate(columns)])
 
@@ -77,6 +54,8 @@ class SnowflakeCopyOperator(BaseOperator):
 
         meta_cols_list_str = ",".join(meta_cols)
 
+        files_list_str = ",".join(f"'{file_name}'" for file_name in file_names)
+
         truncate_sql = f"""TRUNCATE TABLE "{table_name}";"""
 
         # Define the SQL command to load data from the stage into the table
@@ -87,11 +66,11 @@ class SnowflakeCopyOperator(BaseOperator):
             current_timestamp as created_dts, current_user as created_by
             FROM '@{stage_name}'
         )
-        FILES = ('{file_path}')
+        FILES = ({files_list_str})
         FILE_FORMAT = (FORMAT_NAME={file_format_name})
         FORCE = FALSE
         ON_ERROR = CONTINUE
-        PURGE = TRUE;
+        PURGE = {str(self.purge).upper()};
         """
 
         self.log.info(f"File format sql: {copy_sql}")
@@ -100,7 +79,7 @@ class SnowflakeCopyOperator(BaseOperator):
         with conn.cursor() as cur:
             cur.execute(truncate_sql)
             cur.execute(copy_sql)
-            self.log.info(f"Data loaded into {table_name} from @{stage_name}/{file_path}.")
+            self.log.info(f"Data loaded into {table_name} from @{stage_name} files {file_names}.")
 
     def get_file_details(self, run_date):
         temp_dir = tempfile.mkdtemp()
@@ -153,15 +132,15 @@ class SnowflakeCopyOperator(BaseOperator):
         delimiter = file_format_params["delimiter"]
         compression = 'GZIP' if file_format_params["compressed"] else None
 
-        self.create_file_format(conn=self.sf_conn, delimiter=delimiter,
-                                skip_header=file_format_params["skip_header"],
-                                file_format_name=file_format_name,
-                                compression=compression)
+        create_file_format(conn=self.sf_conn, log=self.log, delimiter=delimiter,
+                           skip_header=file_format_params["skip_header"],
+                           file_format_name=file_format_name,
+                           compression=compression)
 
-        stage_file_name = self.get_snowflake_stg_file_details()
+        stage_file_names = self.get_snowflake_stg_file_details(context)
 
         columns = list(configs[self.dataset_name]["mirror"]["file_schema"].keys())
 
         self.log.info(f"File schema: {columns}")
 
-        self.copy_into_table(self.sf_conn, self.stage_name, self.table_name, columns, file_format_name, stage_file_name,dag_run_date)
\ No newline at end of file
+        self.copy_into_table(self.sf_conn, self.stage_name, self.table_name, columns, file_format_name, stage_file_names,dag_run_date)
\ No newline at end of file
@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+import pandas as pd
+from snowflake.connector.errors import NotSupportedError, ProgrammingError
+
+
+class FetchMetrics:
+    """Batches, rows and bytes fetched from one Snowflake result set, and the seconds until its first batch."""
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.rows = 0
+        self.bytes = 0
+        self.arrow = False
+        self.seconds_to_first_batch = None
+        self.seconds = 0.0
+
+    def record(self, rows, nbytes, elapsed):
+        if self.seconds_to_first_batch is None:
+            self.seconds_to_first_batch = round(elapsed, 3)
+        self.batches += 1
+        self.rows += rows
+        self.bytes += int(nbytes)
+
+    def as_dict(self):
+        return {"name": self.name, "batches": self.batches, "rows": self.rows, "bytes": self.bytes,
+                "arrow": self.arrow, "seconds_to_first_batch": self.seconds_to_first_batch,
+                "seconds": round(self.seconds, 3)}
+
+
+def iter_result_batches(cursor, chunk_size=100000, metrics=None):
+    """
+    Yield the executed cursor's result as pyarrow Tables (the connector's Arrow result batches, no Python tuples
+    are built; pyarrow comes with snowflake-connector-python[pandas]) or, when the result isn't in Arrow format,
+    as DataFrames built from fetchmany(chunk_size).
+    """
+    start = time.monotonic()
+    try:
+        # Raises when the result isn't in Arrow format (e.g. SHOW/LIST), or without the connector's pandas extra
+        batches = cursor.fetch_arrow_batches()
+        if metrics is not None:
+            metrics.arrow = True
+    except (NotSupportedError, ProgrammingError):
+        batches = iter_fetchmany_batches(cursor, chunk_size)
+
+    for batch in batches:
+        if metrics is not None:
+            nbytes = batch.nbytes if hasattr(batch, "nbytes") else batch.memory_usage(index=False).sum()
+            metrics.record(len(batch), nbytes, time.monotonic() - start)
+        yield batch
+    if metrics is not None:
+        metrics.seconds = time.monotonic() - start
+
+
+def iter_fetchmany_batches(cursor, chunk_size):
+    columns = [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield pd.DataFrame(rows, columns=columns)
+
+
+def iter_dataframes(cursor, chunk_size=100000, metrics=None, parquet_path=None):
+    """
+    Stream the executed cursor's result as DataFrames, one per result batch. With a parquet_path the batches are
+    also written to that Parquet file as they arrive (requires pyarrow).
+    """
+    writer = None
+    try:
+        for batch in iter_result_batches(cursor, chunk_size, metrics):
+            if parquet_path:
+                writer = write_parquet_batch(writer, parquet_path, batch)
+            yield batch.to_pandas() if hasattr(batch, "to_pandas") else batch
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_parquet_batch(writer, parquet_path, batch):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise Exception("The pyarrow package is required to write Snowflake results to Parquet")
+    table = batch if isinstance(batch, pa.Table) else pa.Table.from_pandas(batch, preserve_index=False)
+    if writer is None:
+        writer = pq.ParquetWriter(parquet_path, table.schema)
+    writer.write_table(table.cast(writer.schema))
+    return writer
+
+
+def fetch_dataframe(cursor, chunk_size=100000, metrics=None, parquet_path=None):
+    """The executed cursor's whole result as one DataFrame, see iter_dataframes()."""
+    frames = list(iter_dataframes(cursor, chunk_size, metrics, parquet_path))
+    if not frames:
+        return pd.DataFrame(columns=[column[0] for column in cursor.description])
+    return pd.concat(frames, ignore_index=True)
+
+
+def fetch_column(cursor, dtype, chunk_size=100000, metrics=None):
+    """
+    The first column of the executed cursor's result as a NumPy array of dtype. Arrow batches are cast in
+    pyarrow, e.g. NUMBER(20,0) (decimal128) to uint64, without going through Python objects.
+    """
+    arrays = []
+    for batch in iter_result_batches(cursor, chunk_size, metrics):
+        if hasattr(batch, "to_pandas"):
+            import pyarrow as pa
+            column = batch.column(0).cast(pa.from_numpy_dtype(np.dtype(dtype)))
+            arrays.append(column.to_numpy())
+        else:
+            # Object array cast in one NumPy call, also for ints/Decimals beyond int64 (e.g. uint64 hashes)
+            arrays.append(batch.iloc[:, 0].to_numpy(dtype=object).astype(dtype))
+    return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
@@ -0,0 +1,31 @@
+def create_file_format(conn, file_format_name, file_type="CSV", delimiter=",", skip_header=1, compression="NONE",
+                       log=None):
+    """CREATE OR REPLACE the file format staged dataset files are read with."""
+    # Define the SQL command to create the file format
+    create_file_format_sql = f"""
+    CREATE OR REPLACE FILE FORMAT {file_format_name}
+    TYPE = {file_type}
+    FIELD_OPTIONALLY_ENCLOSED_BY = '"'
+    FIELD_DELIMITER = '{delimiter}'
+    SKIP_HEADER = {skip_header}
+    TRIM_SPACE=TRUE,
+    REPLACE_INVALID_CHARACTERS=TRUE,
+    DATE_FORMAT='YYYY-MM-DD',
+    TIME_FORMAT=AUTO,
+    TIMESTAMP_FORMAT=AUTO
+    ERROR_ON_COLUMN_COUNT_MISMATCH = TRUE
+    COMPRESSION = {compression};
+    """
+    if log:
+        log.info(f"File format sql: {create_file_format_sql}")
+
+    # Execute the SQL command to create the file format
+    with conn.cursor() as cur:
+        cur.execute(create_file_format_sql)
+    if log:
+        log.info(f"File format {file_format_name} created successfully.")
+
+
+def staged_file_location(stage_name, file_name):
+    """Stage location of one staged file, e.g. for FROM @<location> or LIST/REMOVE."""
+    return f"{stage_name.rstrip('/')}/{file_name}"
@@ -0,0 +1,42 @@
+import os
+
+from operators import cache_utils
+from operators.cache_utils import DownloadCache
+
+
+def populate_with(content):
+    def populate(path):
+        with open(path, "wb") as file:
+            file.write(content)
+    return populate
+
+
+def test_hit_is_an_independent_file(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"), max_bytes=1024)
+    first, second = str(tmp_path / "first.csv"), str(tmp_path / "second.csv")
+
+    assert cache.fetch("key", first, populate_with(b"a,b\n"))[0] is False
+    hit, method = cache.fetch("key", second, populate_with(b"not called"))
+
+    assert hit is True and method in ("reflink", "copy")
+    with open(second, "ab") as file:
+        file.write(b"1,2\n")
+    with open(cache.path_for("key"), "rb") as file:
+        assert file.read() == b"a,b\n"
+    assert os.stat(second).st_ino != os.stat(cache.path_for("key")).st_ino
+
+
+def test_evicts_least_recently_used_walking_the_cache_once(tmp_path, monkeypatch):
+    walks = []
+    walk = os.walk
+    monkeypatch.setattr(cache_utils.os, "walk", lambda *args: walks.append(args) or walk(*args))
+    cache = DownloadCache(str(tmp_path / "cache"), max_bytes=250)
+
+    for number in range(5):
+        cache.fetch(f"key{number}", str(tmp_path / f"file{number}"), populate_with(b"x" * 100))
+        os.utime(cache.path_for(f"key{number}"), (number, number))
+        cache.track(cache.path_for(f"key{number}"))
+
+    assert len(walks) == 1
+    assert cache.total_bytes <= 250
+    assert [os.path.exists(cache.path_for(f"key{number}")) for number in range(5)] == [False] * 3 + [True] * 2
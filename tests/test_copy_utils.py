@@ -0,0 +1,78 @@
+import csv
+import io
+import mmap
+
+import pytest
+
+from operators.copy_utils import IterStream, iter_buffer_range, iter_csv_copy_chunks, split_csv_ranges
+
+
+def make_csv(rows=200):
+    lines = []
+    for i in range(rows):
+        if i % 3 == 0:
+            # Quoted field with embedded newlines and doubled (escaped) quotes
+            lines.append(f'{i},"line one\nsays ""hi""\nline three",x\n')
+        elif i % 3 == 1:
+            lines.append(f'{i},"a,b",""\n')
+        else:
+            lines.append(f"{i},plain,y\n")
+    return "id,text,flag\n" + "".join(lines)
+
+
+def parse(data):
+    return list(csv.reader(io.StringIO(data.decode("utf-8"))))
+
+
+@pytest.mark.parametrize("parts", [1, 2, 3, 7, 16, 64])
+def test_split_csv_ranges_keeps_records_whole(parts):
+    data = make_csv().encode("utf-8")
+    start = data.index(b"\n") + 1
+    ranges = split_csv_ranges(data, start, parts)
+
+    assert ranges[0][0] == start and ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    assert len(ranges) <= parts
+    # Each range parses on its own into whole records, together exactly the file's records once
+    records = [record for range_start, range_end in ranges for record in parse(data[range_start:range_end])]
+    assert records == parse(data[start:])
+
+
+def test_split_csv_ranges_on_a_memory_map(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(make_csv(50).encode("utf-8"))
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        start = buffer.find(b"\n") + 1
+        ranges = split_csv_ranges(buffer, start, 4)
+        chunks = [b"".join(iter_buffer_range(buffer, range_start, range_end, chunk_bytes=7))
+                  for range_start, range_end in ranges]
+        assert b"".join(chunks) == buffer[start:]
+    assert sum(len(parse(chunk)) for chunk in chunks) == 50
+
+
+def test_split_csv_ranges_single_quoted_record_is_not_split():
+    data = b'id,text\n1,"' + b"x\n" * 100 + b'"\n'
+    assert split_csv_ranges(data, 8, 4) == [(8, len(data))]
+
+
+def test_iter_stream_reads_across_chunk_boundaries():
+    stream = IterStream([b"ab", b"c\nde", b"", b"f\n", b"g"])
+    assert stream.read(1) == b"a"
+    assert stream.readline() == b"bc\n"
+    assert stream.read(4) == b"def\n"
+    assert stream.readline() == b"g"
+    assert stream.read() == b""
+
+
+def test_iter_csv_copy_chunks_quotes_embedded_newlines_and_counts_rows():
+    reader = csv.reader(io.StringIO(make_csv(30)))
+    next(reader)
+    counter = {}
+    chunks = list(iter_csv_copy_chunks(reader, [0, 1], ["2026-01-14"], ",", counter=counter, chunk_bytes=64))
+
+    assert len(chunks) > 1
+    records = parse(b"".join(chunks))
+    assert len(records) == counter["rows"] == 30
+    assert records[0] == ["0", 'line one\nsays "hi"\nline three', "2026-01-14"]
+    # No record is split across chunks
+    assert sum(len(parse(chunk)) for chunk in chunks) == 30
@@ -0,0 +1,99 @@
+import gzip
+import io
+
+import pytest
+
+from operators.header_utils import detect_bom, read_header, sniff_header, sniff_s3_header, sniff_s3_headers
+
+
+class FakeS3Client:
+    """get_object with a Range over in-memory objects; the Body (BytesIO) has no peek(), like a StreamingBody."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.ranges = []
+
+    def get_object(self, Bucket, Key, Range):
+        data = self.objects[Key]
+        end = int(Range.split("-")[1])
+        self.ranges.append((Key, end + 1))
+        body = data[:end + 1]
+        return {"Body": io.BytesIO(body),
+                "ContentRange": f"bytes 0-{len(body) - 1}/{len(data)}"}
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_detect_bom():
+    assert detect_bom(b"\xff\xfe\x00\x00a") == "utf-32"
+    assert detect_bom(b"\xff\xfea\x00") == "utf-16"
+    assert detect_bom(b"\xef\xbb\xbfa") == "utf-8-sig"
+    assert detect_bom(b"abc") is None
+
+
+def test_sniff_header_plain(tmp_path):
+    path = write(tmp_path, "plain.csv", b"id,name\n1,a\n")
+    assert sniff_header(path) == {"columns": ["id", "name"], "encoding": "utf-8", "bom": False, "quoted": False,
+                                  "complete": True}
+
+
+@pytest.mark.parametrize("encoding", ["utf-8-sig", "utf-16"])
+def test_sniff_header_bom_overrides_the_encoding(tmp_path, encoding):
+    path = write(tmp_path, "bom.csv", "id,näme\n1,a\n".encode(encoding))
+    header = sniff_header(path, encoding="latin-1")
+    assert header["columns"] == ["id", "näme"]
+    assert header["bom"] and header["encoding"] == encoding
+
+
+def test_sniff_header_quoted_names_with_delimiters_and_line_breaks(tmp_path):
+    path = write(tmp_path, "quoted.csv", b'"id","last; first","multi\nline"\r\n1;2;3\r\n'.replace(b",", b";"))
+    header = sniff_header(path, delimiter=";")
+    assert header["columns"] == ["id", "last; first", "multi\nline"]
+    assert header["quoted"] and header["complete"]
+
+
+def test_read_header_of_a_later_row_of_a_gzip_file(tmp_path):
+    path = write(tmp_path, "data.csv.gz", gzip.compress(b"# export\nid,name\n1,a\n"))
+    assert read_header(path, header_row=2) == ["id", "name"]
+
+
+def test_sniff_header_without_line_break_is_incomplete():
+    assert sniff_header(io.BytesIO(b"id,name"))["complete"] is False
+
+
+def test_sniff_header_of_a_short_file_raises(tmp_path):
+    with pytest.raises(Exception):
+        read_header(write(tmp_path, "short.csv", b"id,name\n"), header_row=2)
+
+
+def test_sniff_s3_header_doubles_the_range_until_the_header_is_complete():
+    columns = [f"column_{i}" for i in range(40)]
+    data = (",".join(columns) + "\n1\n").encode("utf-8")
+    client = FakeS3Client({"wide.csv": data})
+    header = sniff_s3_header(client, "bucket", "wide.csv", range_bytes=64)
+    assert header["columns"] == columns
+    assert [size for _, size in client.ranges] == [64, 128, 256, 512]
+
+
+def test_sniff_s3_header_of_a_gzip_object_cut_by_the_range():
+    data = gzip.compress(b"id,name\n" + b"".join(b"%d,name %d\n" % (i, i) for i in range(5000)))
+    client = FakeS3Client({"data.csv.gz": data})
+    assert sniff_s3_header(client, "bucket", "data.csv.gz", range_bytes=16)["columns"] == ["id", "name"]
+    assert len(client.ranges) > 1
+
+
+def test_sniff_s3_header_gives_up_past_the_maximum_range():
+    client = FakeS3Client({"long.csv": b"x" * 1000})
+    with pytest.raises(Exception):
+        sniff_s3_header(client, "bucket", "long.csv", range_bytes=64, max_range_bytes=256)
+
+
+def test_sniff_s3_headers_of_several_keys():
+    client = FakeS3Client({"a.csv": b"id,name\n1,a\n", "b.csv": b"\xef\xbb\xbfid,qty\n"})
+    headers = sniff_s3_headers(client, "bucket", ["a.csv", "b.csv"], max_workers=2)
+    assert {key: header["columns"] for key, header in headers.items()} == {"a.csv": ["id", "name"],
+                                                                          "b.csv": ["id", "qty"]}
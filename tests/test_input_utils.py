@@ -0,0 +1,81 @@
+import bz2
+import gzip
+import io
+import sys
+
+import pytest
+
+from operators.input_utils import detect_codec, open_input, sniff_codec
+
+data = b"id,name\n" + b"".join(b"%d,name %d\n" % (i, i) for i in range(10000))
+
+compressors = {"gzip": gzip.compress, "bz2": bz2.compress, None: lambda payload: payload}
+
+
+class ReadOnlyStream:
+    """A file object with only read() and close(), like an S3 StreamingBody."""
+
+    def __init__(self, payload):
+        self.stream = io.BytesIO(payload)
+        self.closed = False
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("codec", ["gzip", "bz2", None])
+def test_open_input_detects_the_codec_of_a_path(tmp_path, codec):
+    path = tmp_path / "data.csv"
+    path.write_bytes(compressors[codec](data))
+    assert sniff_codec(str(path)) == codec
+    with open_input(str(path)) as stream:
+        assert stream.read() == data
+
+
+@pytest.mark.parametrize("codec", ["gzip", "bz2", None])
+def test_open_input_reads_streams_without_peek(codec):
+    source = ReadOnlyStream(compressors[codec](data))
+    with open_input(source, buffer_size=1024) as stream:
+        assert stream.readline() == b"id,name\n"
+        assert stream.read() == data[len(b"id,name\n"):]
+    assert source.closed
+
+
+def test_open_input_short_uncompressed_stream():
+    with open_input(ReadOnlyStream(b"a\n")) as stream:
+        assert stream.read() == b"a\n"
+
+
+@pytest.mark.parametrize("threads", [0, 1, 4, -1])
+def test_open_input_gzip_threads(tmp_path, threads):
+    pytest.importorskip("isal")
+    path = tmp_path / "data.csv.gz"
+    path.write_bytes(gzip.compress(data))
+    with open_input(str(path), threads=threads) as stream:
+        assert stream.read() == data
+
+
+def test_open_input_gzip_threads_without_isal(tmp_path, monkeypatch):
+    # Without python-isal gzip is decompressed in the reading thread and threads is ignored
+    monkeypatch.setitem(sys.modules, "isal", None)
+    path = tmp_path / "data.csv.gz"
+    path.write_bytes(gzip.compress(data))
+    with open_input(str(path), threads=4) as stream:
+        assert stream.read() == data
+
+
+def test_open_input_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "data.csv.zst"
+    path.write_bytes(zstandard.ZstdCompressor().compress(data))
+    with open_input(str(path)) as stream:
+        assert stream.read() == data
+
+
+def test_detect_codec():
+    assert detect_codec(b"\x28\xb5\x2f\xfd") == "zstd"
+    assert detect_codec(b"BZh9") == "bz2"
+    assert detect_codec(b"\x1f") is None
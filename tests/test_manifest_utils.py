@@ -0,0 +1,72 @@
+import re
+
+from operators.manifest_utils import AcquisitionManifest
+
+
+def listed(*objects):
+    return [{"Key": key, "ETag": etag, "Size": 1} for key, etag in objects]
+
+
+def test_delta_keys_are_new_or_changed(tmp_path):
+    manifest_path = str(tmp_path / "manifest.db")
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/")
+    manifest.record(listed(("data/2026/01/14/a.csv", "1"), ("data/2026/01/14/b.csv", "1")))
+    manifest.commit()
+    manifest.close()
+
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/")
+    manifest.record(listed(("data/2026/01/14/a.csv", "1"), ("data/2026/01/14/b.csv", "2"),
+                           ("data/2026/01/15/c.csv", "1"), ("data/2026/01/15/c.txt", "1")))
+
+    assert manifest.matching_delta_keys(re.compile(r"\.csv$")) == ["data/2026/01/14/b.csv", "data/2026/01/15/c.csv"]
+    assert (manifest.new_keys, manifest.changed_keys) == (2, 1)
+    manifest.close()
+
+
+def test_remove_unseen_only_prunes_listed_prefixes(tmp_path):
+    manifest_path = str(tmp_path / "manifest.db")
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/")
+    manifest.record(listed(("data/2026/01/14/a.csv", "1"), ("data/2026/01/15/b.csv", "1")))
+    manifest.commit()
+    manifest.close()
+
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/")
+    manifest.record(listed(("data/2026/01/15/c.csv", "1")))
+
+    assert manifest.remove_unseen(["data/2026/01/15/"]) == 1
+    assert manifest.get_high_water_mark() == "data/2026/01/15/c.csv"
+    remaining = [row[0] for row in manifest.conn.execute("SELECT key FROM acquisition_manifest ORDER BY key")]
+    assert remaining == ["data/2026/01/14/a.csv", "data/2026/01/15/c.csv"]
+    manifest.close()
+
+
+def test_uncommitted_listing_is_listed_again(tmp_path):
+    manifest_path = str(tmp_path / "manifest.db")
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/", run_date="2026-01-14")
+    manifest.record(listed(("data/2026/01/14/a.csv", "1")))
+    manifest.close()
+
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/", run_date="2026-01-14")
+    assert manifest.get_high_water_mark() is None
+    manifest.record(listed(("data/2026/01/14/a.csv", "1")))
+    assert manifest.matching_delta_keys(re.compile(r"\.csv$")) == ["data/2026/01/14/a.csv"]
+    manifest.close()
+
+
+def test_rerun_of_a_date_returns_the_same_keys(tmp_path):
+    manifest_path = str(tmp_path / "manifest.db")
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/", run_date="2026-01-14")
+    manifest.record(listed(("data/2026/01/14/a.csv", "1"), ("data/2026/01/14/b.csv", "1")))
+    manifest.commit()
+    manifest.close()
+
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/", run_date="2026-01-15")
+    manifest.record(listed(("data/2026/01/14/a.csv", "1"), ("data/2026/01/15/c.csv", "1")))
+    assert manifest.matching_delta_keys(re.compile(r"\.csv$")) == ["data/2026/01/15/c.csv"]
+    manifest.commit()
+    manifest.close()
+
+    # A rerun of the first date, listing after the high-water mark, finds nothing new
+    manifest = AcquisitionManifest(manifest_path, dataset="bucket/data/", run_date="2026-01-14")
+    assert manifest.matching_delta_keys(re.compile(r"\.csv$")) == ["data/2026/01/14/a.csv", "data/2026/01/14/b.csv"]
+    manifest.close()
@@ -0,0 +1,82 @@
+import struct
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from operators.pgcopy_utils import PGCOPY_HEADER, PGCOPY_TRAILER, encode_batch, encode_value
+
+POSTGRES_EPOCH = datetime(2000, 1, 1)
+
+decoders = {
+    "smallint": lambda data: struct.unpack(">h", data)[0],
+    "integer": lambda data: struct.unpack(">i", data)[0],
+    "bigint": lambda data: struct.unpack(">q", data)[0],
+    "double precision": lambda data: struct.unpack(">d", data)[0],
+    "boolean": lambda data: data == b"\x01",
+    "date": lambda data: (POSTGRES_EPOCH + timedelta(days=struct.unpack(">i", data)[0])).date(),
+    "timestamp": lambda data: POSTGRES_EPOCH + timedelta(microseconds=struct.unpack(">q", data)[0]),
+    "text": lambda data: data.decode("utf-8"),
+}
+
+
+def decode_copy(data, wire_types):
+    """Parse PGCOPY binary data back into rows of Python values."""
+    assert data.startswith(PGCOPY_HEADER) and data.endswith(PGCOPY_TRAILER)
+    data, offset, rows = data[:-len(PGCOPY_TRAILER)], len(PGCOPY_HEADER), []
+    while offset < len(data):
+        field_count = struct.unpack_from(">h", data, offset)[0]
+        offset += 2
+        row = []
+        for wire_type in wire_types[:field_count]:
+            length = struct.unpack_from(">i", data, offset)[0]
+            offset += 4
+            if length == -1:
+                row.append(None)
+                continue
+            row.append(decoders[wire_type](data[offset:offset + length]))
+            offset += length
+        rows.append(row)
+    return rows
+
+
+def test_round_trip_with_nulls_and_constant_fields():
+    df = pd.DataFrame({
+        "SMALL": ["1", None, "-32768"],
+        "BIG": ["9007199254740993", "-1", None],
+        "FLAG": ["True", "n", None],
+        "DAY": ["2024-01-02", None, "1999-12-31"],
+        "TS": [None, "2024-01-02 03:04:05.123456", "2000-01-01 00:00:00.000000"],
+        "NAME": ["a,b", "", None],
+        "RATIO": ["1.5", None, "-0.25"],
+    })
+    wire_types = {"SMALL": "smallint", "BIG": "bigint", "FLAG": "boolean", "DAY": "date", "TS": "timestamp",
+                  "NAME": "text", "RATIO": "double precision"}
+    constant_fields = [encode_value("file.csv", "text"), encode_value("7", "integer")]
+
+    data = PGCOPY_HEADER + encode_batch(df, wire_types, constant_fields) + PGCOPY_TRAILER
+    rows = decode_copy(data, list(wire_types.values()) + ["text", "integer"])
+
+    assert rows == [
+        [1, 9007199254740993, True, date(2024, 1, 2), None, "a,b", 1.5, "file.csv", 7],
+        [None, -1, False, None, datetime(2024, 1, 2, 3, 4, 5, 123456), "", None, "file.csv", 7],
+        [-32768, None, None, date(1999, 12, 31), datetime(2000, 1, 1), None, -0.25, "file.csv", 7],
+    ]
+
+
+def test_empty_batch():
+    assert encode_batch(pd.DataFrame({"A": pd.Series([], dtype=object)}), {"A": "integer"}) == b""
+
+
+@pytest.mark.parametrize("wire_type, value", [
+    ("integer", "3000000000"),
+    ("smallint", "32768"),
+    ("bigint", "9223372036854775808"),
+    ("integer", "1.5"),
+    ("boolean", "garbage"),
+    ("boolean", "N/A"),
+    ("boolean", "2"),
+])
+def test_invalid_values_raise(wire_type, value):
+    with pytest.raises(Exception):
+        encode_batch(pd.DataFrame({"A": [value]}), {"A": wire_type})
@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+
+from operators.profile_utils import StreamingFileProfiler, normalize_frame, normalize_values
+
+
+@pytest.mark.parametrize("data_type, values, expected", [
+    ("integer", ["007", " 7", "+7", "7.0", "-0", "0", "-12"], ["7", "7", "7", "7", "0", "0", "-12"]),
+    ("numeric", ["1.50", "1.5", "01.5", "0.5", "-0.50", "100", "1."], ["1.5", "1.5", "1.5", "0.5", "-0.5", "100", "1"]),
+    ("boolean", ["TRUE", "t", "yes", " 1", "f", "No", "maybe"], ["true", "true", "true", "true", "false", "false", "maybe"]),
+    ("text", ["007", "7", " 7"], ["007", "7", " 7"]),
+])
+def test_normalize_values(data_type, values, expected):
+    assert normalize_values(pd.Series(values, dtype=object), data_type).tolist() == expected
+
+
+def test_distinct_counts_follow_the_table_types():
+    chunk = pd.DataFrame({"ID": ["7", "007", "7.0", None], "CODE": ["7", "007", "7.0", None]}, dtype=object)
+
+    with StreamingFileProfiler() as profiler:
+        profiler.update(normalize_frame(chunk, {"ID": "bigint", "CODE": "character varying"}))
+        results = profiler.results()
+
+    assert results["ID"] == {"total_count": 3, "distinct_count": 1}
+    assert results["CODE"] == {"total_count": 3, "distinct_count": 3}
@@ -0,0 +1,80 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from operators.reconcile_utils import (bounded_bucket_filter, bucket_aggregates, bucket_hashes_sql, canonical_values,
+                                       diff_hash_multisets, differing_buckets, hash_rows, row_hash_sql)
+
+column_types = {"AMOUNT": ("NUMBER", 2), "QTY": ("NUMBER", 0), "DAY": ("DATE", None), "NAME": ("TEXT", None),
+                "TS": ("TIMESTAMP_NTZ", None), "FLAG": ("BOOLEAN", None)}
+
+
+@pytest.mark.parametrize("col, values, expected", [
+    ("AMOUNT", ["1.5", "1.50", "1.505", "-0.005", ""], ["150", "150", "151", "-1", ""]),
+    ("QTY", ["007", " 7 ", "1e3", "abc"], ["7", "7", "1000", "abc"]),
+    ("DAY", ["2024-01-02", "01/02/2024", ""], ["2024-01-02", "01/02/2024", ""]),
+    ("NAME", [" a ", "", None], ["a", "", ""]),
+    ("TS", ["2024-01-02T03:04:05", "2024-01-02 03:04:05.5"],
+     ["2024-01-02 03:04:05.000000", "2024-01-02 03:04:05.500000"]),
+    ("FLAG", ["Y", "no", "TRUE", "x"], ["true", "false", "true", "x"]),
+])
+def test_canonical_values(col, values, expected):
+    assert canonical_values(pd.Series(values, name=col, dtype=object), *column_types[col]).tolist() == expected
+
+
+def test_equivalent_renderings_hash_the_same():
+    first = pd.DataFrame({"AMOUNT": ["1.5"], "QTY": ["007"], "NAME": ["a"]})
+    second = pd.DataFrame({"AMOUNT": ["1.50"], "QTY": ["7"], "NAME": [" a"]})
+    assert hash_rows(first, column_types)[0] == hash_rows(second, column_types)[0]
+
+
+def test_unsupported_types_are_refused():
+    with pytest.raises(Exception):
+        row_hash_sql(["RATIO"], {"RATIO": ("FLOAT", None)})
+
+
+def test_diff_hash_multisets_counts_duplicates():
+    missing, extra = diff_hash_multisets(np.array([1, 1, 2], dtype=np.uint64), np.array([1, 3], dtype=np.uint64))
+    assert missing.tolist() == [[1, 1], [2, 1]]
+    assert extra.tolist() == [[3, 1]]
+
+
+def test_bucket_aggregates_localize_differences():
+    hashes = np.random.default_rng(0).integers(0, 2 ** 63, 1000, dtype=np.uint64) * np.uint64(2)
+    changed = hashes.copy()
+    changed[5] += np.uint64(1)
+    buckets = differing_buckets(bucket_aggregates(hashes, 256), bucket_aggregates(changed, 256))
+    assert buckets == sorted({int(hashes[5]) % 256, int(changed[5]) % 256})
+
+
+def test_bounded_bucket_filter_keeps_short_lists():
+    assert bounded_bucket_filter(65536, [1, 257], 256, [1], 4096) == (65536, [1, 257])
+
+
+def test_bounded_bucket_filter_falls_back_to_previous_level():
+    buckets = list(range(0, 65536, 8))
+    parent_buckets = list(range(0, 256, 8))
+    modulus, filter_buckets = bounded_bucket_filter(65536, buckets, 256, parent_buckets, 4096)
+    assert (modulus, filter_buckets) == (256, parent_buckets)
+    query = bucket_hashes_sql("SELECT 1 AS ROW_HASH", modulus, filter_buckets)
+    assert query.endswith(f"IN ({', '.join(str(bucket) for bucket in parent_buckets)})")
+    # The parent buckets cover every differing bucket
+    assert {bucket % 256 for bucket in buckets} <= set(filter_buckets)
+
+
+def test_bounded_bucket_filter_first_level_fetches_unfiltered():
+    assert bounded_bucket_filter(256, list(range(256)), 1, None, 100) == (1, None)
+    assert bucket_hashes_sql("SELECT 1 AS ROW_HASH", 1, None) == "SELECT ROW_HASH FROM (SELECT 1 AS ROW_HASH)"
+
+
+def test_hash_rows_matches_md5_number_lower64():
+    # SELECT MD5_NUMBER_LOWER64('Snowflake') returns 9203306159527282910
+    assert hash_rows(pd.DataFrame({"NAME": ["Snowflake"]}), column_types).tolist() == [9203306159527282910]
+
+
+def test_hash_rows_hashes_the_joined_canonical_values():
+    df = pd.DataFrame({"QTY": ["007", None], "NAME": ["é", "b"]})
+    expected = [int.from_bytes(hashlib.md5(row.encode("utf-8")).digest()[8:], "big") for row in ["7\x1fé", "\x1fb"]]
+    assert hash_rows(df, column_types).tolist() == expected
@@ -0,0 +1,101 @@
+import re
+import threading
+
+from operators.s3_list_utils import iter_object_pages, list_matching_objects, list_prefix
+
+
+class FakeS3Client:
+    """list_objects_v2 over an in-memory sorted key list, page_size keys (or common prefixes) per page."""
+
+    def __init__(self, keys, page_size=2):
+        self.keys = sorted(keys)
+        self.page_size = page_size
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def list_objects_v2(self, Bucket, Prefix, Delimiter=None, StartAfter=None, ContinuationToken=None):
+        with self.lock:
+            self.calls.append({"Prefix": Prefix, "Delimiter": Delimiter, "StartAfter": StartAfter,
+                               "ContinuationToken": ContinuationToken})
+        entries = []
+        for key in self.keys:
+            if not key.startswith(Prefix) or (StartAfter and key <= StartAfter):
+                continue
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common_prefix = Prefix + rest[:rest.index(Delimiter) + 1]
+                if ("prefix", common_prefix) not in entries:
+                    entries.append(("prefix", common_prefix))
+            else:
+                entries.append(("key", key))
+
+        start = int(ContinuationToken or 0)
+        page = entries[start:start + self.page_size]
+        response = {"Contents": [{"Key": value, "ETag": '"1"', "Size": 1} for kind, value in page if kind == "key"],
+                    "CommonPrefixes": [{"Prefix": value} for kind, value in page if kind == "prefix"],
+                    "IsTruncated": start + self.page_size < len(entries)}
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + self.page_size)
+        return response
+
+
+def keys_of(objects):
+    return [obj["Key"] for obj in objects]
+
+
+def test_iter_object_pages_follows_continuation_tokens():
+    client = FakeS3Client([f"data/{i}.csv" for i in range(5)])
+    pages = list(iter_object_pages(client, "bucket", "data/"))
+    assert [len(page["Contents"]) for page in pages] == [2, 2, 1]
+    assert [call["ContinuationToken"] for call in client.calls] == [None, "2", "4"]
+
+
+def test_list_prefix_starts_after_the_high_water_mark():
+    client = FakeS3Client([f"data/{i}.csv" for i in range(5)])
+    matches, stats = list_prefix(client, "bucket", "data/", re.compile(r"\.csv$"), start_after="data/2.csv")
+    assert keys_of(matches) == ["data/3.csv", "data/4.csv"]
+    assert stats == {"pages": 1, "keys": 2}
+
+
+def test_small_prefix_is_listed_with_one_call():
+    client = FakeS3Client(["data/a.csv", "data/b.txt"])
+    matches, stats = list_matching_objects(client, "bucket", "data/", re.compile(r"\.csv$"))
+    assert keys_of(matches) == ["data/a.csv"]
+    assert len(client.calls) == 1
+    assert stats == {"pages": 1, "keys": 2, "prefixes": 1}
+
+
+def test_truncated_prefix_is_split_through_nested_levels():
+    keys = (["data/top.csv"]
+            + [f"data/2026/01/{i}.csv" for i in range(3)]
+            + [f"data/2026/02/{i}.csv" for i in range(3)]
+            + ["data/2026/02/skip.txt", "data/2026/03/x.txt"])
+    client = FakeS3Client(keys)
+    seen = []
+    lock = threading.Lock()
+
+    def on_page(contents):
+        with lock:
+            seen.extend(obj["Key"] for obj in contents)
+
+    matches, stats = list_matching_objects(client, "bucket", "data/", re.compile(r"/\d+\.csv$|top\.csv$"),
+                                           max_workers=4, on_page=on_page)
+
+    assert keys_of(matches) == sorted(["data/top.csv"] + [f"data/2026/0{m}/{i}.csv" for m in (1, 2) for i in range(3)])
+    # Descended through the single-child "2026/" level before listing the months concurrently
+    split_prefixes = [call["Prefix"] for call in client.calls if call["Delimiter"] == "/"]
+    assert list(dict.fromkeys(split_prefixes)) == ["data/", "data/2026/"]
+    assert stats["prefixes"] == 3
+    # Every key is counted and handed to on_page exactly once, the discarded first page is not counted
+    assert sorted(seen) == sorted(keys)
+    assert stats["keys"] == len(keys)
+
+
+def test_explicit_sub_prefixes_are_listed_without_splitting():
+    keys = [f"data/2026-01-{day:02d}/{i}.csv" for day in (14, 15) for i in range(3)]
+    client = FakeS3Client(keys)
+    matches, stats = list_matching_objects(client, "bucket", "data/", re.compile(r"\.csv$"),
+                                           sub_prefixes=["2026-01-15/"])
+    assert keys_of(matches) == [f"data/2026-01-15/{i}.csv" for i in range(3)]
+    assert {call["Prefix"] for call in client.calls} == {"data/2026-01-15/"}
+    assert stats["prefixes"] == 1
@@ -0,0 +1,50 @@
+import os
+import re
+
+from operators.scan_utils import PartitionPrunedScanner
+
+
+def make_files(root, paths):
+    for path in paths:
+        full_path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        open(full_path, "w").close()
+
+
+def walk_matches(root, file_pattern):
+    pattern = re.compile(file_pattern)
+    return sorted(os.path.join(dir_path, name) for dir_path, _, names in os.walk(root) for name in names
+                  if pattern.search(os.path.join(dir_path, name)))
+
+
+def test_unanchored_pattern_matches_like_os_walk(tmp_path):
+    root = str(tmp_path)
+    make_files(root, ["2026/01/15/netflix_1.csv", "archive/2026/01/15/netflix_2.csv", "2026/01/16/netflix_3.csv"])
+    file_pattern = r"2026/01/15/netflix_.*\.csv"
+
+    scanner = PartitionPrunedScanner(root, file_pattern)
+
+    assert sorted(scanner.scan()) == walk_matches(root, file_pattern)
+    assert len(walk_matches(root, file_pattern)) == 2
+    assert scanner.dir_segments == []
+
+
+def test_anchored_pattern_prunes_partitions(tmp_path):
+    root = str(tmp_path)
+    make_files(root, [f"2026/01/{day:02d}/netflix_{day}.csv" for day in range(1, 29)])
+    file_pattern = f"^{re.escape(root)}/2026/01/15/netflix_.*\\.csv"
+
+    scanner = PartitionPrunedScanner(root, file_pattern)
+
+    assert sorted(scanner.scan()) == walk_matches(root, file_pattern) == [os.path.join(root, "2026/01/15/netflix_15.csv")]
+    assert scanner.files_visited == 1
+
+
+def test_anchored_pattern_outside_root_is_not_pruned(tmp_path):
+    root = str(tmp_path)
+    make_files(root, ["2026/01/15/netflix_1.csv"])
+
+    scanner = PartitionPrunedScanner(root, r"^2026/01/15/netflix_.*\.csv")
+
+    assert scanner.dir_segments == []
+    assert list(scanner.scan()) == []
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from operators.sketch_utils import HyperLogLog, bit_length, hash_values
+
+
+def random_hashes(count, seed=0):
+    return np.random.default_rng(seed).integers(0, 2 ** 64 - 1, count, dtype=np.uint64, endpoint=True)
+
+
+def test_bit_length_is_exact():
+    values = np.array([0, 1, 2 ** 32 - 1, 2 ** 32, 2 ** 53 + 1, 2 ** 64 - 1], dtype=np.uint64)
+    assert bit_length(values).tolist() == [int(value).bit_length() for value in values.tolist()]
+
+
+def test_small_columns_are_counted_exactly():
+    sketch = HyperLogLog(precision=10).add_series(pd.Series(["a", "b", "a", None, "c"]))
+    assert sketch.registers is None
+    assert sketch.estimate() == 3
+
+
+@pytest.mark.parametrize("count", [5000, 100000, 1000000])
+def test_estimate_is_within_three_standard_errors(count):
+    sketch = HyperLogLog(precision=14)
+    hashes = random_hashes(count)
+    for batch in np.array_split(hashes, 7):
+        sketch.add_hashes(batch)
+        # Duplicates don't change the estimate
+        sketch.add_hashes(batch[:100])
+    assert sketch.registers is not None
+    assert abs(sketch.estimate() - count) / count <= 3 * HyperLogLog.standard_error(14)
+
+
+def test_merge_equals_the_sketch_of_the_union():
+    first, second = random_hashes(60000, seed=1), random_hashes(60000, seed=2)
+    overlap = np.concatenate([first[:20000], second])
+    merged = HyperLogLog(precision=12).merge(HyperLogLog(precision=12))
+    merged.add_hashes(first)
+    other = HyperLogLog(precision=12)
+    other.add_hashes(overlap)
+    merged.merge(other)
+
+    union = HyperLogLog(precision=12)
+    union.add_hashes(np.concatenate([first, overlap]))
+    assert np.array_equal(merged.registers, union.registers)
+    assert merged.estimate() == union.estimate()
+
+
+def test_merge_of_exact_and_register_sketches():
+    small, large = random_hashes(100, seed=3), random_hashes(50000, seed=4)
+    exact = HyperLogLog(precision=12)
+    exact.add_hashes(small)
+    sketched = HyperLogLog(precision=12)
+    sketched.add_hashes(large)
+    union = HyperLogLog(precision=12)
+    union.add_hashes(np.concatenate([small, large]))
+
+    assert np.array_equal(HyperLogLog(precision=12).merge(exact).merge(sketched).registers, union.registers)
+    assert np.array_equal(sketched.merge(exact).registers, union.registers)
+
+
+def test_merged_exact_sketches_switch_to_registers_past_the_limit():
+    first, second = HyperLogLog(precision=8, exact_limit=100), HyperLogLog(precision=8, exact_limit=100)
+    first.add_hashes(random_hashes(80, seed=5))
+    second.add_hashes(random_hashes(80, seed=6))
+    assert first.merge(second).registers is not None
+
+
+def test_merge_refuses_other_precisions():
+    with pytest.raises(Exception):
+        HyperLogLog(precision=12).merge(HyperLogLog(precision=14))
+
+
+def test_precision_for_error():
+    precision = HyperLogLog.precision_for_error(0.01)
+    assert HyperLogLog.standard_error(precision) <= 0.01 < HyperLogLog.standard_error(precision - 1)
+    assert HyperLogLog.precision_for_error(1e-9) == 18
+
+
+def test_hash_values_skip_nulls():
+    assert len(hash_values(pd.Series(["a", None, "b"]))) == 2
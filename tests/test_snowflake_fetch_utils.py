@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+errors = pytest.importorskip("snowflake.connector.errors")
+
+from operators.snowflake_fetch_utils import FetchMetrics, fetch_column, fetch_dataframe, iter_dataframes
+
+
+class FakeCursor:
+    """An executed cursor over rows, with Arrow result batches of batch_rows rows unless arrow is False."""
+
+    def __init__(self, rows, columns, arrow=True, batch_rows=2):
+        self.rows = list(rows)
+        self.description = [(column, None, None, None, None, None, True) for column in columns]
+        self.arrow = arrow
+        self.batch_rows = batch_rows
+        self.position = 0
+
+    def fetch_arrow_batches(self):
+        if not self.arrow:
+            raise errors.NotSupportedError("Unknown result format")
+        import pyarrow as pa
+        columns = [column[0] for column in self.description]
+        return (pa.Table.from_pylist([dict(zip(columns, row)) for row in self.rows[start:start + self.batch_rows]])
+                for start in range(0, len(self.rows), self.batch_rows))
+
+    def fetchmany(self, size):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+
+rows = [(1, "a"), (2, "b"), (3, "c")]
+
+
+def test_fallback_fetches_dataframes_with_fetchmany():
+    metrics = FetchMetrics("fallback")
+    df = fetch_dataframe(FakeCursor(rows, ["ID", "NAME"], arrow=False), chunk_size=2, metrics=metrics)
+    assert df.to_dict("list") == {"ID": [1, 2, 3], "NAME": ["a", "b", "c"]}
+    assert (metrics.arrow, metrics.batches, metrics.rows) == (False, 2, 3)
+    assert metrics.bytes > 0 and metrics.seconds_to_first_batch is not None
+
+
+def test_fallback_empty_result_keeps_the_columns():
+    df = fetch_dataframe(FakeCursor([], ["ID", "NAME"], arrow=False))
+    assert list(df.columns) == ["ID", "NAME"] and df.empty
+
+
+def test_fallback_fetch_column_keeps_uint64_hashes_exact():
+    hashes = [2 ** 64 - 1, 0, 2 ** 63 + 1]
+    column = fetch_column(FakeCursor([(value,) for value in hashes], ["ROW_HASH"], arrow=False), np.uint64,
+                          chunk_size=2)
+    assert column.dtype == np.uint64 and column.tolist() == hashes
+
+
+def test_fallback_fetch_column_of_an_empty_result():
+    column = fetch_column(FakeCursor([], ["ROW_HASH"], arrow=False), np.uint64)
+    assert column.dtype == np.uint64 and len(column) == 0
+
+
+def test_arrow_batches_are_fetched_without_fetchmany():
+    pytest.importorskip("pyarrow")
+    cursor = FakeCursor(rows, ["ID", "NAME"])
+    cursor.fetchmany = None
+    metrics = FetchMetrics("arrow")
+    frames = list(iter_dataframes(cursor, metrics=metrics))
+    assert [len(frame) for frame in frames] == [2, 1]
+    assert pd.concat(frames, ignore_index=True).to_dict("list") == {"ID": [1, 2, 3], "NAME": ["a", "b", "c"]}
+    assert metrics.as_dict()["arrow"] is True
+    assert (metrics.batches, metrics.rows) == (2, 3)
+
+
+def test_arrow_fetch_column_casts_decimals_to_uint64():
+    pa = pytest.importorskip("pyarrow")
+    hashes = [2 ** 64 - 1, 0, 2 ** 63 + 1]
+
+    class DecimalCursor(FakeCursor):
+        def fetch_arrow_batches(self):
+            # Snowflake returns NUMBER(20,0) as decimal128
+            return iter([pa.table({"ROW_HASH": pa.array(hashes, type=pa.decimal128(20, 0))})])
+
+    column = fetch_column(DecimalCursor([], ["ROW_HASH"]), np.uint64)
+    assert column.dtype == np.uint64 and column.tolist() == hashes
+
+
+@pytest.mark.parametrize("arrow", [True, False])
+def test_batches_are_written_to_parquet(tmp_path, arrow):
+    pq = pytest.importorskip("pyarrow.parquet")
+    parquet_path = str(tmp_path / "result.parquet")
+    df = fetch_dataframe(FakeCursor(rows, ["ID", "NAME"], arrow=arrow), chunk_size=2, parquet_path=parquet_path)
+    assert pq.read_table(parquet_path).to_pandas().to_dict("list") == df.to_dict("list")